@@ -9,6 +9,9 @@ from typing import Any, Dict, Optional
 
 from hala_orchestrator import Agent, MissionState, agent, get_logger
 
+from agents.travel_planner_agent.extraction import build_extraction_prompt, extract_travel_params
+from orchestration.parallel import ToolCall, run_tools_concurrently
+
 
 def _safe_json_extract(text: str) -> Dict[str, Any]:
     if not text:
@@ -35,23 +38,30 @@ class TravelPlannerAgent(Agent):
         if not hala:
             raise RuntimeError("Hala engine tool is required for TravelPlannerAgent.")
 
-        planner_prompt = (
-            "Extract travel parameters as JSON. Use only fields you can infer.\n"
-            "Fields: city, base_currency, target_currency, amount\n"
-            "User request:\n"
-            f"{state.objective}\n"
-            "Return JSON only."
-        )
-
-        extraction = await hala.run(
-            prompt=planner_prompt,
-            session_id=state.mission_id,
-            start_session=True,
-            include_history=False,
-            max_tokens=self.runtime.max_tokens if self.runtime else None,
-        )
+        # Common requests are parsed locally; HalaAI is only asked when the rules are unsure.
+        rule_params = extract_travel_params(state.objective)
+        used_llm = not rule_params.confident
+        if used_llm:
+            logger.info(
+                "Rule-based extraction not confident (%.2f: %s); asking HalaAI.",
+                rule_params.confidence,
+                "; ".join(rule_params.notes) or "partial match",
+            )
+            extraction = await hala.run(
+                prompt=build_extraction_prompt(state.objective),
+                session_id=state.mission_id,
+                start_session=True,
+                include_history=False,
+                max_tokens=self.runtime.max_tokens if self.runtime else None,
+                # Extraction depends only on the objective text.
+                use_cache=True,
+            )
+            llm_params = {key: value for key, value in _safe_json_extract(extraction).items() if value not in (None, "")}
+            parsed = {**rule_params.to_dict(), **llm_params}
+        else:
+            logger.info("Rule-based extraction (confidence %.2f): %s", rule_params.confidence, rule_params.to_dict())
+            parsed = rule_params.to_dict()
 
-        parsed = _safe_json_extract(extraction)
         city = parsed.get("city")
         base_currency = parsed.get("base_currency") or "USD"
         target_currency = parsed.get("target_currency")
@@ -60,23 +70,20 @@ class TravelPlannerAgent(Agent):
         if not city:
             raise ValueError("TravelPlannerAgent requires a city to continue.")
 
-        weather_data: Optional[Dict[str, Any]] = None
-        if weather:
-            try:
-                weather_data = await weather.run(city=city)
-            except Exception as exc:
-                logger.warning("Weather tool failed: %s", exc)
-
-        fx_data: Optional[Dict[str, Any]] = None
-        if fx and target_currency:
-            try:
-                fx_data = await fx.run(
-                    base=base_currency,
-                    target=target_currency,
-                    amount=amount,
+        # Weather and FX are independent; run them side by side.
+        calls = [ToolCall("Weather", weather, {"city": city})]
+        if target_currency:
+            calls.append(
+                ToolCall(
+                    "FX",
+                    fx,
+                    {"base": base_currency, "target": target_currency, "amount": amount},
                 )
-            except Exception as exc:
-                logger.warning("FX tool failed: %s", exc)
+            )
+        outcomes = await run_tools_concurrently(calls, logger=logger)
+
+        weather_data: Optional[Dict[str, Any]] = outcomes["Weather"].value
+        fx_data: Optional[Dict[str, Any]] = outcomes["FX"].value if "FX" in outcomes else None
 
         state.data["travel"] = {
             "city": city,
@@ -96,7 +103,7 @@ class TravelPlannerAgent(Agent):
         response = await hala.run(
             prompt=summary_prompt,
             session_id=state.mission_id,
-            start_session=False,
+            start_session=not used_llm,
             include_history=False,
             max_tokens=self.runtime.max_tokens if self.runtime else None,
         )
@@ -0,0 +1,378 @@
+"""
+Deterministic travel-parameter extraction for TravelPlannerAgent.
+
+Pulls city, currencies and amount out of an objective with a gazetteer and
+a few regexes. The agent uses the result directly when ``confidence`` reaches
+``MIN_CONFIDENCE`` and only asks HalaAI otherwise. A city alone is never
+enough: the objective must also name a currency or a priced amount, so
+weather-only or unpriced requests go to the LLM.
+"""
+
+import re
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Tuple
+
+MIN_CONFIDENCE = 0.7
+
+# city -> local currency. Names that are also common English words (Nice, Split,
+# Reading, ...) are left out on purpose; the LLM handles those.
+CITY_CURRENCIES: Dict[str, str] = {
+    "Amsterdam": "EUR",
+    "Athens": "EUR",
+    "Auckland": "NZD",
+    "Bangkok": "THB",
+    "Barcelona": "EUR",
+    "Beijing": "CNY",
+    "Berlin": "EUR",
+    "Bogota": "COP",
+    "Boston": "USD",
+    "Brussels": "EUR",
+    "Budapest": "HUF",
+    "Buenos Aires": "ARS",
+    "Cairo": "EGP",
+    "Cape Town": "ZAR",
+    "Chicago": "USD",
+    "Copenhagen": "DKK",
+    "Delhi": "INR",
+    "Dubai": "AED",
+    "Dublin": "EUR",
+    "Edinburgh": "GBP",
+    "Florence": "EUR",
+    "Frankfurt": "EUR",
+    "Hanoi": "VND",
+    "Helsinki": "EUR",
+    "Ho Chi Minh City": "VND",
+    "Hong Kong": "HKD",
+    "Istanbul": "TRY",
+    "Jakarta": "IDR",
+    "Johannesburg": "ZAR",
+    "Kuala Lumpur": "MYR",
+    "Kyoto": "JPY",
+    "Las Vegas": "USD",
+    "Lima": "PEN",
+    "Lisbon": "EUR",
+    "London": "GBP",
+    "Los Angeles": "USD",
+    "Madrid": "EUR",
+    "Manila": "PHP",
+    "Marrakech": "MAD",
+    "Melbourne": "AUD",
+    "Mexico City": "MXN",
+    "Miami": "USD",
+    "Milan": "EUR",
+    "Montreal": "CAD",
+    "Moscow": "RUB",
+    "Mumbai": "INR",
+    "Munich": "EUR",
+    "Nairobi": "KES",
+    "New Delhi": "INR",
+    "New York": "USD",
+    "Osaka": "JPY",
+    "Oslo": "NOK",
+    "Paris": "EUR",
+    "Prague": "CZK",
+    "Reykjavik": "ISK",
+    "Rio de Janeiro": "BRL",
+    "Riyadh": "SAR",
+    "Rome": "EUR",
+    "San Francisco": "USD",
+    "Santiago": "CLP",
+    "Sao Paulo": "BRL",
+    "Seattle": "USD",
+    "Seoul": "KRW",
+    "Shanghai": "CNY",
+    "Singapore": "SGD",
+    "Stockholm": "SEK",
+    "Sydney": "AUD",
+    "Taipei": "TWD",
+    "Tel Aviv": "ILS",
+    "Tokyo": "JPY",
+    "Toronto": "CAD",
+    "Vancouver": "CAD",
+    "Vienna": "EUR",
+    "Warsaw": "PLN",
+    "Zurich": "CHF",
+}
+
+CITY_ALIASES: Dict[str, str] = {
+    "nyc": "New York",
+    "new york city": "New York",
+    "sf": "San Francisco",
+    "cdmx": "Mexico City",
+    "rio": "Rio de Janeiro",
+    "saigon": "Ho Chi Minh City",
+    "são paulo": "Sao Paulo",
+    "bogotá": "Bogota",
+    "zürich": "Zurich",
+    "münchen": "Munich",
+    "lisboa": "Lisbon",
+    "roma": "Rome",
+}
+
+ISO_CURRENCIES = frozenset(
+    {
+        "AED", "ARS", "AUD", "BGN", "BRL", "CAD", "CHF", "CLP", "CNY", "COP", "CZK", "DKK",
+        "EGP", "EUR", "GBP", "HKD", "HUF", "IDR", "ILS", "INR", "ISK", "JPY", "KES", "KRW",
+        "MAD", "MXN", "MYR", "NOK", "NZD", "PEN", "PHP", "PKR", "PLN", "QAR", "RON", "RUB",
+        "SAR", "SEK", "SGD", "THB", "TRY", "TWD", "UAH", "USD", "VND", "ZAR",
+    }
+)
+
+# Longest symbols first so "HK$" wins over "$".
+CURRENCY_SYMBOLS: Tuple[Tuple[str, str], ...] = (
+    ("HK$", "HKD"),
+    ("NZ$", "NZD"),
+    ("US$", "USD"),
+    ("R$", "BRL"),
+    ("C$", "CAD"),
+    ("A$", "AUD"),
+    ("S$", "SGD"),
+    ("$", "USD"),
+    ("€", "EUR"),
+    ("£", "GBP"),
+    ("¥", "JPY"),
+    ("₹", "INR"),
+    ("₩", "KRW"),
+    ("₽", "RUB"),
+    ("₺", "TRY"),
+    ("₫", "VND"),
+    ("฿", "THB"),
+    ("₱", "PHP"),
+    ("₪", "ILS"),
+)
+
+CURRENCY_WORDS: Dict[str, str] = {
+    "dollar": "USD",
+    "dollars": "USD",
+    "bucks": "USD",
+    "euro": "EUR",
+    "euros": "EUR",
+    "pound": "GBP",
+    "pounds": "GBP",
+    "sterling": "GBP",
+    "yen": "JPY",
+    "yuan": "CNY",
+    "rmb": "CNY",
+    "renminbi": "CNY",
+    "rupee": "INR",
+    "rupees": "INR",
+    "won": "KRW",
+    "baht": "THB",
+    "peso": "MXN",
+    "pesos": "MXN",
+    "franc": "CHF",
+    "francs": "CHF",
+    "dirham": "AED",
+    "dirhams": "AED",
+    "lira": "TRY",
+    "real": "BRL",
+    "reais": "BRL",
+    "rand": "ZAR",
+    "zloty": "PLN",
+    "krona": "SEK",
+    "kronor": "SEK",
+    "koruna": "CZK",
+    "soles": "PEN",
+    "ringgit": "MYR",
+    "dong": "VND",
+    "shekel": "ILS",
+    "shekels": "ILS",
+}
+
+# Lower-case forms of these are ordinary English words ("try", "mad", "pen").
+ISO_WORD_COLLISIONS = frozenset({"CAD", "MAD", "PEN", "TRY"})
+# Currency names that are also common words ("I won", "for real") only count next to an amount.
+AMBIGUOUS_CURRENCY_WORDS = frozenset({"dong", "pound", "rand", "real", "won"})
+
+_NUMBER = r"\d{1,3}(?:[,\s]\d{3})+(?:\.\d+)?|\d+(?:\.\d+)?"
+_MULTIPLIERS = {"k": 1_000, "m": 1_000_000}
+
+
+def _build_city_pattern() -> re.Pattern:
+    names = list(CITY_CURRENCIES) + list(CITY_ALIASES)
+    names.sort(key=len, reverse=True)
+    return re.compile(r"\b(" + "|".join(re.escape(name) for name in names) + r")\b", re.IGNORECASE)
+
+
+_CITY_PATTERN = _build_city_pattern()
+_CITY_LOOKUP = {name.casefold(): name for name in CITY_CURRENCIES}
+_CITY_LOOKUP.update({alias.casefold(): city for alias, city in CITY_ALIASES.items()})
+
+_SYMBOL_ALTERNATION = "|".join(re.escape(symbol) for symbol, _ in CURRENCY_SYMBOLS)
+_CURRENCY_TOKEN = (
+    r"(?P<{name}>"
+    + _SYMBOL_ALTERNATION
+    + r"|\b(?:"
+    + "|".join(sorted(ISO_CURRENCIES))
+    + "|"
+    + "|".join(sorted(CURRENCY_WORDS, key=len, reverse=True))
+    + r")\b)"
+)
+# Only symbols and codes go before a number ("$1,500", "USD 1500"); names go after ("1500 dollars").
+_PREFIX_TOKEN = r"(?P<prefix>" + _SYMBOL_ALTERNATION + r"|\b(?:" + "|".join(sorted(ISO_CURRENCIES)) + r")\b)"
+_AMOUNT_PATTERN = re.compile(
+    _PREFIX_TOKEN
+    + r"\s?(?P<amount>" + _NUMBER + r")\s?(?P<mult>[kKmM]\b)?"
+    + r"|(?P<amount2>" + _NUMBER + r")\s?(?P<mult2>[kKmM]\b)?\s?"
+    + _CURRENCY_TOKEN.format(name="suffix"),
+    re.IGNORECASE,
+)
+_CURRENCY_PATTERN = re.compile(_CURRENCY_TOKEN.format(name="currency"), re.IGNORECASE)
+# Numbers that are not money: "5 days", "4-day", "2 people", "June 5".
+_NUMBER_PATTERN = re.compile(r"(?<![\w.,$€£¥₹₩])(?:" + _NUMBER + r")(?![\w.,])")
+_QUANTITY_PATTERN = re.compile(
+    r"^[\s-]*(?:days?|nights?|weeks?|months?|years?|hours?|h\b|people|persons?|adults?|kids?|children|"
+    r"travell?ers?|guests?|stars?|st\b|nd\b|rd\b|th\b|am\b|pm\b)",
+    re.IGNORECASE,
+)
+_DATE_CONTEXT_PATTERN = re.compile(
+    r"\b(?:jan|feb|mar|apr|may|jun|jul|aug|sep|sept|oct|nov|dec)[a-z]*\.?\s*$", re.IGNORECASE
+)
+# "to JPY", "into euros", "in yen"
+_TARGET_PATTERN = re.compile(r"\b(?:to|into|in|for)\s+" + _CURRENCY_TOKEN.format(name="target"), re.IGNORECASE)
+
+
+def _currency_code(token: Optional[str], with_amount: bool = False) -> Optional[str]:
+    if not token:
+        return None
+    for symbol, code in CURRENCY_SYMBOLS:
+        if token == symbol:
+            return code
+    upper = token.upper()
+    if upper in ISO_CURRENCIES:
+        if token == upper or upper not in ISO_WORD_COLLISIONS:
+            return upper
+        return None
+    word = token.lower()
+    if word in AMBIGUOUS_CURRENCY_WORDS and not with_amount:
+        return None
+    return CURRENCY_WORDS.get(word)
+
+
+def _parse_amount(text: str, multiplier: Optional[str]) -> Optional[float]:
+    try:
+        value = float(re.sub(r"[,\s]", "", text))
+    except ValueError:
+        return None
+    if multiplier:
+        value *= _MULTIPLIERS[multiplier.lower()]
+    return value
+
+
+@dataclass
+class TravelParams:
+    city: Optional[str] = None
+    base_currency: Optional[str] = None
+    target_currency: Optional[str] = None
+    amount: Optional[float] = None
+    confidence: float = 0.0
+    notes: List[str] = field(default_factory=list)
+
+    @property
+    def confident(self) -> bool:
+        return self.confidence >= MIN_CONFIDENCE
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Same shape as the LLM extraction JSON, without empty fields."""
+        data = {
+            "city": self.city,
+            "base_currency": self.base_currency,
+            "target_currency": self.target_currency,
+            "amount": self.amount,
+        }
+        return {key: value for key, value in data.items() if value is not None}
+
+
+def _unpriced_number(text: str, amount_span: Optional[Tuple[int, int]]) -> Optional[str]:
+    """A number that may be money but was not read as an amount ("200 to spend")."""
+    for match in _NUMBER_PATTERN.finditer(text):
+        if amount_span and amount_span[0] <= match.start() < amount_span[1]:
+            continue
+        if _QUANTITY_PATTERN.match(text[match.end() :]) or _DATE_CONTEXT_PATTERN.search(text[: match.start()]):
+            continue
+        if len(match.group()) == 4 and match.group().startswith(("19", "20")):
+            continue  # a year
+        return match.group()
+    return None
+
+
+def extract_travel_params(objective: str) -> TravelParams:
+    params = TravelParams()
+    text = objective or ""
+
+    cities = []
+    for match in _CITY_PATTERN.finditer(text):
+        city = _CITY_LOOKUP[match.group(1).casefold()]
+        if city not in cities:
+            cities.append(city)
+    if not cities:
+        params.notes.append("no known city")
+        return params
+    params.city = cities[0]
+    params.confidence = 0.6 if len(cities) == 1 else 0.3
+    if len(cities) > 1:
+        params.notes.append(f"several cities: {', '.join(cities)}")
+
+    amount_match = _AMOUNT_PATTERN.search(text)
+    explicit_base = False
+    if amount_match:
+        if amount_match.group("amount"):
+            params.amount = _parse_amount(amount_match.group("amount"), amount_match.group("mult"))
+            params.base_currency = _currency_code(amount_match.group("prefix"), with_amount=True)
+        else:
+            params.amount = _parse_amount(amount_match.group("amount2"), amount_match.group("mult2"))
+            params.base_currency = _currency_code(amount_match.group("suffix"), with_amount=True)
+        if params.amount is not None:
+            params.confidence += 0.05
+
+    target_match = None
+    for match in _TARGET_PATTERN.finditer(text):
+        code = _currency_code(match.group("target"))
+        if code and code != params.base_currency:
+            target_match = code
+            break
+    if target_match:
+        params.target_currency = target_match
+        params.confidence += 0.25
+
+    if params.base_currency is None:
+        mentioned = [_currency_code(match.group("currency")) for match in _CURRENCY_PATTERN.finditer(text)]
+        mentioned = [code for code in mentioned if code and code != params.target_currency]
+        if mentioned:
+            params.base_currency = mentioned[0]
+    if params.base_currency:
+        explicit_base = True
+        params.confidence += 0.1
+
+    if params.amount is None:
+        number = _unpriced_number(text, amount_match.span() if amount_match else None)
+        if number:
+            params.notes.append(f"unpriced number: {number}")
+            params.confidence = min(params.confidence, 0.3)
+
+    if not explicit_base and params.target_currency is None:
+        # Nothing asks for money; don't invent a conversion.
+        params.notes.append("no currency or amount mentioned")
+        params.confidence = round(min(params.confidence, 0.5), 2)
+        return params
+
+    if params.target_currency is None:
+        local = CITY_CURRENCIES[params.city]
+        # The agent converts from USD when no base currency is given.
+        if local != (params.base_currency or "USD"):
+            params.target_currency = local
+            params.notes.append("target currency inferred from city")
+        params.confidence += 0.15
+
+    params.confidence = round(min(params.confidence, 1.0), 2)
+    return params
+
+
+def build_extraction_prompt(objective: str) -> str:
+    return (
+        "Extract travel parameters as JSON. Use only fields you can infer.\n"
+        "Fields: city, base_currency, target_currency, amount\n"
+        "User request:\n"
+        f"{objective}\n"
+        "Return JSON only."
+    )
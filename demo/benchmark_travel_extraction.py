@@ -0,0 +1,113 @@
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+import uuid
+from pathlib import Path
+
+from dotenv import load_dotenv
+
+# Benchmarks the rule-based travel extractor against a corpus of objectives.
+# Reports how many objectives skip the HalaAI extraction call, how accurate
+# those skips are, and the latency saved. With --live the LLM cost is measured
+# against a running HalaAI engine; otherwise --llm-seconds is assumed.
+
+ROOT_DIR = Path(__file__).resolve().parents[1]
+ORCH_DIR = ROOT_DIR.parent / "hala-ai-orchestrator"
+if ORCH_DIR.exists():
+    sys.path.insert(0, str(ORCH_DIR))
+if str(ROOT_DIR) not in sys.path:
+    sys.path.insert(0, str(ROOT_DIR))
+
+load_dotenv(dotenv_path=ROOT_DIR / ".env")
+os.environ.setdefault("HALA_WS_URL", "ws://localhost:8000/ws/chat/v2")
+
+from agents.travel_planner_agent.extraction import build_extraction_prompt, extract_travel_params
+
+DEFAULT_CORPUS = ROOT_DIR / "demo" / "fixtures" / "travel_objectives.json"
+FIELDS = ("city", "base_currency", "target_currency", "amount")
+
+
+def _matches(expected, actual) -> bool:
+    if expected is None:
+        return actual is None
+    if isinstance(expected, (int, float)) and actual is not None:
+        return abs(float(expected) - float(actual)) < 1e-6
+    return expected == actual
+
+
+async def _measure_llm(objectives) -> float:
+    from services.hala_ws import close_pools, query_hala
+
+    timings = []
+    try:
+        for objective in objectives:
+            started = time.perf_counter()
+            await query_hala(
+                build_extraction_prompt(objective),
+                session_id=f"extraction-bench-{uuid.uuid4()}",
+                start_session=True,
+                max_tokens=250,
+                use_cache=False,
+            )
+            timings.append(time.perf_counter() - started)
+    finally:
+        await close_pools()
+    return sum(timings) / len(timings) if timings else 0.0
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Benchmark rule-based travel extraction.")
+    parser.add_argument("corpus", nargs="?", default=str(DEFAULT_CORPUS))
+    parser.add_argument("--repeat", type=int, default=200, help="Extractor runs per objective for timing.")
+    parser.add_argument("--llm-seconds", type=float, default=1.5, help="Assumed HalaAI extraction latency.")
+    parser.add_argument("--live", action="store_true", help="Measure HalaAI extraction latency instead.")
+    parser.add_argument("--verbose", action="store_true", help="Print every objective.")
+    args = parser.parse_args()
+
+    corpus = json.loads(Path(args.corpus).read_text(encoding="utf-8"))
+    hits = 0
+    correct = 0
+    extractor_seconds = 0.0
+    misses = []
+
+    for item in corpus:
+        objective = item["objective"]
+        started = time.perf_counter()
+        for _ in range(args.repeat):
+            params = extract_travel_params(objective)
+        extractor_seconds += (time.perf_counter() - started) / args.repeat
+
+        expected = item.get("expected", {})
+        actual = {name: getattr(params, name) for name in FIELDS}
+        wrong = [name for name in FIELDS if not _matches(expected.get(name), actual[name])]
+        if params.confident:
+            hits += 1
+            correct += not wrong
+        else:
+            misses.append(objective)
+        if args.verbose:
+            status = "rules" if params.confident else "llm"
+            print(f"[{status:5}] {params.confidence:.2f} {objective}")
+            if params.confident and wrong:
+                print(f"         mismatched: {', '.join(wrong)} -> {actual}")
+
+    total = len(corpus)
+    llm_seconds = args.llm_seconds
+    if args.live:
+        llm_seconds = asyncio.run(_measure_llm([item["objective"] for item in corpus]))
+
+    avg_extractor_ms = 1000.0 * extractor_seconds / total if total else 0.0
+    print(f"Objectives:           {total}")
+    print(f"Rule-based hits:      {hits} ({100.0 * hits / total:.0f}%)" if total else "Rule-based hits: 0")
+    print(f"Exact on hits:        {correct}/{hits}")
+    print(f"Extractor latency:    {avg_extractor_ms:.3f} ms avg")
+    print(f"LLM extraction:       {llm_seconds:.2f} s avg ({'measured' if args.live else 'assumed'})")
+    print(f"LLM calls saved:      {hits}")
+    print(f"Latency saved:        {hits * llm_seconds:.1f} s total, {llm_seconds * hits / total if total else 0:.2f} s/objective")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,146 @@
+import argparse
+import asyncio
+import json
+import os
+import sys
+import threading
+import time
+from datetime import date
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from urllib.parse import parse_qs, urlparse
+
+# Local stand-in for the Frankfurter API, for exercising services/exchange
+# without network access. Serves GET /v1/latest?base=XXX[&symbols=A,B] from a
+# fixed EUR table and GET /stats with the number of requests served.
+#
+#   python demo/fx_stub_server.py                 # serve on :8790
+#   EXCHANGE_API_BASE=http://127.0.0.1:8790/v1 python demo/run_travel_planner.py
+#   python demo/fx_stub_server.py --check         # self-check of the rate cache
+
+ROOT_DIR = Path(__file__).resolve().parents[1]
+if str(ROOT_DIR) not in sys.path:
+    sys.path.insert(0, str(ROOT_DIR))
+
+EUR_RATES = {
+    "AUD": 1.6612,
+    "BRL": 6.0563,
+    "CAD": 1.5105,
+    "CHF": 0.9412,
+    "CNY": 7.8123,
+    "CZK": 25.141,
+    "GBP": 0.8452,
+    "INR": 91.45,
+    "JPY": 163.42,
+    "KRW": 1492.3,
+    "MXN": 21.034,
+    "THB": 38.215,
+    "TRY": 37.102,
+    "USD": 1.0891,
+}
+
+
+class _Handler(BaseHTTPRequestHandler):
+    requests_served = 0
+
+    def _send(self, status: int, body: dict) -> None:
+        data = json.dumps(body).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self) -> None:
+        url = urlparse(self.path)
+        if url.path.rstrip("/").endswith("/stats"):
+            self._send(200, {"requests": _Handler.requests_served})
+            return
+        if not url.path.rstrip("/").endswith("/latest"):
+            self._send(404, {"message": "not found"})
+            return
+        _Handler.requests_served += 1
+
+        query = parse_qs(url.query)
+        base = (query.get("base") or ["EUR"])[0].upper()
+        table = {"EUR": 1.0, **EUR_RATES}
+        if base not in table:
+            self._send(404, {"message": "not found"})
+            return
+        rates = {code: round(value / table[base], 6) for code, value in table.items() if code != base}
+        symbols = (query.get("symbols") or [""])[0]
+        if symbols:
+            wanted = {code.strip().upper() for code in symbols.split(",")}
+            rates = {code: value for code, value in rates.items() if code in wanted}
+        self._send(200, {"amount": 1.0, "base": base, "date": date.today().isoformat(), "rates": rates})
+
+    def log_message(self, format, *args) -> None:
+        pass
+
+
+def serve(port: int) -> ThreadingHTTPServer:
+    server = ThreadingHTTPServer(("127.0.0.1", port), _Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+async def _check(base_url: str) -> None:
+    from services.exchange import exchange_rates
+    from services.http_client import close_shared_clients
+
+    exchange_rates.EXCHANGE_BASE_URL = base_url
+    cache = exchange_rates.get_rate_cache()
+    try:
+        converted = await exchange_rates.convert_currency(1500, "USD", "JPY")
+        expected = EUR_RATES["JPY"] / EUR_RATES["USD"]
+        assert abs(converted["rate"] - expected) < 1e-9, converted
+        assert _Handler.requests_served == 1
+
+        pairs = [("USD", "JPY"), ("GBP", "CHF"), ("EUR", "THB"), ("MXN", "INR")] * 2500
+        started = time.perf_counter()
+        for base, target in pairs:
+            await exchange_rates.fetch_rate(base, target)
+        per_lookup_us = 1e6 * (time.perf_counter() - started) / len(pairs)
+
+        results = await exchange_rates.convert_many(
+            [{"amount": 100, "base": "USD", "target": "EUR"}, {"amount": 50, "target": "XXX"}, {"amount": 5, "base": "XXX", "target": "USD"}]
+        )
+        assert results[0]["converted"] is not None and results[1]["rate"] is None and results[2]["rate"] is None, results
+        assert _Handler.requests_served == 2, _Handler.requests_served
+
+        cache.invalidate()
+        await asyncio.gather(*(exchange_rates.fetch_rate("USD", "GBP") for _ in range(20)))
+        assert _Handler.requests_served == 3, _Handler.requests_served
+    finally:
+        await close_shared_clients()
+
+    print(f"Upstream requests: {_Handler.requests_served}")
+    print(f"Cached lookup:     {per_lookup_us:.1f} us avg over {len(pairs)} pairs")
+    print(f"Cache stats:       {cache.stats()}")
+    print("OK")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Stub Frankfurter server for services/exchange.")
+    parser.add_argument("--port", type=int, default=int(os.getenv("FX_STUB_PORT", "8790")))
+    parser.add_argument("--check", action="store_true", help="Run the rate-cache self-check and exit.")
+    args = parser.parse_args()
+
+    server = serve(0 if args.check else args.port)
+    base_url = f"http://127.0.0.1:{server.server_address[1]}/v1"
+    if args.check:
+        try:
+            asyncio.run(_check(base_url))
+        finally:
+            server.shutdown()
+        return
+
+    print(f"Serving stub exchange rates at {base_url} (Ctrl+C to stop)")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
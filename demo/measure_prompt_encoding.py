@@ -0,0 +1,68 @@
+import argparse
+import json
+import sys
+from pathlib import Path
+
+# Compares the WHOOP prompt snapshot encodings over recorded summaries.
+# Token counts use tiktoken (cl100k_base) when installed, else chars/4.
+
+ROOT_DIR = Path(__file__).resolve().parents[1]
+if str(ROOT_DIR) not in sys.path:
+    sys.path.insert(0, str(ROOT_DIR))
+
+from services.whoop_prompt import encode_compact, encode_json, estimate_tokens
+
+DEFAULT_FIXTURES = ROOT_DIR / "demo" / "fixtures" / "whoop_summaries.json"
+
+
+def _token_counter():
+    try:
+        import tiktoken
+    except ImportError:
+        return estimate_tokens, "chars/4 estimate"
+    encoding = tiktoken.get_encoding("cl100k_base")
+    return (lambda text: len(encoding.encode(text))), "tiktoken cl100k_base"
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Measure WHOOP prompt encoding size.")
+    parser.add_argument("fixtures", nargs="?", default=str(DEFAULT_FIXTURES))
+    parser.add_argument("--max-tokens", type=int, default=None, help="Budget for the compact encoding.")
+    parser.add_argument("--show", action="store_true", help="Print the compact encoding of each summary.")
+    args = parser.parse_args()
+
+    summaries = json.loads(Path(args.fixtures).read_text(encoding="utf-8"))
+    count_tokens, counter_name = _token_counter()
+
+    totals = {"json_chars": 0, "compact_chars": 0, "json_tokens": 0, "compact_tokens": 0}
+    print(f"Token counter: {counter_name}")
+    print(f"{'#':>3} {'json chars':>11} {'compact chars':>14} {'json tok':>9} {'compact tok':>12} {'saved':>7}")
+    for index, summary in enumerate(summaries):
+        legacy = encode_json(summary)
+        compact = encode_compact(summary, max_tokens=args.max_tokens)
+        row = {
+            "json_chars": len(legacy),
+            "compact_chars": len(compact),
+            "json_tokens": count_tokens(legacy),
+            "compact_tokens": count_tokens(compact),
+        }
+        for key, value in row.items():
+            totals[key] += value
+        saved = 1 - row["compact_tokens"] / row["json_tokens"] if row["json_tokens"] else 0.0
+        print(
+            f"{index:>3} {row['json_chars']:>11} {row['compact_chars']:>14}"
+            f" {row['json_tokens']:>9} {row['compact_tokens']:>12} {saved:>6.0%}"
+        )
+        if args.show:
+            print(compact)
+            print()
+
+    saved = 1 - totals["compact_tokens"] / totals["json_tokens"] if totals["json_tokens"] else 0.0
+    print(
+        f"{'all':>3} {totals['json_chars']:>11} {totals['compact_chars']:>14}"
+        f" {totals['json_tokens']:>9} {totals['compact_tokens']:>12} {saved:>6.0%}"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -20,13 +20,17 @@ load_dotenv(dotenv_path=ROOT_DIR / ".env")
 os.environ.setdefault("HALA_WS_URL", "ws://localhost:8000/ws/chat/v2")
 
 from orchestration.runner import run_mission_from_config
+from services.http_client import close_shared_clients
 
 
 async def main() -> None:
-    state = await run_mission_from_config(
-        mission_name="travel_planner",
-        objective_override="Plan a 4-day trip to Tokyo. Convert 1500 USD to JPY.",
-    )
+    try:
+        state = await run_mission_from_config(
+            mission_name="travel_planner",
+            objective_override="Plan a 4-day trip to Tokyo. Convert 1500 USD to JPY.",
+        )
+    finally:
+        await close_shared_clients()
     print(state.final_output or state.data)
 
 
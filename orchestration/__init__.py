@@ -1,7 +1,19 @@
+from orchestration.parallel import (
+    ToolCall,
+    ToolOutcome,
+    default_tool_timeout,
+    run_tools_concurrently,
+    use_tool_timeout,
+)
 from orchestration.runner import run_mission_from_config
 from orchestration.tooling import get_tool_factories
 
 __all__ = [
     "run_mission_from_config",
     "get_tool_factories",
+    "run_tools_concurrently",
+    "default_tool_timeout",
+    "use_tool_timeout",
+    "ToolCall",
+    "ToolOutcome",
 ]
@@ -0,0 +1,105 @@
+import asyncio
+import logging
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Dict, Iterable, Iterator, Optional
+
+import yaml
+
+DEFAULT_TOOL_TIMEOUT_SEC = 8.0
+
+# Set by the runner for the mission it is running, from the config it built the runtime with.
+_MISSION_TOOL_TIMEOUT: ContextVar[Optional[float]] = ContextVar("mission_tool_timeout", default=None)
+
+
+def default_tool_timeout(config_path: Optional[str | Path] = None) -> float:
+    """``defaults.timeouts.tool_sec`` for tool calls.
+
+    With ``config_path`` the value is read from that file. Otherwise it is
+    the timeout of the mission being run (see ``use_tool_timeout``), falling
+    back to ``DEFAULT_TOOL_TIMEOUT_SEC`` outside a mission.
+    """
+    if config_path is None:
+        timeout = _MISSION_TOOL_TIMEOUT.get()
+        return DEFAULT_TOOL_TIMEOUT_SEC if timeout is None else timeout
+    try:
+        with open(config_path, "r", encoding="utf-8") as handle:
+            config = yaml.safe_load(handle) or {}
+        return float(config["defaults"]["timeouts"]["tool_sec"])
+    except (OSError, KeyError, TypeError, ValueError, yaml.YAMLError):
+        return DEFAULT_TOOL_TIMEOUT_SEC
+
+
+@contextmanager
+def use_tool_timeout(timeout: float) -> Iterator[None]:
+    """Make ``timeout`` the default for tool calls made inside this block (and tasks it starts)."""
+    token = _MISSION_TOOL_TIMEOUT.set(timeout)
+    try:
+        yield
+    finally:
+        _MISSION_TOOL_TIMEOUT.reset(token)
+
+
+@dataclass
+class ToolCall:
+    key: str
+    tool: Any
+    kwargs: Dict[str, Any] = field(default_factory=dict)
+    timeout: Optional[float] = None
+
+
+@dataclass
+class ToolOutcome:
+    key: str
+    value: Any = None
+    error: Optional[BaseException] = None
+    elapsed: float = 0.0
+    skipped: bool = False
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None and not self.skipped
+
+
+async def _run_call(call: ToolCall, timeout: float, logger: Optional[logging.Logger]) -> ToolOutcome:
+    outcome = ToolOutcome(call.key)
+    if call.tool is None:
+        outcome.skipped = True
+        return outcome
+    started = time.monotonic()
+    try:
+        outcome.value = await asyncio.wait_for(call.tool.run(**call.kwargs), timeout=timeout)
+    except asyncio.TimeoutError as exc:
+        outcome.error = exc
+        if logger:
+            logger.warning("%s tool timed out after %.1fs", call.key, timeout)
+    except Exception as exc:
+        outcome.error = exc
+        if logger:
+            logger.warning("%s tool failed: %s", call.key, exc)
+    outcome.elapsed = time.monotonic() - started
+    return outcome
+
+
+async def run_tools_concurrently(
+    calls: Iterable[ToolCall],
+    logger: Optional[logging.Logger] = None,
+    default_timeout: Optional[float] = None,
+) -> Dict[str, ToolOutcome]:
+    """Run independent tool calls at the same time and collect every outcome.
+
+    Each call gets its own timeout (``ToolCall.timeout``, else
+    ``default_timeout``, else the mission's ``defaults.timeouts.tool_sec``). A failing or
+    timed-out call is recorded on its outcome and never cancels the others;
+    calls whose tool is None are marked skipped.
+    """
+    calls = list(calls)
+    if default_timeout is None:
+        default_timeout = default_tool_timeout()
+    outcomes = await asyncio.gather(
+        *(_run_call(call, call.timeout or default_timeout, logger) for call in calls)
+    )
+    return {outcome.key: outcome for outcome in outcomes}
@@ -3,10 +3,11 @@ from typing import Optional
 
 from hala_orchestrator.loader import create_runtime
 
+from orchestration.parallel import default_tool_timeout, use_tool_timeout
 from orchestration.tooling import get_tool_factories
 
 
-def _default_config_path() -> Path:
+def default_config_path() -> Path:
     return Path(__file__).resolve().parents[1] / "config" / "orchestrator.yaml"
 
 
@@ -16,10 +17,12 @@ async def run_mission_from_config(
     config_path: Optional[str | Path] = None,
     mission_id: Optional[str] = None,
 ):
-    path = Path(config_path) if config_path else _default_config_path()
+    path = Path(config_path) if config_path else default_config_path()
     runtime = create_runtime(path, tool_factories=get_tool_factories())
-    return await runtime.run_mission(
-        mission_name=mission_name,
-        objective_override=objective_override,
-        mission_id=mission_id,
-    )
+    # Agents running concurrent tool calls pick up this config's tool timeout.
+    with use_tool_timeout(default_tool_timeout(path)):
+        return await runtime.run_mission(
+            mission_name=mission_name,
+            objective_override=objective_override,
+            mission_id=mission_id,
+        )
@@ -20,6 +20,7 @@ class HalaWSTool(Tool):
         system_prompt = kwargs.get("system_prompt")
         include_history = kwargs.get("include_history", False)
         start_session = kwargs.get("start_session", False)
+        use_cache = kwargs.get("use_cache", False)
         max_tokens = kwargs.get("max_tokens")
         if not max_tokens:
             max_tokens = self.max_tokens
@@ -33,6 +34,7 @@ class HalaWSTool(Tool):
                 start_session=start_session,
                 include_history=include_history,
                 ws_url=self.ws_url,
+                use_cache=use_cache,
             ),
             timeout=self.timeout_sec,
         )
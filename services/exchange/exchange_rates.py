@@ -1,30 +1,188 @@
+import asyncio
 import os
-from typing import Any, Dict, Optional
+import time
+from dataclasses import dataclass
+from datetime import date, datetime, timedelta
+from datetime import time as dt_time
+from typing import Any, Dict, Iterable, List, Optional
+from zoneinfo import ZoneInfo
 
 import httpx
 
+from config.logging import get_logger
+from services.http_client import get_shared_client
+
+logger = get_logger("ExchangeRates")
 
 # Frankfurter API (no key required): https://api.frankfurter.dev/v1/latest
 EXCHANGE_BASE_URL = os.getenv("EXCHANGE_API_BASE", "https://api.frankfurter.dev/v1")
+HTTP_CLIENT_NAME = "exchange"
 
+# Frankfurter republishes the ECB reference rates, which come out once per
+# working day at around 16:00 CET. A table stays fresh until the next one is due.
+PUBLICATION_TZ = ZoneInfo("Europe/Berlin")
+PUBLICATION_TIME = dt_time(16, 0)
+PUBLICATION_GRACE = timedelta(minutes=15)
 
-async def fetch_rate(base: str, target: str) -> Optional[float]:
-    base = base.upper()
-    target = target.upper()
-    url = f"{EXCHANGE_BASE_URL}/latest"
-    params = {"base": base, "symbols": target}
 
-    async with httpx.AsyncClient(timeout=10.0) as client:
-        response = await client.get(url, params=params)
+def next_publication(published: date) -> datetime:
+    """When the table following the one dated ``published`` is expected."""
+    day = published + timedelta(days=1)
+    while day.weekday() >= 5:
+        day += timedelta(days=1)
+    return datetime.combine(day, PUBLICATION_TIME, tzinfo=PUBLICATION_TZ) + PUBLICATION_GRACE
+
+
+@dataclass
+class RateTable:
+    base: str
+    rates: Dict[str, float]
+    published: Optional[date]
+    fetched_at: float
+    expires_at: float
+
+    def rate(self, base: str, target: str) -> Optional[float]:
+        """Cross rate ``base -> target`` derived from this table's base."""
+        base_rate = self.rates.get(base.upper())
+        target_rate = self.rates.get(target.upper())
+        if not base_rate or target_rate is None:
+            return None
+        return target_rate / base_rate
+
+
+class ExchangeRateCache:
+    """Latest-rate tables per base currency, refreshed on the publication schedule.
+
+    Every pair is derived from the ``pivot`` table, so after the first fetch
+    lookups are dictionary reads. Concurrent misses for a base share one
+    request. If a refresh fails, the expired table keeps being served until
+    the next attempt succeeds.
+    """
+
+    def __init__(self, pivot: str = "EUR", min_ttl: float = 900.0, max_ttl: float = 4 * 86400.0):
+        self.pivot = pivot.upper()
+        self.min_ttl = min_ttl
+        self.max_ttl = max_ttl
+        self._tables: Dict[str, RateTable] = {}
+        self._inflight: Dict[str, asyncio.Future] = {}
+        self.hits = 0
+        self.misses = 0
+        self.stale_served = 0
+
+    def _ttl(self, published: Optional[date]) -> float:
+        if published is None:
+            return self.min_ttl
+        remaining = (next_publication(published) - datetime.now(PUBLICATION_TZ)).total_seconds()
+        # Past due (late publication, bank holiday): poll again soon.
+        return max(self.min_ttl, min(remaining, self.max_ttl))
+
+    async def _fetch(self, base: str) -> RateTable:
+        client = get_shared_client(HTTP_CLIENT_NAME, timeout=10.0)
+        response = await client.get(f"{EXCHANGE_BASE_URL}/latest", params={"base": base})
         response.raise_for_status()
         payload = response.json()
 
-    rates = payload.get("rates", {})
-    return rates.get(target)
+        rates = {code.upper(): float(value) for code, value in (payload.get("rates") or {}).items()}
+        rates[base] = 1.0
+        try:
+            published = date.fromisoformat(payload.get("date") or "")
+        except ValueError:
+            published = None
+        now = time.time()
+        table = RateTable(base, rates, published, now, now + self._ttl(published))
+        self._tables[base] = table
+        logger.info(
+            "Fetched %s rate table dated %s (%d currencies, fresh for %.0fs)",
+            base, published, len(rates), table.expires_at - now,
+        )
+        return table
 
+    async def _refresh(self, base: str) -> RateTable:
+        try:
+            return await self._fetch(base)
+        except (httpx.HTTPError, ValueError) as exc:
+            stale = self._tables.get(base)
+            if stale is None:
+                raise
+            self.stale_served += 1
+            stale.expires_at = time.time() + self.min_ttl
+            logger.warning("Rate refresh for %s failed, serving table dated %s: %s", base, stale.published, exc)
+            return stale
 
-async def convert_currency(amount: Optional[float], base: str, target: str) -> Dict[str, Any]:
-    rate = await fetch_rate(base, target)
+    async def get_table(self, base: Optional[str] = None) -> RateTable:
+        base = (base or self.pivot).upper()
+        table = self._tables.get(base)
+        if table is not None and table.expires_at > time.time():
+            self.hits += 1
+            return table
+        self.misses += 1
+
+        task = self._inflight.get(base)
+        if task is None:
+            task = asyncio.ensure_future(self._refresh(base))
+            self._inflight[base] = task
+
+            def _forget(done: asyncio.Future) -> None:
+                if self._inflight.get(base) is done:
+                    self._inflight.pop(base, None)
+
+            task.add_done_callback(_forget)
+        return await asyncio.shield(task)
+
+    async def rate(self, base: str, target: str) -> Optional[float]:
+        base = base.upper()
+        target = target.upper()
+        if base == target:
+            return 1.0
+        table = await self.get_table()
+        rate = table.rate(base, target)
+        if rate is None and base not in table.rates:
+            # Not covered by the pivot table; ask for the base's own table.
+            try:
+                rate = (await self.get_table(base)).rate(base, target)
+            except httpx.HTTPStatusError as exc:
+                if exc.response.status_code not in (404, 422):
+                    raise
+                logger.info("No exchange rates published for %s", base)
+        return rate
+
+    def invalidate(self, base: Optional[str] = None) -> None:
+        if base is None:
+            self._tables.clear()
+        else:
+            self._tables.pop(base.upper(), None)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "tables": {
+                base: {"published": str(table.published), "currencies": len(table.rates)}
+                for base, table in self._tables.items()
+            },
+            "hits": self.hits,
+            "misses": self.misses,
+            "stale_served": self.stale_served,
+        }
+
+
+_RATE_CACHE: Optional[ExchangeRateCache] = None
+
+
+def get_rate_cache() -> ExchangeRateCache:
+    global _RATE_CACHE
+    if _RATE_CACHE is None:
+        _RATE_CACHE = ExchangeRateCache(
+            pivot=os.getenv("EXCHANGE_PIVOT_CURRENCY", "EUR"),
+            min_ttl=float(os.getenv("EXCHANGE_CACHE_MIN_TTL_SECONDS", "900")),
+            max_ttl=float(os.getenv("EXCHANGE_CACHE_MAX_TTL_SECONDS", str(4 * 86400))),
+        )
+    return _RATE_CACHE
+
+
+async def fetch_rate(base: str, target: str) -> Optional[float]:
+    return await get_rate_cache().rate(base, target)
+
+
+def _conversion(amount: Optional[float], base: str, target: str, rate: Optional[float]) -> Dict[str, Any]:
     converted = None
     if rate is not None and amount is not None:
         try:
@@ -39,3 +197,23 @@ async def convert_currency(amount: Optional[float], base: str, target: str) -> D
         "amount": amount,
         "converted": converted,
     }
+
+
+async def convert_currency(amount: Optional[float], base: str, target: str) -> Dict[str, Any]:
+    rate = await fetch_rate(base, target)
+    return _conversion(amount, base, target, rate)
+
+
+async def convert_many(conversions: Iterable[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Convert several ``{"amount", "base", "target"}`` requests against the cached tables.
+
+    ``base`` defaults to USD as in ``ExchangeRatesTool``. Results keep the
+    input order; pairs that cannot be priced come back with ``rate=None``.
+    """
+    cache = get_rate_cache()
+    results = []
+    for item in conversions:
+        base = item.get("base") or "USD"
+        target = item["target"]
+        results.append(_conversion(item.get("amount"), base, target, await cache.rate(base, target)))
+    return results
@@ -1,22 +1,298 @@
+import asyncio
+import hashlib
 import json
 import os
+import random
+import re
+import time
+import uuid
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Callable, Dict, List, Optional, Tuple
 
 import websockets
 
+from config.logging import get_logger
+
 DEFAULT_WS_URL = "ws://localhost:8000/ws/chat/v2"
 
+logger = get_logger("HalaWS")
 
-async def query_hala(
-    prompt,
-    session_id,
-    max_tokens=512,
-    system_prompt=None,
-    start_session=False,
-    include_history=False,
-    history_window=1,
-    ws_url=None,
-):
+
+class HalaWSPool:
+    """Keeps warm WebSocket connections to one HalaAI endpoint.
+
+    The HalaAI protocol streams a single response at a time per socket, so a
+    connection is checked out for the duration of one request and returned to
+    the idle list afterwards. Every request is tagged with a ``request_id``.
+    """
+
+    def __init__(
+        self,
+        endpoint: str,
+        max_size: int = 4,
+        idle_timeout: float = 300.0,
+        ping_after: float = 20.0,
+        ping_timeout: float = 5.0,
+        connect_retries: int = 3,
+        backoff_base: float = 0.25,
+        backoff_max: float = 4.0,
+    ):
+        self.endpoint = endpoint
+        self.max_size = max(1, max_size)
+        self.idle_timeout = idle_timeout
+        self.ping_after = ping_after
+        self.ping_timeout = ping_timeout
+        self.connect_retries = max(1, connect_retries)
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self._idle: List[tuple] = []
+        self._slots = asyncio.Semaphore(self.max_size)
+        self._closed = False
+
+    async def _connect(self):
+        delay = self.backoff_base
+        for attempt in range(1, self.connect_retries + 1):
+            try:
+                return await websockets.connect(self.endpoint)
+            except (OSError, asyncio.TimeoutError, websockets.exceptions.WebSocketException) as exc:
+                if attempt == self.connect_retries:
+                    raise
+                logger.warning(
+                    "HalaAI connect failed (%s/%s) to %s: %s",
+                    attempt,
+                    self.connect_retries,
+                    self.endpoint,
+                    exc,
+                )
+                await asyncio.sleep(delay + random.uniform(0, delay / 2))
+                delay = min(delay * 2, self.backoff_max)
+
+    async def _is_alive(self, ws, idle_for: float) -> bool:
+        if getattr(ws, "close_code", None) is not None:
+            return False
+        if idle_for < self.ping_after:
+            return True
+        try:
+            pong = await ws.ping()
+            await asyncio.wait_for(pong, timeout=self.ping_timeout)
+            return True
+        except Exception:
+            return False
+
+    async def _checkout(self):
+        while self._idle:
+            ws, returned_at = self._idle.pop()
+            idle_for = time.monotonic() - returned_at
+            if idle_for <= self.idle_timeout and await self._is_alive(ws, idle_for):
+                return ws
+            await _close_quietly(ws)
+        return await self._connect()
+
+    def _checkin(self, ws) -> None:
+        if self._closed or getattr(ws, "close_code", None) is not None:
+            asyncio.ensure_future(_close_quietly(ws))
+            return
+        self._idle.append((ws, time.monotonic()))
+
+    @asynccontextmanager
+    async def connection(self):
+        async with self._slots:
+            ws = await self._checkout()
+            try:
+                yield ws
+            except BaseException:
+                # The socket may still have frames from an unfinished response.
+                await _close_quietly(ws)
+                raise
+            else:
+                self._checkin(ws)
+
+    async def close(self) -> None:
+        self._closed = True
+        idle, self._idle = self._idle, []
+        for ws, _ in idle:
+            await _close_quietly(ws)
+
+
+async def _close_quietly(ws) -> None:
+    try:
+        await ws.close()
+    except Exception:
+        pass
+
+
+# Sockets are bound to the loop that opened them (e.g. repeated asyncio.run
+# calls), so pools are kept per loop object. Holding the loop itself means its
+# id cannot be recycled while the entry exists; entries for closed loops are
+# dropped on the next lookup, since their sockets can no longer be used.
+_POOLS: Dict[asyncio.AbstractEventLoop, Dict[str, HalaWSPool]] = {}
+
+
+def _drop_closed_loops() -> None:
+    for loop in [loop for loop in _POOLS if loop.is_closed()]:
+        _POOLS.pop(loop, None)
+
+
+def _resolve_endpoint(endpoint: Optional[str] = None) -> str:
+    return endpoint or os.getenv("HALA_WS_URL", DEFAULT_WS_URL)
+
+
+def get_pool(endpoint: Optional[str] = None) -> HalaWSPool:
+    endpoint = _resolve_endpoint(endpoint)
+    loop = asyncio.get_running_loop()
+    pools = _POOLS.get(loop)
+    if pools is None:
+        _drop_closed_loops()
+        pools = _POOLS[loop] = {}
+    pool = pools.get(endpoint)
+    if pool is None:
+        pool = HalaWSPool(
+            endpoint,
+            max_size=int(os.getenv("HALA_WS_POOL_SIZE", "4")),
+            idle_timeout=float(os.getenv("HALA_WS_IDLE_TIMEOUT_SECONDS", "300")),
+        )
+        pools[endpoint] = pool
+    return pool
+
+
+async def close_pools() -> None:
+    """Close the running loop's pools and forget those of closed loops."""
+    pools = _POOLS.pop(asyncio.get_running_loop(), {})
+    _drop_closed_loops()
+    for pool in pools.values():
+        await pool.close()
+
+
+_UUID_PATTERN = re.compile(r"\b[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12}\b", re.IGNORECASE)
+_DATE_PATTERN = re.compile(r"\b\d{4}-\d{2}-\d{2}\b|\b\d{1,2}:\d{2}\b")
+_WHITESPACE_PATTERN = re.compile(r"\s+")
+
+
+def normalize_prompt(text: Optional[str]) -> str:
+    """Collapse whitespace and case, and blank out ids."""
+    text = _UUID_PATTERN.sub("<id>", text or "")
+    return _WHITESPACE_PATTERN.sub(" ", text).strip().casefold()
+
+
+def _mentions_time(*texts: Optional[str]) -> bool:
+    return any(text and _DATE_PATTERN.search(text) for text in texts)
+
+
+def _digest(*parts) -> str:
+    return hashlib.sha256(json.dumps(parts, ensure_ascii=False).encode("utf-8")).hexdigest()
+
+
+class HalaResponseCache:
+    """Completed HalaAI responses, looked up by exact then normalized prompt.
+
+    Both tiers key on ``(endpoint, system_prompt, prompt, max_tokens)``. The
+    exact tier uses the fields as sent; the normalized tier applies
+    ``normalize_prompt``, so reformatted prompts or fresh ids still hit.
+    Prompts containing a date or time only use the exact tier, since the
+    answer usually depends on them. Both tiers share one TTL and one LRU
+    bound.
+    """
+
+    def __init__(self, max_entries: int = 512, ttl: float = 3600.0):
+        self.max_entries = max(1, max_entries)
+        self.ttl = ttl
+        self._exact: "OrderedDict[str, Tuple[str, float]]" = OrderedDict()
+        self._normalized: "OrderedDict[str, Tuple[str, float]]" = OrderedDict()
+        self.exact_hits = 0
+        self.normalized_hits = 0
+        self.misses = 0
+        self.bypassed = 0
+
+    @staticmethod
+    def keys(endpoint, system_prompt, prompt, max_tokens) -> Tuple[str, Optional[str]]:
+        exact = _digest(endpoint, system_prompt or "", prompt or "", max_tokens)
+        if _mentions_time(system_prompt, prompt):
+            return exact, None
+        normalized = _digest(endpoint, normalize_prompt(system_prompt), normalize_prompt(prompt), max_tokens)
+        return exact, normalized
+
+    def _lookup(self, tier: "OrderedDict[str, Tuple[str, float]]", key: Optional[str]) -> Optional[str]:
+        if key is None:
+            return None
+        entry = tier.get(key)
+        if entry is None:
+            return None
+        if entry[1] <= time.monotonic():
+            tier.pop(key, None)
+            return None
+        tier.move_to_end(key)
+        return entry[0]
+
+    def get(self, endpoint, system_prompt, prompt, max_tokens) -> Optional[str]:
+        exact, normalized = self.keys(endpoint, system_prompt, prompt, max_tokens)
+        response = self._lookup(self._exact, exact)
+        if response is not None:
+            self.exact_hits += 1
+            return response
+        response = self._lookup(self._normalized, normalized)
+        if response is not None:
+            self.normalized_hits += 1
+            return response
+        self.misses += 1
+        return None
+
+    def put(self, endpoint, system_prompt, prompt, max_tokens, response: str) -> None:
+        if not response:
+            return
+        expires_at = time.monotonic() + self.ttl
+        for tier, key in zip((self._exact, self._normalized), self.keys(endpoint, system_prompt, prompt, max_tokens)):
+            if key is None:
+                continue
+            tier[key] = (response, expires_at)
+            tier.move_to_end(key)
+            while len(tier) > self.max_entries:
+                tier.popitem(last=False)
+
+    def clear(self) -> None:
+        self._exact.clear()
+        self._normalized.clear()
+
+    def stats(self) -> Dict[str, int]:
+        lookups = self.exact_hits + self.normalized_hits + self.misses
+        return {
+            "entries": len(self._exact),
+            "exact_hits": self.exact_hits,
+            "normalized_hits": self.normalized_hits,
+            "misses": self.misses,
+            "bypassed": self.bypassed,
+            "hit_rate_pct": round(100.0 * (self.exact_hits + self.normalized_hits) / lookups, 1) if lookups else 0.0,
+        }
+
+
+_RESPONSE_CACHE: Optional[HalaResponseCache] = None
+
+
+def get_response_cache() -> Optional[HalaResponseCache]:
+    """The process-wide response cache, or None when ``HALA_CACHE_ENABLED`` is off."""
+    global _RESPONSE_CACHE
+    if os.getenv("HALA_CACHE_ENABLED", "1").lower() in ("0", "false", "no"):
+        return None
+    if _RESPONSE_CACHE is None:
+        _RESPONSE_CACHE = HalaResponseCache(
+            max_entries=int(os.getenv("HALA_CACHE_MAX_ENTRIES", "512")),
+            ttl=float(os.getenv("HALA_CACHE_TTL_SECONDS", "3600")),
+        )
+    return _RESPONSE_CACHE
+
+
+async def _start_session_only(session_id, ws_url) -> None:
+    # A cached answer skips generation, but the caller still expects the session to exist.
+    try:
+        async with get_pool(ws_url).connection() as ws:
+            await ws.send(json.dumps({"type": "session_start", "session_id": session_id}))
+    except (OSError, asyncio.TimeoutError, websockets.exceptions.WebSocketException) as exc:
+        logger.warning("HalaAI session_start for %s failed: %s", session_id, exc)
+
+
+def _build_payload(prompt, session_id, max_tokens, system_prompt, include_history, history_window) -> Dict:
     payload = {
+        "request_id": str(uuid.uuid4()),
         "prompt": prompt,
         "max_tokens": max_tokens,
         "session_id": session_id,
@@ -25,23 +301,128 @@ async def query_hala(
     }
     if system_prompt:
         payload["system_prompt"] = system_prompt
+    return payload
+
+
+async def stream_hala(
+    prompt,
+    session_id,
+    max_tokens=512,
+    system_prompt=None,
+    start_session=False,
+    include_history=False,
+    history_window=1,
+    ws_url=None,
+    min_chunk_chars=0,
+    max_chunk_delay=0.0,
+    on_first_token: Optional[Callable[[float], None]] = None,
+    on_last_token: Optional[Callable[[float], None]] = None,
+    use_cache: bool = False,
+    one_shot: bool = False,
+) -> AsyncIterator[str]:
+    """Yield HalaAI output as it arrives.
 
-    endpoint = ws_url or os.getenv("HALA_WS_URL", DEFAULT_WS_URL)
-    async with websockets.connect(endpoint) as ws:
+    With the defaults every ``token`` frame is yielded as-is. ``min_chunk_chars``
+    and ``max_chunk_delay`` coalesce tokens into larger chunks: a chunk is
+    flushed once it reaches the size or has been held for the delay. The
+    timing hooks receive seconds elapsed since the prompt was sent. Closing
+    the generator (or cancelling its consumer) drops the socket mid-stream.
+
+    With ``use_cache`` (opt-in, for prompts whose answer does not depend on
+    the conversation) completed responses go through the response cache
+    (``get_response_cache``), unless the request reads session history. A hit
+    is yielded as a single chunk without a generation; the session is still
+    started unless ``one_shot`` says it will not be used again.
+    """
+    cache = get_response_cache() if use_cache else None
+    if cache is not None and include_history:
+        cache.bypassed += 1
+        cache = None
+    endpoint = _resolve_endpoint(ws_url)
+    if cache is not None:
+        cached = cache.get(endpoint, system_prompt, prompt, max_tokens)
+        if cached is not None:
+            if start_session and not one_shot:
+                await _start_session_only(session_id, ws_url)
+            if on_first_token:
+                on_first_token(0.0)
+            if on_last_token:
+                on_last_token(0.0)
+            yield cached
+            return
+
+    payload = _build_payload(prompt, session_id, max_tokens, system_prompt, include_history, history_window)
+    produced: List[str] = []
+
+    async with get_pool(ws_url).connection() as ws:
         if start_session:
             await ws.send(json.dumps({"type": "session_start", "session_id": session_id}))
+        sent_at = time.monotonic()
         await ws.send(json.dumps(payload))
 
-        tokens = []
+        pending: List[str] = []
+        pending_chars = 0
+        pending_since = 0.0
+        seen_token = False
         while True:
             raw = await ws.recv()
             data = json.loads(raw)
             msg_type = data.get("type")
             if msg_type == "token":
-                tokens.append(data.get("content", ""))
+                content = data.get("content", "")
+                now = time.monotonic()
+                if not seen_token:
+                    seen_token = True
+                    if on_first_token:
+                        on_first_token(now - sent_at)
+                if not pending:
+                    pending_since = now
+                pending.append(content)
+                pending_chars += len(content)
+                if pending_chars >= min_chunk_chars or now - pending_since >= max_chunk_delay:
+                    chunk = "".join(pending)
+                    pending, pending_chars = [], 0
+                    if chunk:
+                        produced.append(chunk)
+                        yield chunk
             elif msg_type == "end":
+                if seen_token and on_last_token:
+                    on_last_token(time.monotonic() - sent_at)
                 break
             elif msg_type == "error":
                 raise RuntimeError(data.get("detail", "Unknown error from HalaAI"))
 
+    if pending:
+        produced.append("".join(pending))
+        yield produced[-1]
+    if cache is not None:
+        cache.put(endpoint, system_prompt, prompt, max_tokens, "".join(produced).strip())
+
+
+async def query_hala(
+    prompt,
+    session_id,
+    max_tokens=512,
+    system_prompt=None,
+    start_session=False,
+    include_history=False,
+    history_window=1,
+    ws_url=None,
+    use_cache=False,
+    one_shot=False,
+):
+    tokens = []
+    async for chunk in stream_hala(
+        prompt,
+        session_id,
+        max_tokens=max_tokens,
+        system_prompt=system_prompt,
+        start_session=start_session,
+        include_history=include_history,
+        history_window=history_window,
+        ws_url=ws_url,
+        use_cache=use_cache,
+        one_shot=one_shot,
+    ):
+        tokens.append(chunk)
     return "".join(tokens).strip()
@@ -0,0 +1,52 @@
+import os
+from typing import Dict
+
+import httpx
+
+from config.logging import get_logger
+
+logger = get_logger("HttpClient")
+
+_CLIENTS: Dict[str, httpx.AsyncClient] = {}
+
+
+def _env_flag(name: str, default: str = "1") -> bool:
+    return os.getenv(name, default).lower() not in ("0", "false", "no")
+
+
+def _http2_available() -> bool:
+    try:
+        import h2  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+def get_shared_client(name: str = "default", timeout: float = 30.0) -> httpx.AsyncClient:
+    """Return the process-wide AsyncClient for ``name``, creating it on first use.
+
+    Pool sizing and protocol are read from ``<NAME>_HTTP_*`` environment
+    variables, e.g. ``WHOOP_HTTP_MAX_CONNECTIONS`` or ``WHOOP_HTTP2=0``.
+    """
+    client = _CLIENTS.get(name)
+    if client is not None and not client.is_closed:
+        return client
+
+    prefix = name.upper()
+    limits = httpx.Limits(
+        max_connections=int(os.getenv(f"{prefix}_HTTP_MAX_CONNECTIONS", "20")),
+        max_keepalive_connections=int(os.getenv(f"{prefix}_HTTP_MAX_KEEPALIVE", "10")),
+        keepalive_expiry=float(os.getenv(f"{prefix}_HTTP_KEEPALIVE_EXPIRY", "60")),
+    )
+    http2 = _env_flag(f"{prefix}_HTTP2") and _http2_available()
+    client = httpx.AsyncClient(timeout=timeout, limits=limits, http2=http2)
+    _CLIENTS[name] = client
+    logger.info("Created shared HTTP client %s (http2=%s)", name, http2)
+    return client
+
+
+async def close_shared_clients() -> None:
+    clients = list(_CLIENTS.values())
+    _CLIENTS.clear()
+    for client in clients:
+        await client.aclose()
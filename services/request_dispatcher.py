@@ -0,0 +1,100 @@
+import asyncio
+from collections import deque
+from typing import Awaitable, Callable, Deque, Dict, Hashable, Optional, Set, Tuple
+
+from config.logging import get_logger
+
+logger = get_logger("RequestDispatcher")
+
+Job = Callable[[], Awaitable[object]]
+
+
+class RequestDispatcher:
+    """Runs jobs from per-key FIFO queues under a global concurrency cap.
+
+    Jobs sharing a key (e.g. a Discord channel, and so one HalaAI session)
+    run one at a time in submission order. Keys with waiting work take turns
+    round-robin for the ``max_concurrency`` slots, so one busy channel cannot
+    starve the others. Submissions beyond ``max_queue_per_key`` for a key or
+    ``max_queued`` overall are rejected instead of queued.
+    """
+
+    def __init__(self, max_concurrency: int = 2, max_queue_per_key: int = 5, max_queued: int = 50):
+        self.max_concurrency = max(1, max_concurrency)
+        self.max_queue_per_key = max_queue_per_key
+        self.max_queued = max_queued
+        self._queues: Dict[Hashable, Deque[Tuple[Job, asyncio.Future]]] = {}
+        self._ready: Deque[Hashable] = deque()
+        self._active: Set[Hashable] = set()
+        self._tasks: Set[asyncio.Task] = set()
+        self._queued = 0
+        self.completed = 0
+        self.failed = 0
+        self.rejected = 0
+
+    def submit(self, key: Hashable, job: Job) -> Tuple[Optional[asyncio.Future], int]:
+        """Queue ``job`` under ``key``.
+
+        Returns ``(future, position)``: ``position`` is 0 when the job started
+        immediately, otherwise its 1-based place in the key's queue. The
+        future is None when the job was rejected.
+        """
+        queue = self._queues.get(key)
+        waiting = len(queue) if queue else 0
+        if waiting >= self.max_queue_per_key or self._queued >= self.max_queued:
+            self.rejected += 1
+            return None, waiting
+        future = asyncio.get_running_loop().create_future()
+        if queue is None:
+            queue = self._queues[key] = deque()
+        queue.append((job, future))
+        self._queued += 1
+        if key not in self._active and key not in self._ready:
+            self._ready.append(key)
+        self._pump()
+        position = next((index + 1 for index, (_, queued) in enumerate(queue) if queued is future), 0)
+        return future, position
+
+    def _pump(self) -> None:
+        while self._ready and len(self._active) < self.max_concurrency:
+            key = self._ready.popleft()
+            job, future = self._queues[key].popleft()
+            self._queued -= 1
+            self._active.add(key)
+            task = asyncio.create_task(self._run(key, job, future))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _run(self, key: Hashable, job: Job, future: asyncio.Future) -> None:
+        try:
+            result = await job()
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as exc:
+            self.failed += 1
+            logger.warning("Dispatched job for %s failed: %s", key, exc)
+            if not future.done():
+                future.set_exception(exc)
+        else:
+            self.completed += 1
+            if not future.done():
+                future.set_result(result)
+        finally:
+            self._active.discard(key)
+            if self._queues.get(key):
+                # Back of the line, behind every other key that is waiting.
+                self._ready.append(key)
+            else:
+                self._queues.pop(key, None)
+            self._pump()
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "in_flight": len(self._active),
+            "queued": self._queued,
+            "waiting_keys": len(self._ready),
+            "completed": self.completed,
+            "failed": self.failed,
+            "rejected": self.rejected,
+        }
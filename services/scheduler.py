@@ -0,0 +1,189 @@
+import asyncio
+import heapq
+import itertools
+import json
+from dataclasses import dataclass
+from datetime import datetime, time, timedelta, timezone, tzinfo
+from pathlib import Path
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+
+from config.logging import get_logger
+
+logger = get_logger("Scheduler")
+
+JobCallback = Callable[[datetime], Awaitable[None]]
+
+
+def _resolve_wall_time(day, at: time, tz: tzinfo) -> datetime:
+    """Aware datetime for a wall-clock time on ``day``, DST-safe.
+
+    A time skipped by a spring-forward gap resolves to the same instant
+    shifted past the gap; an ambiguous fall-back time uses its first
+    occurrence.
+    """
+    naive = datetime.combine(day, at)
+    candidate = naive.replace(tzinfo=tz, fold=0)
+    round_trip = candidate.astimezone(timezone.utc).astimezone(tz)
+    if round_trip.replace(tzinfo=None) != naive:
+        return round_trip
+    return candidate
+
+
+@dataclass(frozen=True)
+class DailyAt:
+    """Fires once a day at ``hour:minute`` local time in ``tz``, shifted by ``offset``."""
+
+    hour: int
+    minute: int
+    tz: tzinfo
+    offset: timedelta = timedelta(0)
+
+    def next_after(self, moment: datetime) -> datetime:
+        local = moment.astimezone(self.tz)
+        at = time(self.hour, self.minute)
+        day = local.date() - timedelta(days=1)
+        while True:
+            fire = _resolve_wall_time(day, at, self.tz) + self.offset
+            if fire > moment:
+                return fire
+            day += timedelta(days=1)
+
+
+@dataclass
+class Job:
+    name: str
+    trigger: DailyAt
+    callback: JobCallback
+    catch_up: timedelta
+
+
+class Scheduler:
+    """Runs async jobs at trigger times from a single sleeping task.
+
+    Next fire times live in a heap and the loop sleeps until the earliest
+    one, so there are no periodic wakeups. The last fire time of each job is
+    persisted to ``state_path`` before its callback runs: after a restart a
+    run that was already started is not repeated, and a run missed by less
+    than the job's ``catch_up`` window fires immediately.
+    """
+
+    def __init__(self, state_path: Optional[Path] = None):
+        self.state_path = Path(state_path) if state_path else None
+        self._jobs: Dict[str, Job] = {}
+        self._heap: List[Tuple[datetime, int, str]] = []
+        self._counter = itertools.count()
+        self._last_run: Dict[str, datetime] = self._load_state()
+        self._wakeup = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+        self._running: set = set()
+
+    def _load_state(self) -> Dict[str, datetime]:
+        if not self.state_path or not self.state_path.exists():
+            return {}
+        try:
+            raw = json.loads(self.state_path.read_text(encoding="utf-8"))
+            return {name: datetime.fromisoformat(value) for name, value in raw.items()}
+        except (OSError, ValueError) as exc:
+            logger.warning("Ignoring unreadable scheduler state %s: %s", self.state_path, exc)
+            return {}
+
+    def _save_state(self) -> None:
+        if not self.state_path:
+            return
+        self.state_path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.state_path.with_suffix(".tmp")
+        data = {name: moment.isoformat() for name, moment in self._last_run.items()}
+        tmp_path.write_text(json.dumps(data, indent=2, sort_keys=True), encoding="utf-8")
+        tmp_path.replace(self.state_path)
+
+    @staticmethod
+    def _now() -> datetime:
+        return datetime.now(timezone.utc)
+
+    def _first_fire(self, job: Job, now: datetime) -> datetime:
+        last = self._last_run.get(job.name)
+        if last is not None:
+            missed = job.trigger.next_after(last)
+            if missed <= now:
+                # Only the most recent missed run is worth catching up.
+                while (following := job.trigger.next_after(missed)) <= now:
+                    missed = following
+                if now - missed <= job.catch_up:
+                    logger.info("Catching up %s run scheduled for %s", job.name, missed.isoformat())
+                    return missed
+                logger.info("Skipping %s run scheduled for %s (outside catch-up window)", job.name, missed.isoformat())
+        return job.trigger.next_after(now)
+
+    def add_job(
+        self,
+        name: str,
+        trigger: DailyAt,
+        callback: JobCallback,
+        catch_up: timedelta = timedelta(0),
+    ) -> datetime:
+        """Register ``callback`` to run at each ``trigger`` time; returns the first fire time."""
+        if name in self._jobs:
+            raise ValueError(f"Job {name} is already scheduled")
+        job = Job(name, trigger, callback, catch_up)
+        self._jobs[name] = job
+        fire_at = self._first_fire(job, self._now())
+        heapq.heappush(self._heap, (fire_at, next(self._counter), name))
+        self._wakeup.set()
+        logger.info("Scheduled %s for %s", name, fire_at.isoformat())
+        return fire_at
+
+    def next_run(self, name: str) -> Optional[datetime]:
+        return min((fire_at for fire_at, _, job_name in self._heap if job_name == name), default=None)
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    def start(self) -> None:
+        if not self.running:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self) -> None:
+        while True:
+            self._wakeup.clear()
+            if not self._heap:
+                await self._wakeup.wait()
+                continue
+            fire_at, _, name = self._heap[0]
+            delay = (fire_at - self._now()).total_seconds()
+            if delay > 0:
+                # Adding a job interrupts the sleep so an earlier deadline is not missed.
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=delay)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            heapq.heappop(self._heap)
+            job = self._jobs[name]
+            self._last_run[name] = fire_at
+            try:
+                await asyncio.to_thread(self._save_state)
+            except OSError as exc:
+                logger.warning("Could not persist scheduler state: %s", exc)
+            task = asyncio.create_task(self._invoke(job, fire_at))
+            self._running.add(task)
+            task.add_done_callback(self._running.discard)
+            heapq.heappush(self._heap, (job.trigger.next_after(max(fire_at, self._now())), next(self._counter), name))
+
+    async def _invoke(self, job: Job, fire_at: datetime) -> None:
+        lateness = (self._now() - fire_at).total_seconds()
+        logger.info("Running %s (scheduled %s, %.1fs late)", job.name, fire_at.isoformat(), lateness)
+        try:
+            await job.callback(fire_at)
+        except Exception as exc:
+            logger.exception("Scheduled job %s failed: %s", job.name, exc)
@@ -0,0 +1,133 @@
+import json
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Callable, Dict, Generic, Optional, Tuple, TypeVar
+
+from config.logging import get_logger
+
+logger = get_logger("SessionRegistry")
+
+V = TypeVar("V")
+
+
+class SessionRegistry(Generic[V]):
+    """Bounded key -> value map with LRU and TTL eviction.
+
+    Every entry shares one TTL, so the OrderedDict's order is also expiry
+    order: with ``sliding=True`` a read renews the entry and moves it to the
+    end, with ``sliding=False`` entries expire ``ttl`` seconds after they were
+    set. Expired entries are always at the front, so purging pops from the
+    front until it meets a live one (amortized O(1) per entry).
+
+    Keys are stored as strings. With ``path`` set, the registry is loaded at
+    startup and rewritten (atomically) whenever an entry is added or removed.
+    Renewals are only written by ``save()``.
+    """
+
+    def __init__(
+        self,
+        max_entries: int = 1000,
+        ttl: Optional[float] = None,
+        path: Optional[Path] = None,
+        sliding: bool = True,
+    ):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.path = Path(path) if path else None
+        self.sliding = sliding
+        self._entries: "OrderedDict[str, Tuple[V, float]]" = OrderedDict()
+        self._load()
+
+    def _expiry(self, now: float) -> float:
+        return now + self.ttl if self.ttl else float("inf")
+
+    def _load(self) -> None:
+        if not self.path or not self.path.exists():
+            return
+        try:
+            raw = json.loads(self.path.read_text(encoding="utf-8"))
+        except (OSError, ValueError) as exc:
+            logger.warning("Ignoring unreadable session registry %s: %s", self.path, exc)
+            return
+        now = time.time()
+        entries = sorted(
+            ((key, item["value"], item.get("expires_at") or float("inf")) for key, item in raw.items()),
+            key=lambda entry: entry[2],
+        )
+        for key, value, expires_at in entries[-self.max_entries :]:
+            if expires_at > now:
+                self._entries[key] = (value, expires_at)
+
+    def save(self) -> None:
+        if not self.path:
+            return
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        data: Dict[str, Dict] = {
+            key: {"value": value, "expires_at": None if expires_at == float("inf") else expires_at}
+            for key, (value, expires_at) in self._entries.items()
+        }
+        tmp_path = self.path.with_suffix(".tmp")
+        try:
+            tmp_path.write_text(json.dumps(data, sort_keys=True), encoding="utf-8")
+            tmp_path.replace(self.path)
+        except OSError as exc:
+            logger.warning("Failed to persist session registry %s: %s", self.path, exc)
+
+    def purge_expired(self, now: Optional[float] = None) -> int:
+        now = time.time() if now is None else now
+        removed = 0
+        while self._entries:
+            key, (_, expires_at) = next(iter(self._entries.items()))
+            if expires_at > now:
+                break
+            self._entries.popitem(last=False)
+            removed += 1
+        return removed
+
+    def get(self, key) -> Optional[V]:
+        key = str(key)
+        now = time.time()
+        self.purge_expired(now)
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if self.sliding:
+            self._entries[key] = (entry[0], self._expiry(now))
+            self._entries.move_to_end(key)
+        return entry[0]
+
+    def set(self, key, value: V) -> None:
+        key = str(key)
+        now = time.time()
+        self.purge_expired(now)
+        self._entries[key] = (value, self._expiry(now))
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+        self.save()
+
+    def pop(self, key) -> Optional[V]:
+        self.purge_expired()
+        entry = self._entries.pop(str(key), None)
+        if entry is None:
+            return None
+        self.save()
+        return entry[0]
+
+    def get_or_create(self, key, factory: Callable[[], V]) -> Tuple[V, bool]:
+        """Return ``(value, created)``, creating and storing the value if missing."""
+        value = self.get(key)
+        if value is not None:
+            return value, False
+        value = factory()
+        self.set(key, value)
+        return value, True
+
+    def __contains__(self, key) -> bool:
+        self.purge_expired()
+        return str(key) in self._entries
+
+    def __len__(self) -> int:
+        self.purge_expired()
+        return len(self._entries)
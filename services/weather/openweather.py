@@ -1,27 +1,26 @@
+import asyncio
 import os
-from typing import Any, Dict, Optional
+from typing import Any, Dict, Iterable, List, Optional
 
 import httpx
 
+from config.logging import get_logger
+from services.http_client import get_shared_client
+from services.session_registry import SessionRegistry
+
+logger = get_logger("OpenWeather")
 
 OPENWEATHER_API_KEY = os.getenv("OPENWEATHER_API_KEY")
 OPENWEATHER_BASE_URL = os.getenv("OPENWEATHER_BASE_URL", "https://api.openweathermap.org/data/2.5/weather")
+OPENWEATHER_GEO_URL = os.getenv("OPENWEATHER_GEO_URL", "https://api.openweathermap.org/geo/1.0/direct")
+HTTP_CLIENT_NAME = "openweather"
 
 
-async def fetch_current_weather(city: str, units: str = "metric") -> Dict[str, Any]:
-    if not OPENWEATHER_API_KEY:
-        raise RuntimeError("OPENWEATHER_API_KEY is not set.")
+def normalize_city(city: str) -> str:
+    return " ".join(city.split()).casefold()
 
-    params = {
-        "q": city,
-        "appid": OPENWEATHER_API_KEY,
-        "units": units,
-    }
-    async with httpx.AsyncClient(timeout=10.0) as client:
-        response = await client.get(OPENWEATHER_BASE_URL, params=params)
-        response.raise_for_status()
-        payload = response.json()
 
+def _summarize(payload: Dict[str, Any], city: str, units: str) -> Dict[str, Any]:
     weather = payload.get("weather", [{}])[0]
     main = payload.get("main", {})
     wind = payload.get("wind", {})
@@ -37,3 +36,142 @@ async def fetch_current_weather(city: str, units: str = "metric") -> Dict[str, A
         "wind_speed": wind.get("speed"),
         "units": units,
     }
+
+
+def _describe(exc: Exception) -> str:
+    # httpx messages include the request URL, and with it the API key.
+    if isinstance(exc, httpx.HTTPStatusError):
+        return f"OpenWeather returned HTTP {exc.response.status_code}"
+    if isinstance(exc, httpx.HTTPError):
+        return f"OpenWeather request failed ({type(exc).__name__})"
+    return str(exc)
+
+
+class WeatherCache:
+    """Current conditions per (city, units) with a short TTL.
+
+    City names are resolved to coordinates once through the geocoding API
+    and remembered for ``geocode_ttl``; conditions are then fetched by
+    coordinates. Concurrent lookups for the same city and units share one
+    upstream request.
+    """
+
+    def __init__(self, ttl: float = 600.0, max_entries: int = 256, geocode_ttl: float = 30 * 86400.0):
+        self._current: SessionRegistry[Dict[str, Any]] = SessionRegistry(
+            max_entries=max_entries, ttl=ttl, sliding=False
+        )
+        self._geocodes: SessionRegistry[Optional[Dict[str, float]]] = SessionRegistry(
+            max_entries=4 * max_entries, ttl=geocode_ttl, sliding=True
+        )
+        self._inflight: Dict[str, asyncio.Future] = {}
+        self.hits = 0
+        self.misses = 0
+        self.geocode_misses = 0
+
+    async def _geocode(self, city: str) -> Optional[Dict[str, float]]:
+        name = normalize_city(city)
+        if name in self._geocodes:
+            return self._geocodes.get(name)
+        self.geocode_misses += 1
+        client = get_shared_client(HTTP_CLIENT_NAME, timeout=10.0)
+        response = await client.get(
+            OPENWEATHER_GEO_URL, params={"q": city, "limit": 1, "appid": OPENWEATHER_API_KEY}
+        )
+        response.raise_for_status()
+        matches = response.json() or []
+        coords = {"lat": matches[0]["lat"], "lon": matches[0]["lon"]} if matches else None
+        # Unknown names are remembered too (as None) so they are not looked up again.
+        self._geocodes.set(name, coords)
+        return coords
+
+    async def _fetch(self, city: str, units: str, key: str) -> Dict[str, Any]:
+        params: Dict[str, Any] = {"appid": OPENWEATHER_API_KEY, "units": units}
+        try:
+            coords = await self._geocode(city)
+        except (httpx.HTTPError, ValueError, KeyError) as exc:
+            logger.warning("Geocoding %s failed, querying by name: %s", city, _describe(exc))
+            coords = False
+        if coords is None:
+            raise ValueError(f"OpenWeather has no location named {city!r}.")
+        if coords:
+            params.update(coords)
+        else:
+            params["q"] = city
+
+        client = get_shared_client(HTTP_CLIENT_NAME, timeout=10.0)
+        response = await client.get(OPENWEATHER_BASE_URL, params=params)
+        response.raise_for_status()
+        result = _summarize(response.json(), city, units)
+        self._current.set(key, result)
+        return result
+
+    async def get(self, city: str, units: str = "metric") -> Dict[str, Any]:
+        if not OPENWEATHER_API_KEY:
+            raise RuntimeError("OPENWEATHER_API_KEY is not set.")
+        units = units.lower()
+        key = f"{units}|{normalize_city(city)}"
+        cached = self._current.get(key)
+        if cached is not None:
+            self.hits += 1
+            return dict(cached)
+        self.misses += 1
+
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(self._fetch(city, units, key))
+            self._inflight[key] = task
+
+            def _forget(done: asyncio.Future) -> None:
+                if self._inflight.get(key) is done:
+                    self._inflight.pop(key, None)
+
+            task.add_done_callback(_forget)
+        return dict(await asyncio.shield(task))
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "cached": len(self._current),
+            "geocoded": len(self._geocodes),
+            "hits": self.hits,
+            "misses": self.misses,
+            "geocode_misses": self.geocode_misses,
+        }
+
+
+_WEATHER_CACHE: Optional[WeatherCache] = None
+
+
+def get_weather_cache() -> WeatherCache:
+    global _WEATHER_CACHE
+    if _WEATHER_CACHE is None:
+        _WEATHER_CACHE = WeatherCache(
+            ttl=float(os.getenv("OPENWEATHER_CACHE_TTL_SECONDS", "600")),
+            max_entries=int(os.getenv("OPENWEATHER_CACHE_MAX_ENTRIES", "256")),
+        )
+    return _WEATHER_CACHE
+
+
+async def fetch_current_weather(city: str, units: str = "metric") -> Dict[str, Any]:
+    return await get_weather_cache().get(city, units)
+
+
+async def fetch_weather_many(
+    cities: Iterable[str], units: str = "metric", concurrency: int = 4
+) -> List[Dict[str, Any]]:
+    """Current weather for several cities, in input order.
+
+    Repeated and cached cities cost nothing extra. A city that cannot be
+    fetched comes back as ``{"city": ..., "error": ...}`` instead of failing
+    the whole batch.
+    """
+    semaphore = asyncio.Semaphore(max(1, concurrency))
+
+    async def _one(city: str) -> Dict[str, Any]:
+        async with semaphore:
+            try:
+                return await fetch_current_weather(city, units)
+            except (httpx.HTTPError, ValueError) as exc:
+                logger.warning("Weather lookup for %s failed: %s", city, _describe(exc))
+                return {"city": city, "error": _describe(exc), "units": units}
+
+    return list(await asyncio.gather(*(_one(city) for city in cities)))
@@ -0,0 +1,137 @@
+import asyncio
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from config.logging import get_logger
+
+logger = get_logger("WebhookCoalescer")
+
+EventKey = Tuple[str, str, str]
+BatchHandler = Callable[[str, List[Dict]], Awaitable[Any]]
+
+
+def event_key(payload: Dict) -> EventKey:
+    return (str(payload.get("user_id")), str(payload.get("type")), str(payload.get("id")))
+
+
+def latest_event_id(events: List[Dict], *prefixes: str) -> Optional[str]:
+    for event in reversed(events):
+        event_type = str(event.get("type") or "")
+        if event.get("id") and event_type.startswith(prefixes):
+            return event.get("id")
+    return None
+
+
+class _Batch:
+    __slots__ = ("events", "keys", "future")
+
+    def __init__(self, future: asyncio.Future):
+        self.events: List[Dict] = []
+        self.keys: List[EventKey] = []
+        self.future = future
+
+
+class WebhookCoalescer:
+    """Drops duplicate webhook events and merges bursts per user.
+
+    An event whose ``(user_id, type, id)`` completed within ``dedupe_ttl``
+    seconds is ignored. Otherwise the first event for a user opens a
+    ``window``-second batch; later events for that user join it, and the
+    handler runs once with every event in arrival order. ``submit`` resolves
+    when that run finishes. If it failed, only the event that opened the
+    batch raises, so a durable caller retries the batch once: its payload
+    now carries the other events under ``_coalesced``, and resubmitting it
+    restores them. The other submitters return normally. Keys are only
+    remembered after a successful run.
+    """
+
+    def __init__(
+        self,
+        handler: BatchHandler,
+        window: float = 10.0,
+        dedupe_ttl: float = 900.0,
+        max_keys: int = 10000,
+    ):
+        self.handler = handler
+        self.window = window
+        self.dedupe_ttl = dedupe_ttl
+        self.max_keys = max_keys
+        self._seen: "OrderedDict[EventKey, float]" = OrderedDict()
+        self._batches: Dict[str, _Batch] = {}
+        self._runs: set = set()
+        self._counters = {"received": 0, "duplicates": 0, "coalesced": 0, "runs": 0}
+
+    def _is_duplicate(self, key: EventKey) -> bool:
+        now = time.monotonic()
+        while self._seen:
+            expires_at = next(iter(self._seen.values()))
+            if expires_at > now:
+                break
+            self._seen.popitem(last=False)
+        return key in self._seen
+
+    def _remember(self, keys: List[EventKey]) -> None:
+        expires_at = time.monotonic() + self.dedupe_ttl
+        for key in keys:
+            self._seen.pop(key, None)
+            self._seen[key] = expires_at
+        while len(self._seen) > self.max_keys:
+            self._seen.popitem(last=False)
+
+    async def submit(self, payload: Dict) -> None:
+        self._counters["received"] += 1
+        key = event_key(payload)
+        if self._is_duplicate(key):
+            self._counters["duplicates"] += 1
+            logger.info("Skipping duplicate webhook event %s", key)
+            return
+
+        user_id = key[0]
+        batch = self._batches.get(user_id)
+        if batch is None:
+            loop = asyncio.get_running_loop()
+            batch = _Batch(loop.create_future())
+            self._batches[user_id] = batch
+            loop.call_later(self.window, self._fire, user_id, batch)
+        else:
+            self._counters["coalesced"] += 1
+
+        owner = not batch.events
+        for event in [payload, *payload.pop("_coalesced", [])]:
+            event_id = event_key(event)
+            if event_id not in batch.keys:
+                batch.events.append(event)
+                batch.keys.append(event_id)
+        try:
+            await asyncio.shield(batch.future)
+        except Exception:
+            if owner:
+                raise
+            # Retried as part of the owner's payload.
+
+    def _fire(self, user_id: str, batch: _Batch) -> None:
+        if self._batches.get(user_id) is batch:
+            del self._batches[user_id]
+        task = asyncio.ensure_future(self._run(user_id, batch))
+        self._runs.add(task)
+        task.add_done_callback(self._runs.discard)
+
+    async def _run(self, user_id: str, batch: _Batch) -> None:
+        self._counters["runs"] += 1
+        try:
+            await self.handler(user_id, batch.events)
+        except Exception as exc:
+            batch.events[0]["_coalesced"] = batch.events[1:]
+            batch.future.set_exception(exc)
+            # Mark retrieved; the owner re-raises it from the shield.
+            batch.future.exception()
+            return
+        except asyncio.CancelledError:
+            batch.future.cancel()
+            raise
+        self._remember(batch.keys)
+        batch.future.set_result(None)
+
+    def stats(self) -> Dict[str, Any]:
+        return {"open_batches": len(self._batches), "remembered_keys": len(self._seen), **self._counters}
@@ -0,0 +1,292 @@
+import asyncio
+import json
+import random
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from config.logging import get_logger
+
+logger = get_logger("WebhookQueue")
+
+Handler = Callable[[Dict], Awaitable[Any]]
+
+
+class _QueueLog:
+    """SQLite log of accepted events plus a dead-letter table."""
+
+    def __init__(self, path: Path):
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(path), check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS events ("
+            " id INTEGER PRIMARY KEY AUTOINCREMENT,"
+            " payload TEXT NOT NULL,"
+            " attempts INTEGER NOT NULL DEFAULT 0,"
+            " next_attempt_at REAL NOT NULL,"
+            " received_at REAL NOT NULL)"
+        )
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS dead_letters ("
+            " id INTEGER PRIMARY KEY,"
+            " payload TEXT NOT NULL,"
+            " attempts INTEGER NOT NULL,"
+            " last_error TEXT,"
+            " received_at REAL NOT NULL,"
+            " failed_at REAL NOT NULL)"
+        )
+
+    def append_many(self, payloads: List[Dict]) -> List[int]:
+        now = time.time()
+        with self._lock:
+            self._conn.execute("BEGIN")
+            ids = [
+                self._conn.execute(
+                    "INSERT INTO events (payload, next_attempt_at, received_at) VALUES (?, ?, ?)",
+                    (json.dumps(payload), now, now),
+                ).lastrowid
+                for payload in payloads
+            ]
+            self._conn.execute("COMMIT")
+        return ids
+
+    def pending(self) -> List[Tuple[int, Dict, int, float]]:
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT id, payload, attempts, next_attempt_at FROM events ORDER BY id"
+            ).fetchall()
+        return [(row[0], json.loads(row[1]), row[2], row[3]) for row in rows]
+
+    def complete(self, event_id: int) -> None:
+        with self._lock:
+            self._conn.execute("DELETE FROM events WHERE id = ?", (event_id,))
+
+    def reschedule(self, event_id: int, payload: Dict, attempts: int, next_attempt_at: float) -> None:
+        with self._lock:
+            self._conn.execute(
+                "UPDATE events SET payload = ?, attempts = ?, next_attempt_at = ? WHERE id = ?",
+                (json.dumps(payload), attempts, next_attempt_at, event_id),
+            )
+
+    def dead_letter(self, event_id: int, attempts: int, error: str) -> None:
+        with self._lock:
+            self._conn.execute("BEGIN")
+            self._conn.execute(
+                "INSERT OR REPLACE INTO dead_letters (id, payload, attempts, last_error, received_at, failed_at)"
+                " SELECT id, payload, ?, ?, received_at, ? FROM events WHERE id = ?",
+                (attempts, error, time.time(), event_id),
+            )
+            self._conn.execute("DELETE FROM events WHERE id = ?", (event_id,))
+            self._conn.execute("COMMIT")
+
+    def dead_letter_count(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM dead_letters").fetchone()[0]
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+
+class WebhookQueue:
+    """Bounded, durable work queue for webhook payloads.
+
+    ``submit`` is meant for the HTTP handler: it returns True only once the
+    payload is committed to the SQLite log, so an acknowledged event survives
+    a crash, and False when ``max_pending`` events are already outstanding
+    or the write failed, so the caller can shed load. A persister task
+    commits submissions arriving within ``flush_window`` seconds of each
+    other as one batch before they reach the worker pool, and events still
+    in the log are replayed on the next start. Failed
+    events are retried with jittered exponential backoff and moved to the
+    ``dead_letters`` table after ``max_attempts``. A retry receives the
+    payload as the failed attempt left it, so handlers can record decisions
+    on it (keys starting with ``_``) that must not be made twice.
+    """
+
+    def __init__(
+        self,
+        handler: Handler,
+        db_path: Path,
+        workers: int = 4,
+        max_pending: int = 1000,
+        max_attempts: int = 5,
+        backoff_base: float = 2.0,
+        backoff_max: float = 300.0,
+        batch_size: int = 100,
+        flush_window: float = 0.005,
+    ):
+        self.handler = handler
+        self.db_path = Path(db_path)
+        self.workers = max(1, workers)
+        self.max_pending = max(1, max_pending)
+        self.max_attempts = max(1, max_attempts)
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.batch_size = batch_size
+        self.flush_window = flush_window
+        self._log: Optional[_QueueLog] = None
+        self._ingest: Optional[asyncio.Queue] = None
+        self._ready: Optional[asyncio.Queue] = None
+        self._tasks: List[asyncio.Task] = []
+        self._timers: Dict[int, asyncio.TimerHandle] = {}
+        self._pending = 0
+        self._in_flight = 0
+        self._counters = {"accepted": 0, "rejected": 0, "processed": 0, "retried": 0, "dead_lettered": 0}
+        self._dead_letters = 0
+
+    @property
+    def running(self) -> bool:
+        return bool(self._tasks)
+
+    async def start(self) -> None:
+        if self.running:
+            return
+        self._log = await asyncio.to_thread(_QueueLog, self.db_path)
+        self._ingest = asyncio.Queue()
+        self._ready = asyncio.Queue()
+        self._dead_letters = await asyncio.to_thread(self._log.dead_letter_count)
+
+        replay = await asyncio.to_thread(self._log.pending)
+        now = time.time()
+        for event_id, payload, attempts, next_attempt_at in replay:
+            self._pending += 1
+            self._schedule((event_id, payload, attempts), max(0.0, next_attempt_at - now))
+        if replay:
+            logger.info("Replaying %s pending webhook event(s) from %s", len(replay), self.db_path)
+
+        self._tasks.append(asyncio.create_task(self._persist_loop()))
+        for _ in range(self.workers):
+            self._tasks.append(asyncio.create_task(self._worker_loop()))
+
+    async def stop(self) -> None:
+        if not self.running:
+            return
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        # Commit and acknowledge whatever was submitted; it is replayed on the next start.
+        await self._flush_ingest()
+        for timer in self._timers.values():
+            timer.cancel()
+        self._timers.clear()
+        await asyncio.to_thread(self._log.close)
+
+    async def submit(self, payload: Dict) -> bool:
+        if not self.running or self._pending >= self.max_pending:
+            self._counters["rejected"] += 1
+            return False
+        self._pending += 1
+        committed = asyncio.get_running_loop().create_future()
+        self._ingest.put_nowait((payload, committed))
+        if not await asyncio.shield(committed):
+            return False
+        self._counters["accepted"] += 1
+        return True
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "pending": self._pending,
+            "unpersisted": self._ingest.qsize() if self._ingest else 0,
+            "ready": self._ready.qsize() if self._ready else 0,
+            "scheduled_retries": len(self._timers),
+            "in_flight": self._in_flight,
+            "workers": self.workers,
+            "max_pending": self.max_pending,
+            "dead_letters": self._dead_letters,
+            **self._counters,
+        }
+
+    def _schedule(self, item: Tuple[int, Dict, int], delay: float) -> None:
+        if delay <= 0:
+            self._ready.put_nowait(item)
+            return
+        event_id = item[0]
+
+        def release() -> None:
+            self._timers.pop(event_id, None)
+            self._ready.put_nowait(item)
+
+        self._timers[event_id] = asyncio.get_running_loop().call_later(delay, release)
+
+    def _drain_ingest(self, batch: List[Tuple[Dict, asyncio.Future]]) -> List[Tuple[Dict, asyncio.Future]]:
+        while len(batch) < self.batch_size and not self._ingest.empty():
+            batch.append(self._ingest.get_nowait())
+        return batch
+
+    async def _flush_ingest(self) -> None:
+        while not self._ingest.empty():
+            await self._persist(self._drain_ingest([]))
+
+    async def _persist(self, batch: List[Tuple[Dict, asyncio.Future]]) -> None:
+        payloads = [payload for payload, _ in batch]
+        try:
+            ids = await asyncio.to_thread(self._log.append_many, payloads)
+        except Exception as exc:
+            logger.exception("Rejecting %s webhook event(s), log write failed: %s", len(batch), exc)
+            self._pending -= len(batch)
+            self._counters["rejected"] += len(batch)
+            ids = None
+        for index, (payload, committed) in enumerate(batch):
+            if ids is not None:
+                self._ready.put_nowait((ids[index], payload, 0))
+            if not committed.done():
+                committed.set_result(ids is not None)
+
+    async def _persist_loop(self) -> None:
+        while True:
+            batch = [await self._ingest.get()]
+            try:
+                # Let a burst of concurrent submissions share one commit.
+                await asyncio.sleep(self.flush_window)
+            except asyncio.CancelledError:
+                await self._persist(self._drain_ingest(batch))
+                raise
+            await self._persist(self._drain_ingest(batch))
+
+    def _backoff(self, attempts: int) -> float:
+        delay = min(self.backoff_max, self.backoff_base * (2 ** (attempts - 1)))
+        return delay * random.uniform(0.8, 1.2)
+
+    async def _worker_loop(self) -> None:
+        while True:
+            event_id, payload, attempts = await self._ready.get()
+            self._in_flight += 1
+            try:
+                await self.handler(payload)
+            except asyncio.CancelledError:
+                raise
+            except Exception as exc:
+                attempts += 1
+                if attempts >= self.max_attempts:
+                    logger.error("Webhook event %s dead-lettered after %s attempt(s): %s", event_id, attempts, exc)
+                    await asyncio.to_thread(self._log.dead_letter, event_id, attempts, repr(exc))
+                    self._pending -= 1
+                    self._dead_letters += 1
+                    self._counters["dead_lettered"] += 1
+                else:
+                    delay = self._backoff(attempts)
+                    logger.warning(
+                        "Webhook event %s failed (attempt %s/%s), retrying in %.1fs: %s",
+                        event_id,
+                        attempts,
+                        self.max_attempts,
+                        delay,
+                        exc,
+                    )
+                    await asyncio.to_thread(self._log.reschedule, event_id, payload, attempts, time.time() + delay)
+                    self._counters["retried"] += 1
+                    self._schedule((event_id, payload, attempts), delay)
+            else:
+                await asyncio.to_thread(self._log.complete, event_id)
+                self._pending -= 1
+                self._counters["processed"] += 1
+            finally:
+                self._in_flight -= 1
@@ -0,0 +1,338 @@
+import asyncio
+import math
+import threading
+from datetime import date, datetime, timedelta
+from typing import Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from config.logging import get_logger
+from services.whoop_warehouse import WhoopWarehouse, get_warehouse
+
+logger = get_logger("WhoopAnalytics")
+
+WINDOWS = (7, 28, 90)
+# Days re-read on every refresh; re-scored records can land a little after the fact.
+TAIL_DAYS = 3
+
+
+def _local_day(record: Dict, field: str) -> Optional[date]:
+    value = record.get(field)
+    if not value:
+        return None
+    try:
+        moment = datetime.fromisoformat(value.replace("Z", "+00:00"))
+    except ValueError:
+        return None
+    offset = record.get("timezone_offset")
+    if offset and moment.tzinfo is not None:
+        try:
+            sign = -1 if offset.startswith("-") else 1
+            hours, minutes = offset.lstrip("+-").split(":", 1)
+            moment = moment + sign * timedelta(hours=int(hours), minutes=int(minutes))
+        except ValueError:
+            pass
+    return moment.date()
+
+
+def _score(record: Dict, key: str) -> Optional[float]:
+    score = record.get("score")
+    if not isinstance(score, dict):
+        return None
+    value = score.get(key)
+    return float(value) if isinstance(value, (int, float)) else None
+
+
+def _sleep_hours(record: Dict) -> Optional[float]:
+    score = record.get("score")
+    if not isinstance(score, dict):
+        return None
+    stages = score.get("stage_summary") or {}
+    parts = [
+        stages.get("total_light_sleep_time_milli"),
+        stages.get("total_slow_wave_sleep_time_milli"),
+        stages.get("total_rem_sleep_time_milli"),
+    ]
+    if any(part is None for part in parts):
+        return None
+    return sum(parts) / 3_600_000.0
+
+
+def _sleep_need_hours(record: Dict) -> Optional[float]:
+    score = record.get("score")
+    if not isinstance(score, dict):
+        return None
+    need = score.get("sleep_needed") or {}
+    parts = [
+        need.get("baseline_milli"),
+        need.get("need_from_sleep_debt_milli"),
+        need.get("need_from_recent_strain_milli"),
+        need.get("need_from_recent_nap_milli"),
+    ]
+    if parts[0] is None:
+        return None
+    # Debt is tracked here, so leave WHOOP's own debt term out of the nightly need.
+    return (parts[0] + (parts[2] or 0) + (parts[3] or 0)) / 3_600_000.0
+
+
+# metric -> (collection, day field, extractor)
+METRICS: Dict[str, Tuple[str, str, Callable[[Dict], Optional[float]]]] = {
+    "recovery": ("recovery", "created_at", lambda r: _score(r, "recovery_score")),
+    "hrv": ("recovery", "created_at", lambda r: _score(r, "hrv_rmssd_milli")),
+    "rhr": ("recovery", "created_at", lambda r: _score(r, "resting_heart_rate")),
+    "strain": ("cycle", "start", lambda r: _score(r, "strain")),
+    "sleep_hours": ("sleep", "end", _sleep_hours),
+    "sleep_need": ("sleep", "end", _sleep_need_hours),
+}
+
+
+def daily_values(records_by_collection: Dict[str, List[Dict]]) -> Dict[date, Dict[str, float]]:
+    days: Dict[date, Dict[str, float]] = {}
+    for metric, (collection, field, extract) in METRICS.items():
+        for record in records_by_collection.get(collection, []):
+            if collection == "sleep" and record.get("nap"):
+                continue
+            day = _local_day(record, field)
+            value = extract(record)
+            if day is None or value is None:
+                continue
+            days.setdefault(day, {})[metric] = value
+    return days
+
+
+class _PrefixSeries:
+    """Day-indexed series with NaN gaps and growable prefix sums.
+
+    Appending a day or replacing the latest one is O(1) amortized, and any
+    trailing-window mean/std is two prefix lookups.
+    """
+
+    def __init__(self, values: np.ndarray):
+        size = max(16, len(values) * 2)
+        self._sum = np.zeros(size + 1)
+        self._sq = np.zeros(size + 1)
+        self._count = np.zeros(size + 1)
+        self._values = np.full(size, np.nan)
+        self.length = 0
+        if len(values):
+            present = ~np.isnan(values)
+            clean = np.where(present, values, 0.0)
+            n = len(values)
+            self._values[:n] = values
+            self._sum[1 : n + 1] = np.cumsum(clean)
+            self._sq[1 : n + 1] = np.cumsum(clean * clean)
+            self._count[1 : n + 1] = np.cumsum(present)
+            self.length = n
+
+    def _grow(self) -> None:
+        size = len(self._values) * 2
+        for name in ("_sum", "_sq", "_count"):
+            buf = np.zeros(size + 1)
+            buf[: self.length + 1] = getattr(self, name)[: self.length + 1]
+            setattr(self, name, buf)
+        values = np.full(size, np.nan)
+        values[: self.length] = self._values[: self.length]
+        self._values = values
+
+    def _write(self, index: int, value: float) -> None:
+        present = not math.isnan(value)
+        clean = value if present else 0.0
+        self._values[index] = value
+        self._sum[index + 1] = self._sum[index] + clean
+        self._sq[index + 1] = self._sq[index] + clean * clean
+        self._count[index + 1] = self._count[index] + (1 if present else 0)
+
+    def append(self, value: float) -> None:
+        if self.length >= len(self._values):
+            self._grow()
+        self._write(self.length, value)
+        self.length += 1
+
+    def set_last(self, value: float) -> None:
+        self._write(self.length - 1, value)
+
+    def values(self) -> np.ndarray:
+        return self._values[: self.length].copy()
+
+    def at(self, index: int) -> float:
+        return float(self._values[index])
+
+    def last(self) -> float:
+        return float(self._values[self.length - 1]) if self.length else math.nan
+
+    def window(self, days: int, end_offset: int = 0) -> Tuple[float, float, int]:
+        end = self.length - end_offset
+        start = max(0, end - days)
+        if end <= 0:
+            return math.nan, math.nan, 0
+        count = int(self._count[end] - self._count[start])
+        if count == 0:
+            return math.nan, math.nan, 0
+        total = self._sum[end] - self._sum[start]
+        mean = total / count
+        variance = max(0.0, (self._sq[end] - self._sq[start]) / count - mean * mean)
+        return float(mean), math.sqrt(variance), count
+
+    def rolling_mean(self, days: int) -> np.ndarray:
+        """Full trailing-mean series, computed in one vectorized pass."""
+        idx = np.arange(1, self.length + 1)
+        lo = np.maximum(0, idx - days)
+        counts = self._count[idx] - self._count[lo]
+        with np.errstate(invalid="ignore", divide="ignore"):
+            return np.where(counts > 0, (self._sum[idx] - self._sum[lo]) / counts, np.nan)
+
+
+def _round(value: float, digits: int = 1) -> Optional[float]:
+    if value is None or math.isnan(value) or math.isinf(value):
+        return None
+    return round(value, digits)
+
+
+class UserTrends:
+    def __init__(self, first_day: date, days: Dict[date, Dict[str, float]]):
+        self.first_day = first_day
+        self.last_day = max(days) if days else first_day
+        span = (self.last_day - first_day).days + 1
+        self.series: Dict[str, _PrefixSeries] = {}
+        for metric in METRICS:
+            values = np.full(span, np.nan)
+            for day, metrics in days.items():
+                if metric in metrics:
+                    values[(day - first_day).days] = metrics[metric]
+            self.series[metric] = _PrefixSeries(values)
+        need = self._values("sleep_need")
+        slept = self._values("sleep_hours")
+        with np.errstate(invalid="ignore"):
+            deficits = np.maximum(0.0, need - slept)
+        self.series["sleep_deficit"] = _PrefixSeries(deficits)
+
+    def _values(self, metric: str) -> np.ndarray:
+        return self.series[metric].values()
+
+    def apply(self, days: Dict[date, Dict[str, float]]) -> bool:
+        """Fold new or re-scored days into the cache. False means a rebuild is needed."""
+        for day in sorted(days):
+            if day < self.first_day:
+                continue
+            if day < self.last_day:
+                index = (day - self.first_day).days
+                for metric, value in days[day].items():
+                    if not math.isclose(self.series[metric].at(index), value):
+                        return False
+                continue
+            while day > self.last_day:
+                self.last_day += timedelta(days=1)
+                for series in self.series.values():
+                    series.append(math.nan)
+            for metric, value in days[day].items():
+                self.series[metric].set_last(value)
+            need = self.series["sleep_need"].last()
+            slept = self.series["sleep_hours"].last()
+            if not math.isnan(need) and not math.isnan(slept):
+                self.series["sleep_deficit"].set_last(max(0.0, need - slept))
+        return True
+
+    def _metric_block(self, metric: str, digits: int = 1) -> Dict:
+        series = self.series[metric]
+        today = series.last()
+        block = {"today": _round(today, digits)}
+        for days in WINDOWS:
+            mean, _, count = series.window(days, end_offset=1)
+            if count:
+                block[f"avg_{days}d"] = _round(mean, digits)
+        mean, std, count = series.window(28, end_offset=1)
+        if count >= 7 and std > 0 and not math.isnan(today):
+            block["z_28d"] = _round((today - mean) / std, 2)
+        return block
+
+    def summary(self) -> Dict:
+        trends: Dict = {"as_of": self.last_day.isoformat()}
+        for metric in ("recovery", "hrv", "rhr"):
+            trends[metric] = self._metric_block(metric)
+
+        hrv_mean, hrv_std, hrv_count = self.series["hrv"].window(7)
+        if hrv_count >= 3 and hrv_mean > 0:
+            trends["hrv"]["cv_7d_pct"] = _round(100.0 * hrv_std / hrv_mean)
+
+        strain = self._metric_block("strain")
+        acute, _, acute_n = self.series["strain"].window(7)
+        chronic, _, chronic_n = self.series["strain"].window(28)
+        if acute_n and chronic_n >= 7 and chronic > 0:
+            strain["acwr"] = _round(acute / chronic, 2)
+        trends["strain"] = strain
+
+        slept, _, slept_n = self.series["sleep_hours"].window(7)
+        deficit_mean, _, deficit_n = self.series["sleep_deficit"].window(7)
+        sleep_block = {"last_hours": _round(self.series["sleep_hours"].last())}
+        if slept_n:
+            sleep_block["avg_7d_hours"] = _round(slept)
+        if deficit_n:
+            sleep_block["debt_7d_hours"] = _round(deficit_mean * deficit_n)
+        trends["sleep"] = sleep_block
+        return trends
+
+    def rolling(self, metric: str, days: int) -> np.ndarray:
+        return self.series[metric].rolling_mean(days)
+
+
+class TrendCache:
+    """Per-user UserTrends kept warm between calls.
+
+    The first call per user loads the last ``history_days`` from the
+    warehouse; later calls only read records from the last few cached days.
+    """
+
+    def __init__(self, warehouse: Optional[WhoopWarehouse] = None, history_days: int = 120):
+        self._warehouse = warehouse
+        self.history_days = history_days
+        self._users: Dict[str, UserTrends] = {}
+        self._lock = threading.Lock()
+
+    @property
+    def warehouse(self) -> WhoopWarehouse:
+        return self._warehouse or get_warehouse()
+
+    def _load(self, user_id: str, since: date) -> Dict[date, Dict[str, float]]:
+        since_text = since.isoformat()
+        collections = {collection for collection, _, _ in METRICS.values()}
+        records = {collection: self.warehouse.load(user_id, collection, since=since_text) for collection in collections}
+        return daily_values(records)
+
+    def get(self, user_id: str) -> Optional[UserTrends]:
+        user_id = str(user_id)
+        with self._lock:
+            cached = self._users.get(user_id)
+            if cached is not None:
+                recent = self._load(user_id, cached.last_day - timedelta(days=TAIL_DAYS))
+                if cached.apply(recent):
+                    return cached
+
+            first_day = date.today() - timedelta(days=self.history_days)
+            days = self._load(user_id, first_day)
+            if not days:
+                self._users.pop(user_id, None)
+                return None
+            trends = UserTrends(min(days), days)
+            self._users[user_id] = trends
+            return trends
+
+    def summary(self, user_id: str) -> Optional[Dict]:
+        trends = self.get(user_id)
+        return trends.summary() if trends else None
+
+
+TREND_CACHE = TrendCache()
+
+
+async def attach_trends(summary: Dict, user_id: str) -> Dict:
+    """Add a compact ``trends`` block to a WHOOP summary when history is available."""
+    if not summary or not user_id:
+        return summary
+    try:
+        trends = await asyncio.to_thread(TREND_CACHE.summary, user_id)
+    except Exception as exc:
+        logger.warning("Trend analytics failed for user %s: %s", user_id, exc)
+        return summary
+    if trends:
+        summary["trends"] = trends
+    return summary
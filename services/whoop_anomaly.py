@@ -0,0 +1,186 @@
+import asyncio
+import math
+import os
+import threading
+from typing import Dict, List, Optional, Tuple
+
+from config.logging import get_logger
+from services.whoop_warehouse import WhoopWarehouse, get_warehouse, record_id
+
+logger = get_logger("WhoopAnomaly")
+
+# metric -> (collection the value lives in, score key)
+ANOMALY_METRICS: Dict[str, Tuple[str, str]] = {
+    "recovery_score": ("recovery", "recovery_score"),
+    "hrv_rmssd_milli": ("recovery", "hrv_rmssd_milli"),
+    "resting_heart_rate": ("recovery", "resting_heart_rate"),
+    "skin_temp_celsius": ("recovery", "skin_temp_celsius"),
+    "spo2_percentage": ("recovery", "spo2_percentage"),
+    "respiratory_rate": ("sleep", "respiratory_rate"),
+}
+MAD_TO_SIGMA = 1.4826
+
+
+class MetricState:
+    """O(1) online baseline for one metric: EWMA mean/variance plus a
+    stochastic-approximation median and median absolute deviation."""
+
+    __slots__ = ("count", "mean", "var", "median", "mad", "last_id")
+
+    def __init__(self):
+        self.count = 0
+        self.mean = 0.0
+        self.var = 0.0
+        self.median = 0.0
+        self.mad = 0.0
+        self.last_id: Optional[str] = None
+
+
+class OnlineAnomalyDetector:
+    """Scores each new WHOOP reading against the user's own running baseline.
+
+    A reading is flagged when both the EWMA z-score and the robust
+    (median/MAD) z-score reach ``threshold`` after ``warmup`` observations.
+    Baselines are seeded once per user from the history warehouse, then
+    updated in place, so memory stays constant per user and metric.
+    """
+
+    def __init__(
+        self,
+        threshold: float = 2.5,
+        alpha: float = 0.1,
+        warmup: int = 7,
+        warehouse: Optional[WhoopWarehouse] = None,
+        seed_records: int = 90,
+    ):
+        self.threshold = threshold
+        self.alpha = alpha
+        self.warmup = warmup
+        self.seed_records = seed_records
+        self._warehouse = warehouse
+        self._states: Dict[str, Dict[str, MetricState]] = {}
+        self._lock = threading.Lock()
+
+    @property
+    def warehouse(self) -> WhoopWarehouse:
+        return self._warehouse or get_warehouse()
+
+    def _update(self, state: MetricState, value: float) -> None:
+        state.count += 1
+        if state.count == 1:
+            state.mean = value
+            state.median = value
+            state.var = 0.0
+            state.mad = 0.0
+            return
+        diff = value - state.mean
+        increment = self.alpha * diff
+        state.mean += increment
+        state.var = (1 - self.alpha) * (state.var + diff * increment)
+        # Step size follows the current spread so the median tracks any unit scale.
+        step = self.alpha * max(state.mad, abs(state.median) * 0.01, 1e-6)
+        if value > state.median:
+            state.median += step
+        elif value < state.median:
+            state.median -= step
+        state.mad += self.alpha * (abs(value - state.median) - state.mad)
+
+    def _score(self, state: MetricState, value: float) -> Optional[Dict]:
+        if state.count < self.warmup:
+            return None
+        std = math.sqrt(state.var)
+        sigma = MAD_TO_SIGMA * state.mad
+        if std <= 0 or sigma <= 0:
+            return None
+        ewma_z = (value - state.mean) / std
+        robust_z = (value - state.median) / sigma
+        if min(abs(ewma_z), abs(robust_z)) < self.threshold or ewma_z * robust_z < 0:
+            return None
+        return {
+            "value": round(value, 2),
+            "baseline": round(state.median, 2),
+            "z": round(robust_z, 2),
+            "direction": "high" if robust_z > 0 else "low",
+        }
+
+    @staticmethod
+    def _value(record: Optional[Dict], key: str) -> Optional[float]:
+        score = (record or {}).get("score")
+        if not isinstance(score, dict):
+            return None
+        value = score.get(key)
+        return float(value) if isinstance(value, (int, float)) else None
+
+    def _observe_locked(self, states: Dict[str, MetricState], records: Dict[str, Optional[Dict]], score: bool) -> Dict[str, Dict]:
+        anomalies: Dict[str, Dict] = {}
+        for metric, (collection, key) in ANOMALY_METRICS.items():
+            record = records.get(collection)
+            if collection == "sleep" and record and record.get("nap"):
+                continue
+            value = self._value(record, key)
+            if value is None:
+                continue
+            state = states.setdefault(metric, MetricState())
+            rid = record_id(collection, record)
+            # A record already seen (a later webhook, a retry) is neither
+            # counted nor reported again; callers persist their own decision.
+            if rid is not None and rid == state.last_id:
+                continue
+            if score:
+                result = self._score(state, value)
+                if result:
+                    anomalies[metric] = result
+            self._update(state, value)
+            state.last_id = rid
+        return anomalies
+
+    def _seed(self, user_id: str) -> Dict[str, MetricState]:
+        states: Dict[str, MetricState] = {}
+        history = {
+            collection: self.warehouse.load(user_id, collection, limit=self.seed_records)
+            for collection in {collection for collection, _ in ANOMALY_METRICS.values()}
+        }
+        for collection, records in history.items():
+            for record in records:
+                self._observe_locked(states, {collection: record}, score=False)
+        return states
+
+    def observe(self, user_id: str, records: Dict[str, Optional[Dict]]) -> Dict[str, Dict]:
+        user_id = str(user_id)
+        with self._lock:
+            states = self._states.get(user_id)
+            if states is None:
+                try:
+                    states = self._seed(user_id)
+                except Exception as exc:
+                    logger.warning("Could not seed anomaly baselines for user %s: %s", user_id, exc)
+                    states = {}
+                self._states[user_id] = states
+            return self._observe_locked(states, records, score=True)
+
+    async def aobserve(self, user_id: str, records: Dict[str, Optional[Dict]]) -> Dict[str, Dict]:
+        return await asyncio.to_thread(self.observe, user_id, records)
+
+
+_DETECTOR: Optional[OnlineAnomalyDetector] = None
+
+
+def get_anomaly_detector() -> OnlineAnomalyDetector:
+    global _DETECTOR
+    if _DETECTOR is None:
+        _DETECTOR = OnlineAnomalyDetector(
+            threshold=float(os.getenv("WHOOP_ANOMALY_Z", "2.5")),
+            warmup=int(os.getenv("WHOOP_ANOMALY_WARMUP", "7")),
+        )
+    return _DETECTOR
+
+
+def anomaly_gate_enabled() -> bool:
+    return os.getenv("WHOOP_ANOMALY_GATE", "1").lower() not in ("0", "false", "no")
+
+
+def describe_anomalies(anomalies: Dict[str, Dict]) -> List[str]:
+    return [
+        f"{metric} {info['direction']} ({info['value']} vs baseline {info['baseline']}, z={info['z']})"
+        for metric, info in anomalies.items()
+    ]
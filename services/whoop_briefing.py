@@ -1,13 +1,20 @@
+import asyncio
+import json
 import os
+import time
 import uuid
+from dataclasses import dataclass
 from datetime import datetime, timezone
-from typing import Dict, Optional
+from typing import Awaitable, Callable, Dict, Iterable, List, Optional, Tuple
 
 from config.logging import get_logger
 from services.hala_ws import query_hala
+from services.whoop_analytics import attach_trends
+from services.whoop_briefing_cache import data_version, get_briefing_cache
 from services.whoop_client import WhoopClient, get_access_token_for_user
-from services.whoop_coach import build_context_snapshot, summarize_whoop_data
-from services.whoop_store import get_any_user_token
+from services.whoop_coach import build_context_snapshot
+from services.whoop_store import get_any_user_token, list_user_tokens
+from services.whoop_summary import build_summary_resources, fetch_whoop_summary
 
 logger = get_logger("WhoopBriefing")
 
@@ -16,6 +23,7 @@ BRIEFING_SYSTEM_PROMPT = (
     " Provide a concise daily briefing based on WHOOP data."
     " Use 2-4 sentences. Mention recovery, sleep, and strain implications."
     " If a metric is missing, acknowledge it briefly."
+    " When a trends block is present, compare today against the user's own baselines."
 )
 
 
@@ -151,76 +159,258 @@ async def _fetch_latest_summary(user_id: str) -> Dict:
     client_id = _get_env("WHOOP_CLIENT_ID")
     client_secret = _get_env("WHOOP_CLIENT_SECRET")
     access_token = await get_access_token_for_user(user_id, client_id, client_secret)
-    client = WhoopClient(access_token)
+    client = WhoopClient(access_token, user_id=user_id)
+    summary = await fetch_whoop_summary(client, build_summary_resources())
+    return await attach_trends(summary, user_id)
 
-    cycle = None
-    recovery = None
-    sleep = None
-    workout = None
 
-    try:
-        cycles = await client.list_cycles(limit=1)
-        records = cycles.get("records") or []
-        cycle = records[0] if records else None
-    except Exception as exc:
-        logger.warning("Cycle fetch failed: %s", exc)
+def _resolve_briefing_user() -> Optional[str]:
+    user_id = os.getenv("WHOOP_DEFAULT_USER_ID")
+    if not user_id:
+        user_id, _ = get_any_user_token()
+    return user_id
 
-    try:
-        sleeps = await client.list_sleep(limit=1)
-        records = sleeps.get("records") or []
-        sleep = records[0] if records else None
-    except Exception as exc:
-        logger.warning("Sleep fetch failed: %s", exc)
 
-    if cycle and cycle.get("id"):
-        try:
-            recovery = await client.get_recovery_for_cycle(cycle.get("id"))
-        except Exception as exc:
-            logger.warning("Recovery fetch failed: %s", exc)
+_HALA_SEMAPHORE: Optional[asyncio.Semaphore] = None
+
+
+def _hala_semaphore() -> asyncio.Semaphore:
+    # Caps briefing completions in flight across all users, whatever the batch size.
+    global _HALA_SEMAPHORE
+    if _HALA_SEMAPHORE is None:
+        _HALA_SEMAPHORE = asyncio.Semaphore(int(os.getenv("WHOOP_BRIEFING_HALA_CONCURRENCY", "4")))
+    return _HALA_SEMAPHORE
+
+
+async def _draft_thoughts(user_id: str, summary: Dict, use_cache: bool = True) -> str:
+    prompt = (
+        "Use the following WHOOP data to draft coach thoughts.\n"
+        f"{build_context_snapshot(summary)}"
+    )
 
-    if recovery is None:
+    session_id = f"whoop-briefing-{user_id}-{uuid.uuid4()}"
+    async with _hala_semaphore():
+        return await query_hala(
+            prompt,
+            session_id=session_id,
+            system_prompt=BRIEFING_SYSTEM_PROMPT,
+            include_history=False,
+            start_session=True,
+            max_tokens=200,
+            use_cache=use_cache,
+            one_shot=True,
+        )
+
+
+def _briefing_max_age() -> float:
+    return float(os.getenv("WHOOP_BRIEFING_MAX_AGE_SECONDS", str(12 * 3600)))
+
+
+def _local_date(offset: Optional[str]) -> str:
+    """Today's date for a WHOOP ``timezone_offset`` such as "-05:00"."""
+    tzinfo = None
+    if offset:
         try:
-            recoveries = await client.list_recovery(limit=1)
-            records = recoveries.get("records") or []
-            recovery = records[0] if records else None
-        except Exception as exc:
-            logger.warning("Recovery list fetch failed: %s", exc)
+            tzinfo = datetime.strptime(offset, "%z").tzinfo
+        except ValueError:
+            tzinfo = None
+    return datetime.now(tzinfo or timezone.utc).astimezone(tzinfo).date().isoformat()
 
-    try:
-        workouts = await client.list_workouts(limit=1)
-        records = workouts.get("records") or []
-        workout = records[0] if records else None
-    except Exception as exc:
-        logger.warning("Workout fetch failed: %s", exc)
 
-    return summarize_whoop_data(cycle, recovery, sleep, workout)
+def _summary_offset(summary: Dict) -> Optional[str]:
+    for key in ("sleep", "cycle", "workout"):
+        offset = (summary.get(key) or {}).get("timezone_offset")
+        if offset:
+            return offset
+    return None
 
 
-async def build_daily_briefing_payload() -> Dict:
-    user_id = os.getenv("WHOOP_DEFAULT_USER_ID")
-    if not user_id:
-        user_id, _ = get_any_user_token()
+def _is_current(payload: Dict) -> bool:
+    """Whether a cached briefing was written today (user's local date) and within the max age."""
+    try:
+        generated_at = datetime.fromisoformat(payload["generated_at"])
+    except (KeyError, TypeError, ValueError):
+        return False
+    age = (datetime.now(timezone.utc) - generated_at).total_seconds()
+    if age > _briefing_max_age():
+        return False
+    return payload.get("local_date") == _local_date(payload.get("timezone_offset"))
 
-    if not user_id:
-        return {"error": f"No WHOOP account linked yet. Open the auth URL to connect:\n{_get_auth_url()}"}
 
+async def _generate_briefing(user_id: str, force: bool) -> Dict:
     summary = await _fetch_latest_summary(user_id)
     if not summary:
         return {"error": "WHOOP data is unavailable right now. Try again shortly."}
 
-    prompt = (
-        "Use the following WHOOP data to draft coach thoughts.\n"
-        f"{build_context_snapshot(summary)}"
-    )
+    cache = get_briefing_cache()
+    version = data_version(summary)
+    if not force:
+        cached = await asyncio.to_thread(cache.get, user_id, version)
+        if cached and _is_current(cached.payload):
+            # Same records as last time: keep the existing coach notes.
+            if cached.stale:
+                await asyncio.to_thread(cache.put, user_id, version, cached.payload)
+            return cached.payload
 
-    session_id = f"whoop-briefing-{user_id}-{uuid.uuid4()}"
-    thoughts = await query_hala(
-        prompt,
-        session_id=session_id,
-        system_prompt=BRIEFING_SYSTEM_PROMPT,
-        include_history=False,
-        start_session=True,
-        max_tokens=200,
+    # A forced regeneration must not be answered from the HalaAI response cache.
+    thoughts = await _draft_thoughts(user_id, summary, use_cache=not force)
+    payload = build_briefing_payload(summary, thoughts)
+    offset = _summary_offset(summary)
+    payload["generated_at"] = datetime.now(timezone.utc).isoformat()
+    payload["timezone_offset"] = offset
+    payload["local_date"] = _local_date(offset)
+    await asyncio.to_thread(cache.put, user_id, version, payload)
+    return payload
+
+
+_BRIEFING_TASKS: Dict[Tuple[str, bool], asyncio.Future] = {}
+
+
+async def refresh_briefing(user_id: str, force: bool = False) -> Dict:
+    """Rebuild a user's cached briefing if their WHOOP data changed.
+
+    The LLM only runs when the data version differs from the cached one, or
+    when ``force`` is set. Concurrent callers for the same user share a run.
+    """
+    key = (str(user_id), force)
+    task = _BRIEFING_TASKS.get(key)
+    if task is None:
+        task = asyncio.ensure_future(_generate_briefing(str(user_id), force))
+        _BRIEFING_TASKS[key] = task
+
+        def _forget(done: asyncio.Future) -> None:
+            if _BRIEFING_TASKS.get(key) is done:
+                _BRIEFING_TASKS.pop(key, None)
+
+        task.add_done_callback(_forget)
+    return await asyncio.shield(task)
+
+
+async def build_user_briefing_payload(user_id: str, regenerate: bool = False) -> Dict:
+    """Return a user's briefing, from the cache unless it is missing, stale or out of date.
+
+    A cached briefing is out of date once the user's local date has moved on
+    or it is older than ``WHOOP_BRIEFING_MAX_AGE_SECONDS``.
+    """
+    if not regenerate:
+        cached = await asyncio.to_thread(get_briefing_cache().get, user_id)
+        if cached and not cached.stale and _is_current(cached.payload):
+            return cached.payload
+
+    return await refresh_briefing(user_id, force=regenerate)
+
+
+async def build_daily_briefing_payload(regenerate: bool = False) -> Dict:
+    """Return the default user's daily briefing."""
+    user_id = _resolve_briefing_user()
+    if not user_id:
+        return {"error": f"No WHOOP account linked yet. Open the auth URL to connect:\n{_get_auth_url()}"}
+    return await build_user_briefing_payload(user_id, regenerate=regenerate)
+
+
+def briefing_routes() -> Dict[str, Dict]:
+    """Per-user delivery targets from ``WHOOP_BRIEFING_ROUTES``.
+
+    The value is a JSON object keyed by WHOOP user id, e.g.
+    ``{"123": {"channel_id": 456, "label": "Sam"}, "789": {"webhook_url": "https://..."}}``.
+    Users without a route go to the health channel.
+    """
+    raw = os.getenv("WHOOP_BRIEFING_ROUTES")
+    if not raw:
+        return {}
+    try:
+        routes = json.loads(raw)
+    except json.JSONDecodeError as exc:
+        logger.warning("Ignoring invalid WHOOP_BRIEFING_ROUTES: %s", exc)
+        return {}
+    if not isinstance(routes, dict):
+        logger.warning("Ignoring WHOOP_BRIEFING_ROUTES: expected a JSON object")
+        return {}
+    return {str(user_id): route for user_id, route in routes.items() if isinstance(route, dict)}
+
+
+def briefing_user_ids() -> List[str]:
+    return [str(user_id) for user_id, _ in list_user_tokens()]
+
+
+@dataclass
+class BriefingResult:
+    user_id: str
+    payload: Optional[Dict] = None
+    error: Optional[str] = None
+    elapsed: float = 0.0
+    delivered: bool = False
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None
+
+
+DeliverFn = Callable[[str, Dict], Awaitable[None]]
+
+
+async def run_briefing_batch(
+    user_ids: Optional[Iterable[str]] = None,
+    deliver: Optional[DeliverFn] = None,
+    regenerate: bool = False,
+    concurrency: Optional[int] = None,
+    refresh: bool = False,
+) -> List[BriefingResult]:
+    """Build (and optionally deliver) briefings for many users at once.
+
+    At most ``concurrency`` users (``WHOOP_BRIEFING_USER_CONCURRENCY``) are in
+    their fetch/summarize step together, and HalaAI completions are further
+    capped by ``WHOOP_BRIEFING_HALA_CONCURRENCY``. ``deliver`` runs for each
+    user as soon as their briefing is ready. One user's failure never stops
+    the batch; it is recorded on their result.
+
+    With ``refresh`` every user's WHOOP data is fetched and compared with the
+    cached version (see ``refresh_briefing``) instead of serving any
+    non-stale cached briefing.
+    """
+    user_ids = list(user_ids) if user_ids is not None else briefing_user_ids()
+    if concurrency is None:
+        concurrency = int(os.getenv("WHOOP_BRIEFING_USER_CONCURRENCY", "8"))
+    semaphore = asyncio.Semaphore(max(1, concurrency))
+    started = time.monotonic()
+
+    async def run_one(user_id: str) -> BriefingResult:
+        result = BriefingResult(user_id)
+        user_started = time.monotonic()
+        try:
+            async with semaphore:
+                if refresh:
+                    result.payload = await refresh_briefing(user_id, force=regenerate)
+                else:
+                    result.payload = await build_user_briefing_payload(user_id, regenerate=regenerate)
+            if result.payload.get("error"):
+                result.error = result.payload["error"]
+            elif deliver:
+                await deliver(user_id, result.payload)
+                result.delivered = True
+        except Exception as exc:
+            result.error = f"{type(exc).__name__}: {exc}"
+        result.elapsed = time.monotonic() - user_started
+        return result
+
+    results = await asyncio.gather(*(run_one(user_id) for user_id in user_ids))
+
+    failed = [result for result in results if not result.ok]
+    for result in results:
+        if result.ok:
+            logger.info("Briefing for user %s ready in %.1fs", result.user_id, result.elapsed)
+        else:
+            logger.warning("Briefing for user %s failed after %.1fs: %s", result.user_id, result.elapsed, result.error)
+    logger.info(
+        "Briefing batch: %s user(s), %s failed, %.1fs wall, slowest %.1fs",
+        len(results),
+        len(failed),
+        time.monotonic() - started,
+        max((result.elapsed for result in results), default=0.0),
     )
+    return results
+
 
-    return build_briefing_payload(summary, thoughts)
+async def prewarm_daily_briefing() -> List[BriefingResult]:
+    """Bring every user's cached briefing up to date ahead of the daily post."""
+    return await run_briefing_batch(refresh=True)
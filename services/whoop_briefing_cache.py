@@ -0,0 +1,97 @@
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, Optional
+
+from services.whoop_store import DATA_DIR
+
+BRIEFING_CACHE_PATH = DATA_DIR / "briefings.db"
+# Sections whose records decide whether a cached briefing still describes the data.
+VERSION_SECTIONS = ("cycle", "sleep", "recovery", "workout")
+
+
+def data_version(summary: Dict) -> str:
+    """Stable digest of the WHOOP records behind a summary.
+
+    Re-scored records change their score payload, so a re-score produces a
+    new version even when record ids stay the same.
+    """
+    basis = {name: summary.get(name) for name in VERSION_SECTIONS}
+    encoded = json.dumps(basis, sort_keys=True, default=str)
+    return hashlib.sha1(encoded.encode("utf-8")).hexdigest()
+
+
+@dataclass
+class CachedBriefing:
+    user_id: str
+    version: str
+    payload: Dict
+    created_at: float
+    stale: bool
+
+
+class BriefingCache:
+    """Latest generated briefing per user, keyed by data version.
+
+    Lives in SQLite so the WHOOP server (which refreshes on webhooks) and the
+    Discord bot (which serves mentions and the daily post) share one copy.
+    """
+
+    def __init__(self, path: Path = BRIEFING_CACHE_PATH):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(self.path), check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS briefings ("
+            " user_id TEXT PRIMARY KEY,"
+            " version TEXT NOT NULL,"
+            " payload TEXT NOT NULL,"
+            " created_at REAL NOT NULL,"
+            " stale INTEGER NOT NULL DEFAULT 0)"
+        )
+
+    def get(self, user_id: str, version: Optional[str] = None) -> Optional[CachedBriefing]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT version, payload, created_at, stale FROM briefings WHERE user_id = ?",
+                (str(user_id),),
+            ).fetchone()
+        if row is None or (version is not None and row[0] != version):
+            return None
+        return CachedBriefing(str(user_id), row[0], json.loads(row[1]), row[2], bool(row[3]))
+
+    def put(self, user_id: str, version: str, payload: Dict) -> None:
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO briefings (user_id, version, payload, created_at, stale) VALUES (?, ?, ?, ?, 0)"
+                " ON CONFLICT(user_id) DO UPDATE SET version = excluded.version, payload = excluded.payload,"
+                " created_at = excluded.created_at, stale = 0",
+                (str(user_id), version, json.dumps(payload), time.time()),
+            )
+
+    def mark_stale(self, user_id: str) -> None:
+        with self._lock:
+            self._conn.execute("UPDATE briefings SET stale = 1 WHERE user_id = ?", (str(user_id),))
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+
+_CACHE: Optional[BriefingCache] = None
+_CACHE_LOCK = threading.Lock()
+
+
+def get_briefing_cache() -> BriefingCache:
+    global _CACHE
+    with _CACHE_LOCK:
+        if _CACHE is None:
+            _CACHE = BriefingCache()
+        return _CACHE
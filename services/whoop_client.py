@@ -1,16 +1,20 @@
+import asyncio
 import base64
 import hashlib
 import hmac
 import os
 import time
-from typing import Dict, Optional
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
 from urllib.parse import urlencode
 
-import httpx
-
+from config.logging import get_logger
+from services.http_client import get_shared_client
 from services.whoop_store import (
+    aget_token_fresh,
+    amark_token_refreshed,
     get_token,
-    mark_token_refreshed,
+    list_user_tokens,
     set_token,
     token_is_expired,
 )
@@ -18,20 +22,181 @@ from services.whoop_store import (
 BASE_URL = "https://api.prod.whoop.com"
 AUTH_URL = f"{BASE_URL}/oauth/oauth2/auth"
 TOKEN_URL = f"{BASE_URL}/oauth/oauth2/token"
+HTTP_CLIENT_NAME = "whoop"
+
+logger = get_logger("WhoopClient")
+
+
+DEFAULT_CACHE_TTLS = {
+    "cycle": 60,
+    "sleep": 120,
+    "recovery": 120,
+    "workout": 60,
+    "user": 3600,
+}
+
+# Resources whose cached responses go stale with another one. A new sleep gets
+# its recovery scored and is resolved to a cycle; a workout adds to the cycle's
+# strain. The summary fetch reads sleep, recovery and cycle together.
+CACHE_DEPENDENTS = {
+    "sleep": ("recovery", "cycle"),
+    "recovery": ("sleep", "cycle"),
+    "cycle": ("sleep", "recovery"),
+    "workout": ("cycle",),
+}
+
+
+def _http_client():
+    return get_shared_client(HTTP_CLIENT_NAME, timeout=30.0)
+
+
+def _resource_type(path: str) -> str:
+    if "/recovery" in path:
+        return "recovery"
+    if "/activity/sleep" in path:
+        return "sleep"
+    if "/activity/workout" in path:
+        return "workout"
+    if "/cycle" in path:
+        return "cycle"
+    return "user"
+
+
+def _cache_ttl(resource_type: str) -> float:
+    override = os.getenv(f"WHOOP_CACHE_TTL_{resource_type.upper()}")
+    if override:
+        return float(override)
+    return float(DEFAULT_CACHE_TTLS.get(resource_type, 60))
+
+
+class _CacheEntry:
+    __slots__ = ("data", "expires_at", "etag", "last_modified")
+
+    def __init__(self, data: Dict, expires_at: float, etag: Optional[str], last_modified: Optional[str]):
+        self.data = data
+        self.expires_at = expires_at
+        self.etag = etag
+        self.last_modified = last_modified
+
+
+class WhoopResponseCache:
+    """LRU cache of WHOOP GET responses keyed by (user, path, params).
+
+    A response is served from the cache until its per-resource TTL runs out.
+    Expired entries are not dropped; they stay until LRU eviction or an
+    explicit ``invalidate``. The next request for an expired entry is sent
+    with ``If-None-Match`` / ``If-Modified-Since`` when the entry has an ETag
+    or Last-Modified validator. A 304 renews the TTL and serves the cached
+    data. Without validators, or on any other status, the response is
+    fetched in full and replaces the entry.
+    """
+
+    def __init__(self, max_entries: int = 512):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[Tuple, _CacheEntry]" = OrderedDict()
+
+    @staticmethod
+    def make_key(user_key: str, path: str, params: Optional[Dict]) -> Tuple:
+        return (user_key, _resource_type(path), path, tuple(sorted((params or {}).items())))
+
+    def get(self, key: Tuple) -> Optional[_CacheEntry]:
+        entry = self._entries.get(key)
+        if entry is not None:
+            self._entries.move_to_end(key)
+        return entry
+
+    def put(self, key: Tuple, data: Dict, etag: Optional[str] = None, last_modified: Optional[str] = None) -> None:
+        expires_at = time.monotonic() + _cache_ttl(key[1])
+        self._entries[key] = _CacheEntry(data, expires_at, etag, last_modified)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def touch(self, key: Tuple) -> None:
+        entry = self._entries.get(key)
+        if entry is not None:
+            entry.expires_at = time.monotonic() + _cache_ttl(key[1])
+
+    def invalidate(self, user_key: str, resource_type: Optional[str] = None) -> int:
+        doomed = [
+            key
+            for key in self._entries
+            if key[0] == user_key and (resource_type is None or key[1] == resource_type)
+        ]
+        for key in doomed:
+            del self._entries[key]
+        return len(doomed)
+
+    def clear(self) -> None:
+        self._entries.clear()
+
+
+RESPONSE_CACHE = WhoopResponseCache(max_entries=int(os.getenv("WHOOP_CACHE_MAX_ENTRIES", "512")))
+
+
+def _cache_enabled() -> bool:
+    return os.getenv("WHOOP_CACHE", "1").lower() not in ("0", "false", "no")
+
+
+def invalidate_whoop_cache(user_id: str, event_type: Optional[str] = None) -> int:
+    """Drop cached responses touched by a webhook event such as ``sleep.updated``.
+
+    Resources that depend on the event's resource (``CACHE_DEPENDENTS``) are
+    dropped too; unknown events clear everything cached for the user.
+    """
+    resource_type = event_type.split(".", 1)[0] if event_type else None
+    if resource_type not in DEFAULT_CACHE_TTLS:
+        return RESPONSE_CACHE.invalidate(user_id)
+    return sum(
+        RESPONSE_CACHE.invalidate(user_id, affected)
+        for affected in (resource_type, *CACHE_DEPENDENTS.get(resource_type, ()))
+    )
 
 
 class WhoopClient:
-    def __init__(self, access_token: str):
+    def __init__(self, access_token: str, user_id: Optional[str] = None):
         self.access_token = access_token
+        self.user_id = user_id
 
-    async def _request(self, method: str, path: str, params: Optional[Dict] = None) -> Dict:
+    @property
+    def _cache_user_key(self) -> str:
+        if self.user_id:
+            return self.user_id
+        return "token:" + hashlib.sha256(self.access_token.encode("utf-8")).hexdigest()[:16]
+
+    async def _request(self, method: str, path: str, params: Optional[Dict] = None, use_cache: bool = True) -> Dict:
         url = f"{BASE_URL}{path}"
         headers = {"Authorization": f"Bearer {self.access_token}"}
-        async with httpx.AsyncClient(timeout=30.0) as client:
-            response = await client.request(method, url, headers=headers, params=params)
+
+        if method != "GET" or not use_cache or not _cache_enabled():
+            response = await _http_client().request(method, url, headers=headers, params=params)
             response.raise_for_status()
             return response.json()
 
+        key = RESPONSE_CACHE.make_key(self._cache_user_key, path, params)
+        entry = RESPONSE_CACHE.get(key)
+        if entry is not None:
+            if time.monotonic() < entry.expires_at:
+                return entry.data
+            if entry.etag:
+                headers["If-None-Match"] = entry.etag
+            if entry.last_modified:
+                headers["If-Modified-Since"] = entry.last_modified
+
+        response = await _http_client().request(method, url, headers=headers, params=params)
+        if response.status_code == 304 and entry is not None:
+            RESPONSE_CACHE.touch(key)
+            return entry.data
+        response.raise_for_status()
+        data = response.json()
+        RESPONSE_CACHE.put(
+            key,
+            data,
+            etag=response.headers.get("ETag"),
+            last_modified=response.headers.get("Last-Modified"),
+        )
+        return data
+
     async def get_profile(self) -> Dict:
         return await self._request("GET", "/developer/v2/user/profile/basic")
 
@@ -41,7 +206,7 @@ class WhoopClient:
     async def get_cycle(self, cycle_id: str) -> Dict:
         return await self._request("GET", f"/developer/v2/cycle/{cycle_id}")
 
-    async def list_cycles(self, limit: int = 1, start: Optional[str] = None, end: Optional[str] = None, next_token: Optional[str] = None) -> Dict:
+    async def list_cycles(self, limit: int = 1, start: Optional[str] = None, end: Optional[str] = None, next_token: Optional[str] = None, use_cache: bool = True) -> Dict:
         params = {"limit": limit}
         if start:
             params["start"] = start
@@ -49,12 +214,12 @@ class WhoopClient:
             params["end"] = end
         if next_token:
             params["nextToken"] = next_token
-        return await self._request("GET", "/developer/v2/cycle", params=params)
+        return await self._request("GET", "/developer/v2/cycle", params=params, use_cache=use_cache)
 
     async def get_sleep(self, sleep_id: str) -> Dict:
         return await self._request("GET", f"/developer/v2/activity/sleep/{sleep_id}")
 
-    async def list_sleep(self, limit: int = 1, start: Optional[str] = None, end: Optional[str] = None, next_token: Optional[str] = None) -> Dict:
+    async def list_sleep(self, limit: int = 1, start: Optional[str] = None, end: Optional[str] = None, next_token: Optional[str] = None, use_cache: bool = True) -> Dict:
         params = {"limit": limit}
         if start:
             params["start"] = start
@@ -62,12 +227,12 @@ class WhoopClient:
             params["end"] = end
         if next_token:
             params["nextToken"] = next_token
-        return await self._request("GET", "/developer/v2/activity/sleep", params=params)
+        return await self._request("GET", "/developer/v2/activity/sleep", params=params, use_cache=use_cache)
 
     async def get_recovery_for_cycle(self, cycle_id: str) -> Dict:
         return await self._request("GET", f"/developer/v2/cycle/{cycle_id}/recovery")
 
-    async def list_recovery(self, limit: int = 1, start: Optional[str] = None, end: Optional[str] = None, next_token: Optional[str] = None) -> Dict:
+    async def list_recovery(self, limit: int = 1, start: Optional[str] = None, end: Optional[str] = None, next_token: Optional[str] = None, use_cache: bool = True) -> Dict:
         params = {"limit": limit}
         if start:
             params["start"] = start
@@ -75,12 +240,12 @@ class WhoopClient:
             params["end"] = end
         if next_token:
             params["nextToken"] = next_token
-        return await self._request("GET", "/developer/v2/recovery", params=params)
+        return await self._request("GET", "/developer/v2/recovery", params=params, use_cache=use_cache)
 
     async def get_workout(self, workout_id: str) -> Dict:
         return await self._request("GET", f"/developer/v2/activity/workout/{workout_id}")
 
-    async def list_workouts(self, limit: int = 1, start: Optional[str] = None, end: Optional[str] = None, next_token: Optional[str] = None) -> Dict:
+    async def list_workouts(self, limit: int = 1, start: Optional[str] = None, end: Optional[str] = None, next_token: Optional[str] = None, use_cache: bool = True) -> Dict:
         params = {"limit": limit}
         if start:
             params["start"] = start
@@ -88,7 +253,7 @@ class WhoopClient:
             params["end"] = end
         if next_token:
             params["nextToken"] = next_token
-        return await self._request("GET", "/developer/v2/activity/workout", params=params)
+        return await self._request("GET", "/developer/v2/activity/workout", params=params, use_cache=use_cache)
 
 
 def build_authorization_url(client_id: str, redirect_uri: str, scopes: list[str], state: str) -> str:
@@ -110,10 +275,9 @@ async def exchange_code_for_token(client_id: str, client_secret: str, redirect_u
         "client_secret": client_secret,
         "redirect_uri": redirect_uri,
     }
-    async with httpx.AsyncClient(timeout=30.0) as client:
-        response = await client.post(TOKEN_URL, data=payload)
-        response.raise_for_status()
-        return response.json()
+    response = await _http_client().post(TOKEN_URL, data=payload)
+    response.raise_for_status()
+    return response.json()
 
 
 async def refresh_access_token(client_id: str, client_secret: str, refresh_token: str) -> Dict:
@@ -123,10 +287,41 @@ async def refresh_access_token(client_id: str, client_secret: str, refresh_token
         "client_id": client_id,
         "client_secret": client_secret,
     }
-    async with httpx.AsyncClient(timeout=30.0) as client:
-        response = await client.post(TOKEN_URL, data=payload)
-        response.raise_for_status()
-        return response.json()
+    response = await _http_client().post(TOKEN_URL, data=payload)
+    response.raise_for_status()
+    return response.json()
+
+
+_REFRESH_TASKS: Dict[str, asyncio.Future] = {}
+
+
+async def _refresh_user_token(user_id: str, client_id: str, client_secret: str) -> Dict:
+    # Another process sharing the store may already have rotated the token.
+    token_data = await aget_token_fresh(user_id)
+    if not token_data:
+        raise RuntimeError(f"No WHOOP token stored for user_id={user_id}")
+    if not token_is_expired(token_data, leeway_seconds=_refresh_lead_seconds()):
+        return token_data
+    refresh_token_value = token_data.get("refresh_token")
+    if not refresh_token_value:
+        raise RuntimeError("Access token expired and no refresh token available (missing offline scope).")
+    refreshed = await refresh_access_token(client_id, client_secret, refresh_token_value)
+    return await amark_token_refreshed(user_id, refreshed)
+
+
+async def refresh_token_for_user(user_id: str, client_id: str, client_secret: str) -> Dict:
+    """Refresh a user's token, joining any refresh already in flight for them."""
+    task = _REFRESH_TASKS.get(user_id)
+    if task is None:
+        task = asyncio.ensure_future(_refresh_user_token(user_id, client_id, client_secret))
+        _REFRESH_TASKS[user_id] = task
+
+        def _forget(done: asyncio.Future) -> None:
+            if _REFRESH_TASKS.get(user_id) is done:
+                _REFRESH_TASKS.pop(user_id, None)
+
+        task.add_done_callback(_forget)
+    return await asyncio.shield(task)
 
 
 async def get_access_token_for_user(user_id: str, client_id: str, client_secret: str) -> str:
@@ -135,15 +330,66 @@ async def get_access_token_for_user(user_id: str, client_id: str, client_secret:
         raise RuntimeError(f"No WHOOP token stored for user_id={user_id}")
 
     if token_is_expired(token_data):
-        refresh_token_value = token_data.get("refresh_token")
-        if not refresh_token_value:
-            raise RuntimeError("Access token expired and no refresh token available (missing offline scope).")
-        refreshed = await refresh_access_token(client_id, client_secret, refresh_token_value)
-        token_data = mark_token_refreshed(user_id, refreshed)
+        token_data = await refresh_token_for_user(user_id, client_id, client_secret)
 
     return token_data.get("access_token")
 
 
+def _refresh_lead_seconds() -> int:
+    return int(os.getenv("WHOOP_TOKEN_REFRESH_LEAD_SECONDS", "300"))
+
+
+class TokenRefresher:
+    """Background task that renews tokens shortly before ``expires_at``."""
+
+    def __init__(self, client_id: str, client_secret: str, max_sleep: float = 300.0, retry_delay: float = 30.0):
+        self.client_id = client_id
+        self.client_secret = client_secret
+        self.max_sleep = max_sleep
+        self.retry_delay = retry_delay
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self) -> None:
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+    async def refresh_due(self) -> float:
+        """Refresh tokens inside the lead window; return seconds until the next one is due."""
+        lead = _refresh_lead_seconds()
+        now = time.time()
+        next_due = now + self.max_sleep
+        for user_id, token_data in list_user_tokens():
+            expires_at = token_data.get("expires_at")
+            if not expires_at or not token_data.get("refresh_token"):
+                continue
+            due_at = float(expires_at) - lead
+            if due_at <= now:
+                try:
+                    token_data = await refresh_token_for_user(user_id, self.client_id, self.client_secret)
+                    logger.info("Proactively refreshed WHOOP token for user %s", user_id)
+                    due_at = float(token_data.get("expires_at") or now + self.max_sleep) - lead
+                except Exception as exc:
+                    logger.warning("Proactive WHOOP token refresh failed for user %s: %s", user_id, exc)
+                    due_at = now + self.retry_delay
+            next_due = min(next_due, due_at)
+        return max(1.0, next_due - time.time())
+
+    async def _run(self) -> None:
+        while True:
+            delay = await self.refresh_due()
+            await asyncio.sleep(delay)
+
+
 def store_token_for_user(user_id: str, token_response: Dict) -> None:
     token_data = {
         "access_token": token_response.get("access_token"),
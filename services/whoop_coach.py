@@ -1,13 +1,17 @@
-import json
 from datetime import datetime
 from typing import Dict, Optional
 
+from services.whoop_prompt import encode_summary
+
 
 SYSTEM_PROMPT = (
     "You are HalaAI, a proactive health coach."
     " Use the WHOOP data to interpret how the user is doing today,"
     " identify risks (overtraining, low recovery, poor sleep),"
     " and recommend specific adjustments to training and schedule."
+    " When a trends block is present, judge today against the user's rolling baselines"
+    " (z-scores, acute:chronic strain ratio, sleep debt) rather than absolute values."
+    " If an anomalies block is present, lead with those deviations."
     " Keep it concise (2-5 sentences)."
     " If data is missing or inconclusive, ask one targeted question."
 )
@@ -22,8 +26,8 @@ def _format_dt(value: Optional[str]) -> Optional[str]:
         return value
 
 
-def build_context_snapshot(summary: Dict) -> str:
-    return json.dumps(summary, indent=2, sort_keys=True)
+def build_context_snapshot(summary: Dict, mode: Optional[str] = None) -> str:
+    return encode_summary(summary, mode=mode)
 
 
 def build_user_prompt(summary: Dict) -> str:
@@ -48,6 +52,7 @@ def summarize_whoop_data(
             "id": cycle.get("id"),
             "start": _format_dt(cycle.get("start")),
             "end": _format_dt(cycle.get("end")),
+            "timezone_offset": cycle.get("timezone_offset"),
             "score_state": cycle.get("score_state"),
             "score": cycle.get("score"),
         }
@@ -63,6 +68,7 @@ def summarize_whoop_data(
             "id": sleep.get("id"),
             "start": _format_dt(sleep.get("start")),
             "end": _format_dt(sleep.get("end")),
+            "timezone_offset": sleep.get("timezone_offset"),
             "nap": sleep.get("nap"),
             "score_state": sleep.get("score_state"),
             "score": sleep.get("score"),
@@ -74,6 +80,7 @@ def summarize_whoop_data(
             "sport_name": workout.get("sport_name"),
             "start": _format_dt(workout.get("start")),
             "end": _format_dt(workout.get("end")),
+            "timezone_offset": workout.get("timezone_offset"),
             "score_state": workout.get("score_state"),
             "score": workout.get("score"),
         }
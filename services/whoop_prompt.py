@@ -0,0 +1,214 @@
+import json
+import math
+import os
+from datetime import datetime, timedelta, timezone
+from typing import Callable, Dict, List, Optional, Tuple
+
+PROMPT_MODES = ("compact", "json")
+CHARS_PER_TOKEN = 4.0
+
+# (output key, path inside the section, transform)
+Field = Tuple[str, Tuple[str, ...], Optional[Callable[[float], float]]]
+
+
+def _hours(milli: float) -> float:
+    return milli / 3_600_000.0
+
+
+SECTION_FIELDS: Dict[str, List[Field]] = {
+    "recovery": [
+        ("score", ("score", "recovery_score"), None),
+        ("hrv_ms", ("score", "hrv_rmssd_milli"), None),
+        ("rhr", ("score", "resting_heart_rate"), None),
+        ("spo2", ("score", "spo2_percentage"), None),
+        ("skin_c", ("score", "skin_temp_celsius"), None),
+    ],
+    "sleep": [
+        ("perf", ("score", "sleep_performance_percentage"), None),
+        ("eff", ("score", "sleep_efficiency_percentage"), None),
+        ("consist", ("score", "sleep_consistency_percentage"), None),
+        ("resp", ("score", "respiratory_rate"), None),
+        ("bed_h", ("score", "stage_summary", "total_in_bed_time_milli"), _hours),
+        ("awake_h", ("score", "stage_summary", "total_awake_time_milli"), _hours),
+        ("light_h", ("score", "stage_summary", "total_light_sleep_time_milli"), _hours),
+        ("sws_h", ("score", "stage_summary", "total_slow_wave_sleep_time_milli"), _hours),
+        ("rem_h", ("score", "stage_summary", "total_rem_sleep_time_milli"), _hours),
+        ("need_h", ("score", "sleep_needed", "baseline_milli"), _hours),
+        ("dist", ("score", "stage_summary", "disturbance_count"), None),
+        ("end", ("end",), None),
+        ("nap", ("nap",), None),
+    ],
+    "cycle": [
+        ("strain", ("score", "strain"), None),
+        ("avg_hr", ("score", "average_heart_rate"), None),
+        ("max_hr", ("score", "max_heart_rate"), None),
+        ("kj", ("score", "kilojoule"), None),
+    ],
+    "workout": [
+        ("sport", ("sport_name",), None),
+        ("strain", ("score", "strain"), None),
+        ("avg_hr", ("score", "average_heart_rate"), None),
+        ("max_hr", ("score", "max_heart_rate"), None),
+        ("start", ("start",), None),
+    ],
+}
+
+# Sections dropped first when the snapshot is over budget come last.
+SECTION_ORDER = ("anomalies", "recovery", "sleep", "cycle", "trends", "workout")
+
+
+def estimate_tokens(text: str) -> int:
+    return int(math.ceil(len(text) / CHARS_PER_TOKEN))
+
+
+def _dig(section: Dict, path: Tuple[str, ...]):
+    value = section
+    for key in path:
+        if not isinstance(value, dict):
+            return None
+        value = value.get(key)
+    return value
+
+
+def _fmt(value) -> Optional[str]:
+    if value is None or value == "":
+        return None
+    if isinstance(value, bool):
+        return "y" if value else None
+    if isinstance(value, float):
+        if math.isnan(value):
+            return None
+        text = f"{value:.1f}"
+        return text[:-2] if text.endswith(".0") else text
+    if isinstance(value, str) and len(value) >= 16 and value[4:5] == "-" and value[10:11] == "T":
+        return _fmt_timestamp(value)
+    return str(value)
+
+
+def _parse_offset(offset) -> Optional[timezone]:
+    # WHOOP records carry the user's offset as "-05:00".
+    if not isinstance(offset, str) or len(offset) != 6 or offset[0] not in "+-" or offset[3] != ":":
+        return None
+    try:
+        delta = timedelta(hours=int(offset[1:3]), minutes=int(offset[4:6]))
+    except ValueError:
+        return None
+    return timezone(-delta if offset[0] == "-" else delta)
+
+
+def _fmt_timestamp(value: str, offset: Optional[str] = None) -> str:
+    """Minute precision is plenty for coaching, but the offset is kept.
+
+    With the record's ``timezone_offset`` the time is shown in the user's
+    local time, e.g. ``2024-05-02T06:41-05:00``.
+    """
+    try:
+        moment = datetime.fromisoformat(value.replace("Z", "+00:00"))
+    except ValueError:
+        return value
+    local = _parse_offset(offset)
+    if moment.tzinfo is None:
+        return moment.strftime("%Y-%m-%dT%H:%M")
+    if local is not None:
+        moment = moment.astimezone(local)
+    text = moment.strftime("%Y-%m-%dT%H:%M")
+    if moment.utcoffset() == timedelta(0):
+        return text + "Z"
+    return text + moment.isoformat()[-6:]
+
+
+def _pairs(items: List[Tuple[str, object]]) -> str:
+    parts = []
+    for key, value in items:
+        text = _fmt(value)
+        if text is not None:
+            parts.append(f"{key}={text}")
+    return " ".join(parts)
+
+
+def _section_line(name: str, section: Dict) -> Optional[str]:
+    items = []
+    # Say when WHOOP has not scored the record yet, so a missing score is not read as zero.
+    state = section.get("score_state")
+    if state and state != "SCORED":
+        items.append(("state", state))
+    for key, path, transform in SECTION_FIELDS[name]:
+        value = _dig(section, path)
+        if isinstance(value, int) and not isinstance(value, bool):
+            value = float(value)
+        if transform and isinstance(value, float):
+            value = transform(value)
+        if isinstance(value, str) and path in (("start",), ("end",)):
+            value = _fmt_timestamp(value, section.get("timezone_offset"))
+        items.append((key, value))
+    body = _pairs(items)
+    return f"{name}: {body}" if body else None
+
+
+def _trend_lines(trends: Dict) -> List[str]:
+    lines = []
+    for metric, block in trends.items():
+        if not isinstance(block, dict):
+            continue
+        items = [(key.replace("avg_", ""), value) for key, value in block.items()]
+        body = _pairs(items)
+        if body:
+            lines.append(f"trend.{metric}: {body}")
+    return lines
+
+
+def _anomaly_lines(anomalies: Dict) -> List[str]:
+    return [
+        f"anomaly.{metric}: {_pairs([('val', info.get('value')), ('base', info.get('baseline')), ('z', info.get('z'))])}"
+        for metric, info in anomalies.items()
+        if isinstance(info, dict)
+    ]
+
+
+def encode_compact(summary: Dict, max_tokens: Optional[int] = None) -> str:
+    """Line-per-section ``key=value`` snapshot without ids, nulls or nesting.
+
+    When ``max_tokens`` is set, whole lines are dropped from the lowest
+    priority sections (see ``SECTION_ORDER``) until the estimate fits.
+    """
+    lines: List[Tuple[int, str]] = []
+    for priority, name in enumerate(SECTION_ORDER):
+        section = summary.get(name)
+        if not section:
+            continue
+        if name == "trends":
+            lines.extend((priority, line) for line in _trend_lines(section))
+        elif name == "anomalies":
+            lines.extend((priority, line) for line in _anomaly_lines(section))
+        else:
+            line = _section_line(name, section)
+            if line:
+                lines.append((priority, line))
+
+    text = "\n".join(line for _, line in lines)
+    if max_tokens:
+        while lines and estimate_tokens(text) > max_tokens:
+            # Drop the last line of the lowest-priority section still present.
+            worst = max(range(len(lines)), key=lambda index: (lines[index][0], index))
+            lines.pop(worst)
+            text = "\n".join(line for _, line in lines)
+    return text
+
+
+def encode_json(summary: Dict) -> str:
+    return json.dumps(summary, indent=2, sort_keys=True)
+
+
+def prompt_mode() -> str:
+    mode = os.getenv("WHOOP_PROMPT_MODE", "compact").lower()
+    return mode if mode in PROMPT_MODES else "compact"
+
+
+def encode_summary(summary: Dict, mode: Optional[str] = None, max_tokens: Optional[int] = None) -> str:
+    mode = mode or prompt_mode()
+    if mode == "json":
+        return encode_json(summary)
+    if max_tokens is None:
+        budget = os.getenv("WHOOP_PROMPT_MAX_TOKENS")
+        max_tokens = int(budget) if budget else None
+    return encode_compact(summary, max_tokens=max_tokens)
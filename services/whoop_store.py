@@ -1,13 +1,21 @@
+import asyncio
 import json
 import os
+import sqlite3
 import threading
 import time
+from abc import ABC, abstractmethod
 from pathlib import Path
-from typing import Dict, Optional, Tuple
+from typing import Dict, List, Optional, Tuple
+
+from config.logging import get_logger
 
 ROOT_DIR = Path(__file__).resolve().parents[1]
 DATA_DIR = ROOT_DIR / "tools" / "whoop" / "data"
 TOKENS_PATH = DATA_DIR / "tokens.json"
+TOKENS_DB_PATH = DATA_DIR / "tokens.db"
+
+logger = get_logger("WhoopStore")
 
 _LOCK = threading.Lock()
 
@@ -16,43 +24,204 @@ def _ensure_data_dir() -> None:
     DATA_DIR.mkdir(parents=True, exist_ok=True)
 
 
-def _load_raw() -> Dict:
-    _ensure_data_dir()
-    if not TOKENS_PATH.exists():
-        return {"users": {}}
-    with TOKENS_PATH.open("r", encoding="utf-8") as handle:
-        return json.load(handle)
+class TokenBackend(ABC):
+    """Durable storage for WHOOP tokens. Reads happen once, at cache load."""
+
+    @abstractmethod
+    def load_all(self) -> Dict[str, Dict]:
+        ...
+
+    def load(self, user_id: str) -> Optional[Dict]:
+        return self.load_all().get(user_id)
+
+    @abstractmethod
+    def save(self, user_id: str, token_data: Dict) -> None:
+        ...
+
+    def version(self) -> Optional[object]:
+        """Changes whenever another process writes; None means always reload."""
+        return None
+
+
+class JsonTokenBackend(TokenBackend):
+    def __init__(self, path: Path = TOKENS_PATH):
+        self.path = Path(path)
+
+    def _load_raw(self) -> Dict:
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        if not self.path.exists():
+            return {"users": {}}
+        with self.path.open("r", encoding="utf-8") as handle:
+            return json.load(handle)
+
+    def _write_raw(self, data: Dict) -> None:
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.path.with_suffix(".tmp")
+        with tmp_path.open("w", encoding="utf-8") as handle:
+            json.dump(data, handle, indent=2, sort_keys=True)
+        tmp_path.replace(self.path)
+
+    def load_all(self) -> Dict[str, Dict]:
+        return dict(self._load_raw().get("users", {}))
+
+    def version(self) -> Optional[object]:
+        try:
+            return self.path.stat().st_mtime_ns
+        except FileNotFoundError:
+            return 0
+
+    def save(self, user_id: str, token_data: Dict) -> None:
+        data = self._load_raw()
+        data.setdefault("users", {})[user_id] = token_data
+        self._write_raw(data)
+
+
+class SQLiteTokenBackend(TokenBackend):
+    def __init__(self, path: Path = TOKENS_DB_PATH):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(str(self.path), check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS tokens ("
+            " user_id TEXT PRIMARY KEY,"
+            " data TEXT NOT NULL,"
+            " updated_at REAL NOT NULL)"
+        )
+
+    def load_all(self) -> Dict[str, Dict]:
+        rows = self._conn.execute("SELECT user_id, data FROM tokens ORDER BY rowid").fetchall()
+        return {user_id: json.loads(data) for user_id, data in rows}
+
+    def load(self, user_id: str) -> Optional[Dict]:
+        row = self._conn.execute("SELECT data FROM tokens WHERE user_id = ?", (user_id,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def save(self, user_id: str, token_data: Dict) -> None:
+        self._conn.execute(
+            "INSERT INTO tokens (user_id, data, updated_at) VALUES (?, ?, ?)"
+            " ON CONFLICT(user_id) DO UPDATE SET data = excluded.data, updated_at = excluded.updated_at",
+            (user_id, json.dumps(token_data, sort_keys=True), time.time()),
+        )
+
+    def version(self) -> Optional[object]:
+        # Bumped by commits from other connections, e.g. the WHOOP server linking a user.
+        return self._conn.execute("PRAGMA data_version").fetchone()[0]
+
+    def is_empty(self) -> bool:
+        return self._conn.execute("SELECT 1 FROM tokens LIMIT 1").fetchone() is None
+
+
+def migrate_json_to_sqlite(json_path: Path, backend: SQLiteTokenBackend) -> int:
+    """Copy users from a legacy tokens.json into SQLite and retire the file."""
+    json_path = Path(json_path)
+    if not json_path.exists():
+        return 0
+    users = JsonTokenBackend(json_path).load_all()
+    for user_id, token_data in users.items():
+        backend.save(user_id, token_data)
+    json_path.replace(json_path.with_suffix(".json.migrated"))
+    logger.info("Migrated %s WHOOP token(s) from %s to %s", len(users), json_path, backend.path)
+    return len(users)
 
 
-def _write_raw(data: Dict) -> None:
+class TokenStore:
+    """Write-through in-memory cache over a TokenBackend.
+
+    Every lookup first asks the backend for its ``version()`` (a
+    ``PRAGMA data_version`` read for SQLite, the file mtime for JSON) and
+    reloads the cache when another process, such as the WHOOP server linking
+    or refreshing a user, has written since. Otherwise lookups are dict
+    reads. Writes go to the backend first; async callers should use the
+    ``a*`` helpers below to keep that I/O off the loop.
+    """
+
+    def __init__(self, backend: TokenBackend):
+        self.backend = backend
+        self._lock = threading.RLock()
+        self._version = backend.version()
+        self._cache: Dict[str, Dict] = backend.load_all()
+
+    def _sync(self) -> None:
+        version = self.backend.version()
+        if version is None or version != self._version:
+            self._cache = self.backend.load_all()
+            self._version = version
+
+    def get(self, user_id: str, reload: bool = False) -> Optional[Dict]:
+        with self._lock:
+            if reload:
+                token_data = self.backend.load(user_id)
+                if token_data is None:
+                    self._cache.pop(user_id, None)
+                else:
+                    self._cache[user_id] = token_data
+                return token_data
+            self._sync()
+            return self._cache.get(user_id)
+
+    def set(self, user_id: str, token_data: Dict) -> None:
+        with self._lock:
+            self._sync()
+            self.backend.save(user_id, token_data)
+            self._cache[user_id] = token_data
+            # Our own write; only changes by other processes should force a reload.
+            self._version = self.backend.version()
+
+    def items(self) -> List[Tuple[str, Dict]]:
+        with self._lock:
+            self._sync()
+            return list(self._cache.items())
+
+
+_STORE: Optional[TokenStore] = None
+
+
+def _build_backend() -> TokenBackend:
+    kind = os.getenv("WHOOP_TOKEN_STORE", "sqlite").lower()
     _ensure_data_dir()
-    tmp_path = TOKENS_PATH.with_suffix(".tmp")
-    with tmp_path.open("w", encoding="utf-8") as handle:
-        json.dump(data, handle, indent=2, sort_keys=True)
-    tmp_path.replace(TOKENS_PATH)
+    if kind == "json":
+        return JsonTokenBackend(TOKENS_PATH)
+    if kind != "sqlite":
+        raise RuntimeError(f"Unknown WHOOP_TOKEN_STORE backend: {kind}")
+    backend = SQLiteTokenBackend(TOKENS_DB_PATH)
+    if backend.is_empty():
+        migrate_json_to_sqlite(TOKENS_PATH, backend)
+    return backend
 
 
-def get_token(user_id: str) -> Optional[Dict]:
+def get_store() -> TokenStore:
+    global _STORE
     with _LOCK:
-        data = _load_raw()
-        return data.get("users", {}).get(user_id)
+        if _STORE is None:
+            _STORE = TokenStore(_build_backend())
+        return _STORE
+
+
+def get_token(user_id: str, reload: bool = False) -> Optional[Dict]:
+    store = get_store()
+    if not reload:
+        return store.get(user_id)
+    with _LOCK:
+        return store.get(user_id, reload=True)
 
 
 def set_token(user_id: str, token_data: Dict) -> None:
+    store = get_store()
     with _LOCK:
-        data = _load_raw()
-        data.setdefault("users", {})[user_id] = token_data
-        _write_raw(data)
+        store.set(user_id, token_data)
 
 
 def get_any_user_token() -> Tuple[Optional[str], Optional[Dict]]:
-    with _LOCK:
-        data = _load_raw()
-        users = data.get("users", {})
-        if not users:
-            return None, None
-        user_id, token = next(iter(users.items()))
-        return user_id, token
+    items = get_store().items()
+    if not items:
+        return None, None
+    return items[0]
+
+
+def list_user_tokens() -> List[Tuple[str, Dict]]:
+    return get_store().items()
 
 
 def mark_token_refreshed(user_id: str, token_response: Dict) -> Dict:
@@ -61,6 +230,18 @@ def mark_token_refreshed(user_id: str, token_response: Dict) -> Dict:
     return token_data
 
 
+async def aget_token_fresh(user_id: str) -> Optional[Dict]:
+    return await asyncio.to_thread(get_token, user_id, True)
+
+
+async def aset_token(user_id: str, token_data: Dict) -> None:
+    await asyncio.to_thread(set_token, user_id, token_data)
+
+
+async def amark_token_refreshed(user_id: str, token_response: Dict) -> Dict:
+    return await asyncio.to_thread(mark_token_refreshed, user_id, token_response)
+
+
 def _normalize_token_response(token_response: Dict) -> Dict:
     expires_in = token_response.get("expires_in")
     expires_at = None
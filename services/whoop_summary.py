@@ -0,0 +1,161 @@
+import asyncio
+import os
+from dataclasses import dataclass
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+
+from config.logging import get_logger
+from services.whoop_client import WhoopClient
+from services.whoop_coach import summarize_whoop_data
+
+logger = get_logger("WhoopSummary")
+
+FetchFn = Callable[[WhoopClient, Dict[str, Optional[Dict]]], Awaitable[Optional[Dict]]]
+
+
+@dataclass
+class WhoopResource:
+    name: str
+    fetch: FetchFn
+    depends_on: Tuple[str, ...] = ()
+    fallback: Optional[FetchFn] = None
+    timeout: Optional[float] = None
+
+
+def _default_timeout() -> float:
+    return float(os.getenv("WHOOP_FETCH_TIMEOUT_SECONDS", "15"))
+
+
+def _first_record(payload: Optional[Dict]) -> Optional[Dict]:
+    records = (payload or {}).get("records") or []
+    return records[0] if records else None
+
+
+async def _latest_cycle(client: WhoopClient, deps: Dict) -> Optional[Dict]:
+    return _first_record(await client.list_cycles(limit=1))
+
+
+async def _latest_sleep(client: WhoopClient, deps: Dict) -> Optional[Dict]:
+    return _first_record(await client.list_sleep(limit=1))
+
+
+async def _latest_recovery(client: WhoopClient, deps: Dict) -> Optional[Dict]:
+    return _first_record(await client.list_recovery(limit=1))
+
+
+async def _latest_workout(client: WhoopClient, deps: Dict) -> Optional[Dict]:
+    return _first_record(await client.list_workouts(limit=1))
+
+
+async def _cycle_for_sleep(client: WhoopClient, deps: Dict) -> Optional[Dict]:
+    cycle_id = (deps.get("sleep") or {}).get("cycle_id")
+    if not cycle_id:
+        return None
+    return await client.get_cycle(cycle_id)
+
+
+async def _recovery_for_sleep(client: WhoopClient, deps: Dict) -> Optional[Dict]:
+    cycle_id = (deps.get("sleep") or {}).get("cycle_id")
+    if not cycle_id:
+        return None
+    return await client.get_recovery_for_cycle(cycle_id)
+
+
+async def _recovery_for_cycle(client: WhoopClient, deps: Dict) -> Optional[Dict]:
+    cycle_id = (deps.get("cycle") or {}).get("id")
+    if not cycle_id:
+        return None
+    return await client.get_recovery_for_cycle(cycle_id)
+
+
+def _by_id(getter_name: str, record_id: str) -> FetchFn:
+    async def fetch(client: WhoopClient, deps: Dict) -> Optional[Dict]:
+        return await getattr(client, getter_name)(record_id)
+
+    return fetch
+
+
+def build_summary_resources(
+    sleep_id: Optional[str] = None,
+    workout_id: Optional[str] = None,
+) -> List[WhoopResource]:
+    """Describe the cycle/sleep/recovery/workout fetches for one summary.
+
+    Without ids every resource is the latest record and only recovery waits
+    (on the cycle id). With a sleep id (sleep and recovery webhooks) cycle and
+    recovery are resolved from that sleep's ``cycle_id``.
+    """
+    if sleep_id:
+        sleep = WhoopResource("sleep", _by_id("get_sleep", sleep_id), fallback=_latest_sleep)
+        cycle = WhoopResource("cycle", _cycle_for_sleep, depends_on=("sleep",), fallback=_latest_cycle)
+        recovery = WhoopResource(
+            "recovery", _recovery_for_sleep, depends_on=("sleep",), fallback=_latest_recovery
+        )
+    else:
+        sleep = WhoopResource("sleep", _latest_sleep)
+        cycle = WhoopResource("cycle", _latest_cycle)
+        recovery = WhoopResource(
+            "recovery", _recovery_for_cycle, depends_on=("cycle",), fallback=_latest_recovery
+        )
+
+    if workout_id:
+        workout = WhoopResource("workout", _by_id("get_workout", workout_id), fallback=_latest_workout)
+    else:
+        workout = WhoopResource("workout", _latest_workout)
+
+    return [sleep, cycle, recovery, workout]
+
+
+async def _attempt(
+    label: str,
+    fetch: FetchFn,
+    client: WhoopClient,
+    deps: Dict[str, Optional[Dict]],
+    timeout: float,
+) -> Optional[Dict]:
+    try:
+        return await asyncio.wait_for(fetch(client, deps), timeout=timeout)
+    except asyncio.TimeoutError:
+        logger.warning("%s fetch timed out after %.1fs", label, timeout)
+    except Exception as exc:
+        logger.warning("%s fetch failed: %s", label, exc)
+    return None
+
+
+async def fetch_resources(client: WhoopClient, resources: List[WhoopResource]) -> Dict[str, Optional[Dict]]:
+    """Run every resource fetch as soon as its dependencies resolve."""
+    tasks: Dict[str, asyncio.Task] = {}
+    default_timeout = _default_timeout()
+
+    async def run(resource: WhoopResource) -> Optional[Dict]:
+        deps = {name: await tasks[name] for name in resource.depends_on}
+        timeout = resource.timeout or default_timeout
+        value = await _attempt(resource.name.capitalize(), resource.fetch, client, deps, timeout)
+        if value is None and resource.fallback:
+            value = await _attempt(f"{resource.name.capitalize()} fallback", resource.fallback, client, deps, timeout)
+        return value
+
+    for resource in resources:
+        missing = [name for name in resource.depends_on if name not in tasks]
+        if missing:
+            raise ValueError(f"Resource {resource.name} depends on undeclared or later resources: {missing}")
+        tasks[resource.name] = asyncio.ensure_future(run(resource))
+
+    try:
+        values = await asyncio.gather(*tasks.values())
+    finally:
+        for task in tasks.values():
+            task.cancel()
+    return dict(zip(tasks.keys(), values))
+
+
+def summarize_resources(results: Dict[str, Optional[Dict]]) -> Dict:
+    return summarize_whoop_data(
+        results.get("cycle"),
+        results.get("recovery"),
+        results.get("sleep"),
+        results.get("workout"),
+    )
+
+
+async def fetch_whoop_summary(client: WhoopClient, resources: List[WhoopResource]) -> Dict:
+    return summarize_resources(await fetch_resources(client, resources))
@@ -0,0 +1,223 @@
+import asyncio
+import json
+import sqlite3
+import threading
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional
+
+from config.logging import get_logger
+from services.whoop_client import WhoopClient
+from services.whoop_store import DATA_DIR
+
+logger = get_logger("WhoopWarehouse")
+
+WAREHOUSE_PATH = DATA_DIR / "warehouse.db"
+COLLECTIONS = ("cycle", "sleep", "recovery", "workout")
+LIST_METHODS = {
+    "cycle": "list_cycles",
+    "sleep": "list_sleep",
+    "recovery": "list_recovery",
+    "workout": "list_workouts",
+}
+PAGE_SIZE = 25
+# Records near the high-water mark can still be re-scored, so re-read this much of it.
+SYNC_OVERLAP = timedelta(days=3)
+
+
+def record_id(collection: str, record: Dict) -> Optional[str]:
+    if collection == "recovery":
+        value = record.get("sleep_id") or record.get("cycle_id")
+    else:
+        value = record.get("id")
+    return str(value) if value is not None else None
+
+
+def record_start(collection: str, record: Dict) -> Optional[str]:
+    if collection == "recovery":
+        return record.get("created_at")
+    return record.get("start")
+
+
+def _parse_iso(value: str) -> datetime:
+    return datetime.fromisoformat(value.replace("Z", "+00:00"))
+
+
+class WhoopWarehouse:
+    """Local SQLite copy of a user's WHOOP v2 collections.
+
+    Records are stored as JSON keyed by ``(user_id, collection, record_id)``
+    and indexed by start time. ``sync_state`` keeps the newest start seen per
+    user and collection so later syncs only page through recent records.
+    """
+
+    def __init__(self, path: Path = WAREHOUSE_PATH):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(self.path), check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS records ("
+            " user_id TEXT NOT NULL,"
+            " collection TEXT NOT NULL,"
+            " record_id TEXT NOT NULL,"
+            " start TEXT,"
+            " updated_at TEXT,"
+            " payload TEXT NOT NULL,"
+            " PRIMARY KEY (user_id, collection, record_id))"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_records_start ON records (user_id, collection, start)")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS sync_state ("
+            " user_id TEXT NOT NULL,"
+            " collection TEXT NOT NULL,"
+            " high_water TEXT,"
+            " synced_at REAL,"
+            " PRIMARY KEY (user_id, collection))"
+        )
+
+    def upsert(self, user_id: str, collection: str, records: Iterable[Dict]) -> int:
+        rows = []
+        for record in records:
+            if not record:
+                continue
+            rid = record_id(collection, record)
+            if rid is None:
+                continue
+            rows.append(
+                (str(user_id), collection, rid, record_start(collection, record), record.get("updated_at"), json.dumps(record))
+            )
+        if not rows:
+            return 0
+        with self._lock:
+            self._conn.execute("BEGIN")
+            self._conn.executemany(
+                "INSERT INTO records (user_id, collection, record_id, start, updated_at, payload)"
+                " VALUES (?, ?, ?, ?, ?, ?)"
+                " ON CONFLICT(user_id, collection, record_id) DO UPDATE SET"
+                " start = excluded.start, updated_at = excluded.updated_at, payload = excluded.payload"
+                " WHERE excluded.updated_at IS NULL OR records.updated_at IS NULL"
+                " OR excluded.updated_at >= records.updated_at",
+                rows,
+            )
+            self._conn.execute("COMMIT")
+        return len(rows)
+
+    def delete(self, user_id: str, collection: str, rid: str) -> None:
+        with self._lock:
+            self._conn.execute(
+                "DELETE FROM records WHERE user_id = ? AND collection = ? AND record_id = ?",
+                (str(user_id), collection, str(rid)),
+            )
+
+    def load(
+        self,
+        user_id: str,
+        collection: str,
+        since: Optional[str] = None,
+        limit: Optional[int] = None,
+    ) -> List[Dict]:
+        query = "SELECT payload FROM records WHERE user_id = ? AND collection = ?"
+        params: list = [str(user_id), collection]
+        if since:
+            query += " AND start >= ?"
+            params.append(since)
+        if limit:
+            query += " ORDER BY start DESC LIMIT ?"
+            params.append(limit)
+        else:
+            query += " ORDER BY start"
+        with self._lock:
+            rows = self._conn.execute(query, params).fetchall()
+        if limit:
+            rows.reverse()
+        return [json.loads(row[0]) for row in rows]
+
+    def high_water(self, user_id: str, collection: str) -> Optional[str]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT high_water FROM sync_state WHERE user_id = ? AND collection = ?",
+                (str(user_id), collection),
+            ).fetchone()
+        return row[0] if row else None
+
+    def set_high_water(self, user_id: str, collection: str, value: Optional[str]) -> None:
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO sync_state (user_id, collection, high_water, synced_at) VALUES (?, ?, ?, ?)"
+                " ON CONFLICT(user_id, collection) DO UPDATE SET"
+                " high_water = COALESCE(MAX(excluded.high_water, sync_state.high_water), excluded.high_water,"
+                " sync_state.high_water), synced_at = excluded.synced_at",
+                (str(user_id), collection, value, time.time()),
+            )
+
+    async def sync_collection(self, client: WhoopClient, user_id: str, collection: str, max_pages: Optional[int] = None) -> int:
+        list_method = getattr(client, LIST_METHODS[collection])
+        high_water = await asyncio.to_thread(self.high_water, user_id, collection)
+        start = None
+        if high_water:
+            start = (_parse_iso(high_water) - SYNC_OVERLAP).isoformat().replace("+00:00", "Z")
+
+        stored = 0
+        newest = high_water
+        next_token = None
+        pages = 0
+        while True:
+            # Backfill pages are read once; keep them out of the response cache's LRU.
+            page = await list_method(limit=PAGE_SIZE, start=start, next_token=next_token, use_cache=False)
+            records = page.get("records") or []
+            stored += await asyncio.to_thread(self.upsert, user_id, collection, records)
+            for record in records:
+                started = record_start(collection, record)
+                if started and (newest is None or started > newest):
+                    newest = started
+            pages += 1
+            next_token = page.get("next_token") or page.get("nextToken")
+            if not next_token or not records or (max_pages and pages >= max_pages):
+                break
+
+        await asyncio.to_thread(self.set_high_water, user_id, collection, newest)
+        return stored
+
+    async def sync_user(self, client: WhoopClient, user_id: str, collections: Iterable[str] = COLLECTIONS) -> Dict[str, int]:
+        collections = list(collections)
+        results = await asyncio.gather(
+            *(self.sync_collection(client, user_id, collection) for collection in collections),
+            return_exceptions=True,
+        )
+        counts: Dict[str, int] = {}
+        for collection, result in zip(collections, results):
+            if isinstance(result, Exception):
+                logger.warning("WHOOP %s sync failed for user %s: %s", collection, user_id, result)
+                counts[collection] = 0
+            else:
+                counts[collection] = result
+        logger.info("WHOOP sync for user %s stored %s", user_id, counts)
+        return counts
+
+    async def record_latest(self, user_id: str, records: Dict[str, Optional[Dict]]) -> None:
+        """Upsert records already fetched elsewhere (e.g. by the webhook pipeline)."""
+        for collection in COLLECTIONS:
+            record = records.get(collection)
+            if record:
+                await asyncio.to_thread(self.upsert, user_id, collection, [record])
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+
+_WAREHOUSE: Optional[WhoopWarehouse] = None
+_WAREHOUSE_LOCK = threading.Lock()
+
+
+def get_warehouse() -> WhoopWarehouse:
+    global _WAREHOUSE
+    with _WAREHOUSE_LOCK:
+        if _WAREHOUSE is None:
+            _WAREHOUSE = WhoopWarehouse()
+        return _WAREHOUSE
+
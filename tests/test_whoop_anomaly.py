@@ -0,0 +1,42 @@
+from services.whoop_anomaly import OnlineAnomalyDetector
+
+
+class _History:
+    def __init__(self, records):
+        self.records = records
+
+    def load(self, user_id, collection, limit=None):
+        return self.records if collection == "recovery" else []
+
+
+def _recovery(cycle_id, score):
+    return {"cycle_id": cycle_id, "score": {"recovery_score": score}}
+
+
+def _detector():
+    # Baseline of 60 +/- 5.
+    history = [_recovery(i, 60 + (5 if i % 2 else -5)) for i in range(60)]
+    return OnlineAnomalyDetector(warehouse=_History(history))
+
+
+def test_retried_record_is_reported_once():
+    for value in range(30, 37):
+        detector = _detector()
+        record = {"recovery": _recovery(f"new-{value}", value)}
+
+        first = detector.observe("user", record)
+        retry = detector.observe("user", record)
+
+        assert "recovery_score" in first
+        assert retry == {}
+
+
+def test_retried_record_is_only_counted_once():
+    detector = _detector()
+    record = {"recovery": _recovery("new", 36)}
+    detector.observe("user", record)
+    count = detector._states["user"]["recovery_score"].count
+
+    detector.observe("user", record)
+
+    assert detector._states["user"]["recovery_score"].count == count
@@ -3,14 +3,16 @@ import json
 import os  # For loading the token from environment variables
 import re
 import sys
+import time
 import uuid
-from datetime import datetime
+from datetime import datetime, timedelta
 from pathlib import Path
-from typing import Optional, Tuple
+from typing import Dict, Optional, Tuple
 from zoneinfo import ZoneInfo
 
 import discord
-from discord.ext import commands, tasks
+import websockets
+from discord.ext import commands
 from dotenv import load_dotenv
 
 ROOT_DIR = Path(__file__).resolve().parents[2]
@@ -20,8 +22,18 @@ if str(ROOT_DIR) not in sys.path:
 # Load environment variables from .env
 load_dotenv(dotenv_path=ROOT_DIR / ".env")
 
-from services.hala_ws import query_hala
-from services.whoop_briefing import build_daily_briefing_payload, build_discord_embed_dict
+from services.hala_ws import query_hala, stream_hala
+from services.http_client import get_shared_client
+from services.request_dispatcher import RequestDispatcher
+from services.scheduler import DailyAt, Scheduler
+from services.session_registry import SessionRegistry
+from services.whoop_briefing import (
+    briefing_routes,
+    build_daily_briefing_payload,
+    build_discord_embed_dict,
+    prewarm_daily_briefing,
+    run_briefing_batch,
+)
 
 # Set up intents
 intents = discord.Intents.default()
@@ -30,37 +42,149 @@ intents.message_content = True  # Enable if you enabled it in the portal
 # Create the bot with a command prefix (e.g., !)
 bot = commands.Bot(command_prefix='!', intents=intents)
 
-# In-memory session mapping per channel
-SESSION_BY_CHANNEL = {}
+# HalaAI session per channel, persisted so restarts keep conversation continuity
+SESSION_BY_CHANNEL = SessionRegistry(
+    max_entries=int(os.getenv("DISCORD_SESSION_MAX_ENTRIES", "1000")),
+    ttl=float(os.getenv("DISCORD_SESSION_TTL_SECONDS", str(7 * 24 * 3600))),
+    path=ROOT_DIR / "tools" / "discord" / "data" / "sessions.json",
+)
 HEALTH_CHANNEL_NAME = os.getenv("HEALTH_CHANNEL_NAME", "health-💪")
 HEALTH_CHANNEL_ID = os.getenv("HEALTH_CHANNEL_ID")
 HEALTH_BRIEFING_TIME = os.getenv("HEALTH_BRIEFING_TIME", "11:00")
 HEALTH_TIMEZONE = os.getenv("HEALTH_TIMEZONE")
-LAST_BRIEFING_DATE = None
-
-
-def _is_health_channel(channel) -> bool:
-    if HEALTH_CHANNEL_ID:
-        try:
-            return channel.id == int(HEALTH_CHANNEL_ID)
-        except ValueError:
-            return False
-    return channel.name == HEALTH_CHANNEL_NAME
+HEALTH_BRIEFING_PREWARM_MINUTES = int(os.getenv("HEALTH_BRIEFING_PREWARM_MINUTES", "5"))
+HEALTH_BRIEFING_CATCH_UP_MINUTES = int(os.getenv("HEALTH_BRIEFING_CATCH_UP_MINUTES", "60"))
+SCHEDULER_STATE_PATH = ROOT_DIR / "tools" / "discord" / "data" / "scheduler_state.json"
+SCHEDULER = Scheduler(SCHEDULER_STATE_PATH)
+REGENERATE_PATTERN = re.compile(r"\b(regenerate|refresh|redo)\b", re.IGNORECASE)
+
+DISCORD_MESSAGE_LIMIT = 2000
+STREAM_REPLIES = os.getenv("DISCORD_STREAM_REPLIES", "1").lower() not in ("0", "false", "no")
+STREAM_EDIT_INTERVAL = float(os.getenv("DISCORD_STREAM_EDIT_INTERVAL", "1.0"))
+STREAM_EDIT_INTERVAL_MAX = float(os.getenv("DISCORD_STREAM_EDIT_INTERVAL_MAX", "5.0"))
+STREAM_EDIT_RETRIES = int(os.getenv("DISCORD_STREAM_EDIT_RETRIES", "3"))
+STREAM_PLACEHOLDER = "…"
+# Failures of a HalaAI round trip, including a socket dropped mid-stream and Discord API errors.
+REPLY_ERRORS = (
+    asyncio.TimeoutError,
+    RuntimeError,
+    OSError,
+    json.JSONDecodeError,
+    websockets.exceptions.WebSocketException,
+    discord.HTTPException,
+)
+
+# Mentions are answered one at a time per channel, with few HalaAI requests in flight overall.
+DISPATCHER = RequestDispatcher(
+    max_concurrency=int(os.getenv("DISCORD_HALA_CONCURRENCY", "2")),
+    max_queue_per_key=int(os.getenv("DISCORD_CHANNEL_QUEUE_LIMIT", "5")),
+    max_queued=int(os.getenv("DISCORD_QUEUE_LIMIT", "50")),
+)
+
+
+def _parse_channel_id(value: Optional[str]) -> Optional[int]:
+    if not value:
+        return None
+    try:
+        return int(value)
+    except ValueError:
+        print(f"Ignoring invalid channel id: {value!r}")
+        # Still an id rule, so an invalid id matches no channel rather than falling back to names.
+        return -1
+
+
+class _ChannelRouter:
+    """Index of channel id -> handler type ("health", "general", ...).
+
+    Each rule matches by channel id when one is configured, otherwise by
+    channel name. The index is built in ``on_ready`` and kept current from
+    guild and channel events, so routing a message is a dict lookup. DMs and
+    threads have no such events; they are classified on first use and kept
+    in a bounded LRU/TTL registry instead.
+    """
+
+    def __init__(
+        self,
+        rules: Dict[str, Tuple[Optional[int], Optional[str]]],
+        default: str = "general",
+        max_adhoc: int = 1000,
+        adhoc_ttl: float = 24 * 3600,
+    ):
+        self.rules = rules
+        self.default = default
+        self.max_adhoc = max_adhoc
+        self.adhoc_ttl = adhoc_ttl
+        self._routes: Dict[int, str] = {}
+        self._by_handler: Dict[str, Dict[int, None]] = {handler: {} for handler in rules}
+        self._adhoc: SessionRegistry[str] = SessionRegistry(max_entries=max_adhoc, ttl=adhoc_ttl)
+
+    def _classify(self, channel) -> str:
+        for handler, (channel_id, name) in self.rules.items():
+            if channel_id is not None:
+                if channel.id == channel_id:
+                    return handler
+            elif name and getattr(channel, "name", None) == name:
+                return handler
+        return self.default
+
+    def update(self, channel) -> str:
+        self.remove(channel.id)
+        handler = self._classify(channel)
+        self._routes[channel.id] = handler
+        if handler in self._by_handler:
+            self._by_handler[handler][channel.id] = None
+        return handler
+
+    def remove(self, channel_id: int) -> None:
+        self._adhoc.pop(channel_id)
+        handler = self._routes.pop(channel_id, None)
+        if handler in self._by_handler:
+            self._by_handler[handler].pop(channel_id, None)
+
+    def add_guild(self, guild) -> None:
+        for channel in guild.text_channels:
+            self.update(channel)
+
+    def remove_guild(self, guild) -> None:
+        for channel in guild.channels:
+            self.remove(channel.id)
+
+    def rebuild(self, guilds) -> None:
+        self._routes.clear()
+        self._adhoc = SessionRegistry(max_entries=self.max_adhoc, ttl=self.adhoc_ttl)
+        for channels in self._by_handler.values():
+            channels.clear()
+        for guild in guilds:
+            self.add_guild(guild)
+
+    def route(self, channel) -> str:
+        handler = self._routes.get(channel.id)
+        if handler is not None:
+            return handler
+        if isinstance(channel, discord.TextChannel):
+            # A guild channel missed by the events; it is tracked from now on.
+            return self.update(channel)
+        handler = self._adhoc.get(channel.id)
+        if handler is None:
+            handler = self._classify(channel)
+            self._adhoc.set(channel.id, handler)
+        return handler
+
+    def first(self, handler: str) -> Optional[int]:
+        return next(iter(self._by_handler.get(handler, {})), None)
+
+
+ROUTER = _ChannelRouter(
+    {"health": (_parse_channel_id(HEALTH_CHANNEL_ID), HEALTH_CHANNEL_NAME)},
+    max_adhoc=int(os.getenv("DISCORD_ROUTE_CACHE_MAX_ENTRIES", "1000")),
+)
 
 
 def _get_health_channel() -> Optional[discord.abc.GuildChannel]:
-    if HEALTH_CHANNEL_ID:
-        try:
-            channel_id = int(HEALTH_CHANNEL_ID)
-        except ValueError:
-            return None
-        return bot.get_channel(channel_id)
-
-    for guild in bot.guilds:
-        for channel in guild.text_channels:
-            if channel.name == HEALTH_CHANNEL_NAME:
-                return channel
-    return None
+    channel_id = ROUTER.first("health")
+    if channel_id is None:
+        return None
+    return bot.get_channel(channel_id)
 
 
 def _get_schedule_parts() -> Tuple[int, int, object]:
@@ -85,6 +209,12 @@ def _get_schedule_parts() -> Tuple[int, int, object]:
     return hour, minute, tzinfo
 
 
+async def _prewarm_health_briefing(scheduled_for: datetime) -> None:
+    started = time.monotonic()
+    results = await prewarm_daily_briefing()
+    print(f"Prewarmed {len(results)} briefing(s) in {time.monotonic() - started:.1f}s")
+
+
 async def _send_health_briefing(channel) -> None:
     payload = await build_daily_briefing_payload()
     if payload.get("error"):
@@ -96,72 +226,297 @@ async def _send_health_briefing(channel) -> None:
     await channel.send(embed=embed)
 
 
-@tasks.loop(minutes=1)
-async def daily_briefing_task():
-    global LAST_BRIEFING_DATE
+async def _deliver_briefing(user_id: str, payload) -> None:
+    route = briefing_routes().get(user_id, {})
+    embed_dict = build_discord_embed_dict(payload)
+    if route.get("label"):
+        embed_dict["title"] = f"{embed_dict['title']} · {route['label']}"
+
+    if route.get("webhook_url"):
+        response = await get_shared_client("discord", timeout=10.0).post(
+            route["webhook_url"], json={"embeds": [embed_dict]}
+        )
+        response.raise_for_status()
+        return
 
-    channel = _get_health_channel()
+    channel = bot.get_channel(int(route["channel_id"])) if route.get("channel_id") else _get_health_channel()
     if not channel:
-        return
+        raise RuntimeError(f"No Discord channel found for user {user_id}")
+    await channel.send(embed=discord.Embed.from_dict(embed_dict))
 
-    hour, minute, tzinfo = _get_schedule_parts()
-    now = datetime.now(tzinfo)
-    if now.hour != hour or now.minute != minute:
-        return
 
-    today = now.date().isoformat()
-    if LAST_BRIEFING_DATE == today:
+async def _post_daily_briefing(scheduled_for: datetime) -> None:
+    results = await run_briefing_batch(deliver=_deliver_briefing)
+    if not results:
+        channel = _get_health_channel()
+        if channel:
+            await _send_health_briefing(channel)
         return
+    failed = [result for result in results if not result.ok]
+    print(f"Daily briefings: {len(results) - len(failed)} sent, {len(failed)} failed.")
+
 
-    LAST_BRIEFING_DATE = today
-    await _send_health_briefing(channel)
+def _schedule_health_jobs() -> None:
+    hour, minute, tzinfo = _get_schedule_parts()
+    SCHEDULER.add_job(
+        "health-briefing",
+        DailyAt(hour, minute, tzinfo),
+        _post_daily_briefing,
+        catch_up=timedelta(minutes=HEALTH_BRIEFING_CATCH_UP_MINUTES),
+    )
+    if HEALTH_BRIEFING_PREWARM_MINUTES > 0:
+        # Generate the briefing ahead of time so the scheduled post is a cache read.
+        SCHEDULER.add_job(
+            "health-briefing-prewarm",
+            DailyAt(hour, minute, tzinfo, offset=-timedelta(minutes=HEALTH_BRIEFING_PREWARM_MINUTES)),
+            _prewarm_health_briefing,
+            catch_up=timedelta(minutes=HEALTH_BRIEFING_PREWARM_MINUTES),
+        )
 
 # Event: Runs when the bot is ready
 @bot.event
 async def on_ready():
     print(f'Bot is online as {bot.user}!')
-    if not daily_briefing_task.is_running():
-        daily_briefing_task.start()
+    ROUTER.rebuild(bot.guilds)
+    # on_ready fires again after reconnects; jobs are registered only once.
+    if not SCHEDULER.running:
+        _schedule_health_jobs()
+        SCHEDULER.start()
+
+@bot.event
+async def on_guild_join(guild):
+    ROUTER.add_guild(guild)
+
+
+@bot.event
+async def on_guild_remove(guild):
+    ROUTER.remove_guild(guild)
+
+
+@bot.event
+async def on_guild_channel_create(channel):
+    ROUTER.update(channel)
+
+
+@bot.event
+async def on_guild_channel_update(before, after):
+    ROUTER.update(after)
+
+
+@bot.event
+async def on_guild_channel_delete(channel):
+    ROUTER.remove(channel.id)
 
 # Basic command example: Responds to !hello
 @bot.command()
 async def hello(ctx):
     await ctx.send('Hello from your bot!')
 
-def split_discord_messages(text, limit=2000):
+def _split_head(text, limit=DISCORD_MESSAGE_LIMIT):
+    split_at = text.rfind("\n", 0, limit)
+    if split_at == -1:
+        split_at = limit
+    return text[:split_at].rstrip(), text[split_at:].lstrip()
+
+
+def split_discord_messages(text, limit=DISCORD_MESSAGE_LIMIT):
     chunks = []
     remaining = text.strip()
     while len(remaining) > limit:
-        split_at = remaining.rfind("\n", 0, limit)
-        if split_at == -1:
-            split_at = limit
-        chunks.append(remaining[:split_at].rstrip())
-        remaining = remaining[split_at:].lstrip()
+        head, remaining = _split_head(remaining, limit)
+        chunks.append(head)
     if remaining:
         chunks.append(remaining)
     return chunks
 
+
+class _StreamingReply:
+    """Edits a Discord message in place while HalaAI tokens stream in.
+
+    Edits are spaced by an adaptive interval: slow edits (discord.py sleeping
+    on a 429 bucket) or explicit rate-limit errors widen it, fast ones let it
+    decay back to ``STREAM_EDIT_INTERVAL``. A rate-limited progress edit is
+    simply skipped; the edits that close a message (roll-over and finish)
+    wait out ``retry_after`` and try again so no text is lost. Text beyond the
+    2000-char limit is split with the same newline-aware rule as
+    ``split_discord_messages`` and continued in a new message.
+    """
+
+    def __init__(self, channel):
+        self.channel = channel
+        self.message = None
+        self.buffer = ""
+        self.shown = ""
+        self.interval = STREAM_EDIT_INTERVAL
+        self.last_edit = 0.0
+
+    async def start(self) -> None:
+        self.message = await self.channel.send(STREAM_PLACEHOLDER)
+        self.last_edit = time.monotonic()
+
+    @staticmethod
+    def _retry_after(exc: Exception) -> Optional[float]:
+        if isinstance(exc, discord.RateLimited):
+            return exc.retry_after
+        if isinstance(exc, discord.HTTPException) and exc.status == 429:
+            try:
+                return float(exc.response.headers.get("Retry-After", 1.0))
+            except (AttributeError, TypeError, ValueError):
+                return 1.0
+        return None
+
+    async def _edit(self, text: str, required: bool = False) -> None:
+        if not text or text == self.shown:
+            return
+        started = time.monotonic()
+        for attempt in range(STREAM_EDIT_RETRIES + 1):
+            try:
+                await self.message.edit(content=text)
+                self.shown = text
+                break
+            except (discord.HTTPException, discord.RateLimited) as exc:
+                retry_after = self._retry_after(exc)
+                if retry_after is None or (required and attempt == STREAM_EDIT_RETRIES):
+                    raise
+                self.interval = min(self.interval * 2, STREAM_EDIT_INTERVAL_MAX)
+                if not required:
+                    return
+                await asyncio.sleep(retry_after)
+        finished = time.monotonic()
+        if finished - started > self.interval / 2:
+            self.interval = min(self.interval * 2, STREAM_EDIT_INTERVAL_MAX)
+        else:
+            self.interval = max(STREAM_EDIT_INTERVAL, self.interval * 0.75)
+        self.last_edit = finished
+
+    async def _roll_over(self) -> None:
+        while len(self.buffer.strip()) > DISCORD_MESSAGE_LIMIT:
+            head, self.buffer = _split_head(self.buffer.lstrip())
+            await self._edit(head, required=True)
+            opening = self.buffer.strip()[:DISCORD_MESSAGE_LIMIT] or STREAM_PLACEHOLDER
+            self.message = await self.channel.send(opening)
+            self.shown = opening
+            self.last_edit = time.monotonic()
+
+    async def feed(self, chunk: str) -> None:
+        self.buffer += chunk
+        if len(self.buffer.strip()) > DISCORD_MESSAGE_LIMIT:
+            await self._roll_over()
+        if time.monotonic() - self.last_edit >= self.interval:
+            await self._edit(self.buffer.strip())
+
+    async def finish(self, empty_text: str) -> None:
+        await self._roll_over()
+        await self._edit(self.buffer.strip() or empty_text, required=True)
+
+    async def close(self, empty_text: str) -> None:
+        """Finish the reply, deleting the placeholder if nothing replaced it."""
+        try:
+            await self.finish(empty_text)
+        except (discord.HTTPException, discord.RateLimited) as exc:
+            print(f"Could not finalize streamed reply: {exc}")
+        if self.message is not None and not self.shown:
+            try:
+                await self.message.delete()
+            except discord.HTTPException:
+                pass
+
+    @property
+    def has_output(self) -> bool:
+        return bool(self.buffer.strip())
+
+
+async def _stream_reply(channel, content, session_id, start_session) -> None:
+    reply = _StreamingReply(channel)
+    await reply.start()
+    error = None
+    # Anything unexpected keeps the partial text, or drops the placeholder, and propagates.
+    empty_text = ""
+    try:
+        async for chunk in stream_hala(
+            content,
+            session_id=session_id,
+            start_session=start_session,
+            include_history=False,
+        ):
+            await reply.feed(chunk)
+        empty_text = "No response returned from HalaAI."
+    except REPLY_ERRORS as exc:
+        error = f"LLM error: {exc}"
+        empty_text = error
+    finally:
+        await reply.close(empty_text)
+    if error and reply.has_output:
+        await channel.send(error)
+
+async def _answer_mention(channel, content, session_id, start_session) -> None:
+    if STREAM_REPLIES:
+        await _stream_reply(channel, content, session_id, start_session)
+        return
+
+    try:
+        async with channel.typing():
+            response = await query_hala(
+                content,
+                session_id=session_id,
+                start_session=start_session,
+                include_history=False,
+            )
+    except REPLY_ERRORS as exc:
+        await channel.send(f"LLM error: {exc}")
+        return
+
+    if not response:
+        await channel.send("No response returned from HalaAI.")
+        return
+
+    for chunk in split_discord_messages(response):
+        await channel.send(chunk)
+
+
+async def _send_health_briefing(channel, regenerate: bool) -> None:
+    try:
+        async with channel.typing():
+            payload = await build_daily_briefing_payload(regenerate=regenerate)
+    except REPLY_ERRORS as exc:
+        await channel.send(f"Briefing error: {exc}")
+        return
+
+    if payload.get("error"):
+        await channel.send(payload["error"])
+        return
+
+    embed_dict = build_discord_embed_dict(payload)
+    if not regenerate:
+        embed_dict["footer"]["text"] += " · mention me with \"regenerate\" for fresh notes"
+    embed = discord.Embed.from_dict(embed_dict)
+    await channel.send(embed=embed)
+
+
+async def _dispatch(channel, job) -> None:
+    """Run a mention's HalaAI work through ``DISPATCHER``, telling the user if it has to wait."""
+    future, position = DISPATCHER.submit(channel.id, job)
+    if future is None:
+        await channel.send("I'm busy with other requests right now. Please try again in a minute.")
+        return
+    if position:
+        await channel.send(f"Busy, queued #{position}.")
+    try:
+        await future
+    except Exception:
+        # Already logged by the dispatcher.
+        pass
+
 @bot.event
 async def on_message(message):
     if message.author.bot:
         return
 
     if bot.user and bot.user in message.mentions:
-        if _is_health_channel(message.channel):
-            try:
-                async with message.channel.typing():
-                    payload = await build_daily_briefing_payload()
-            except (asyncio.TimeoutError, RuntimeError, OSError, json.JSONDecodeError) as exc:
-                await message.channel.send(f"Briefing error: {exc}")
-                return
-
-            if payload.get("error"):
-                await message.channel.send(payload["error"])
-                return
-
-            embed_dict = build_discord_embed_dict(payload)
-            embed = discord.Embed.from_dict(embed_dict)
-            await message.channel.send(embed=embed)
+        if ROUTER.route(message.channel) == "health":
+            regenerate = bool(REGENERATE_PATTERN.search(message.content))
+            # Briefings call HalaAI too, so they share the dispatcher's slots.
+            await _dispatch(message.channel, lambda: _send_health_briefing(message.channel, regenerate))
             return
 
         content = message.content
@@ -170,33 +525,14 @@ async def on_message(message):
             await message.channel.send("Please mention me with a question, e.g. `@HalaAI what is...`")
             return
 
-        channel_id = message.channel.id
-        session_id = SESSION_BY_CHANNEL.get(channel_id)
-        if not session_id:
-            session_id = str(uuid.uuid4())
-            SESSION_BY_CHANNEL[channel_id] = session_id
-            start_session = True
-        else:
-            start_session = False
-
-        try:
-            async with message.channel.typing():
-                response = await query_hala(
-                    content,
-                    session_id=session_id,
-                    start_session=start_session,
-                    include_history=False,
-                )
-        except (asyncio.TimeoutError, RuntimeError, OSError, json.JSONDecodeError) as exc:
-            await message.channel.send(f"LLM error: {exc}")
-            return
-
-        if not response:
-            await message.channel.send("No response returned from HalaAI.")
-            return
+        async def answer() -> None:
+            # Resolved when the job runs, so a rejected mention never leaves an unstarted session behind.
+            session_id, start_session = SESSION_BY_CHANNEL.get_or_create(
+                message.channel.id, lambda: str(uuid.uuid4())
+            )
+            await _answer_mention(message.channel, content, session_id, start_session)
 
-        for chunk in split_discord_messages(response):
-            await message.channel.send(chunk)
+        await _dispatch(message.channel, answer)
 
     await bot.process_commands(message)
 
@@ -1,13 +1,16 @@
 from typing import Any, Dict, Optional
 
 from hala_orchestrator.tools import Tool
-from services.exchange.exchange_rates import convert_currency
+from services.exchange.exchange_rates import convert_currency, convert_many
 
 
 class ExchangeRatesTool(Tool):
     name = "exchange_rates"
 
     async def run(self, **kwargs: Any) -> Dict[str, Any]:
+        conversions = kwargs.get("conversions")
+        if conversions:
+            return {"conversions": await convert_many(conversions)}
         base = kwargs.get("base") or "USD"
         target = kwargs.get("target")
         amount = kwargs.get("amount")
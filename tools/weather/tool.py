@@ -1,7 +1,7 @@
 from typing import Any, Dict
 
 from hala_orchestrator.tools import Tool
-from services.weather.openweather import fetch_current_weather
+from services.weather.openweather import fetch_current_weather, fetch_weather_many
 
 
 class OpenWeatherTool(Tool):
@@ -11,8 +11,11 @@ class OpenWeatherTool(Tool):
         self.units = units
 
     async def run(self, **kwargs: Any) -> Dict[str, Any]:
+        units = kwargs.get("units") or self.units
+        cities = kwargs.get("cities")
+        if cities:
+            return {"cities": await fetch_weather_many(cities, units=units)}
         city = kwargs.get("city")
         if not city:
             raise ValueError("OpenWeatherTool requires a city.")
-        units = kwargs.get("units") or self.units
         return await fetch_current_weather(city=city, units=units)
@@ -3,10 +3,10 @@ import os
 import sys
 import time
 import uuid
+from contextlib import asynccontextmanager
 from pathlib import Path
-from typing import Dict, Optional, Tuple
+from typing import Dict, List, Optional, Tuple
 
-import httpx
 from fastapi import FastAPI, HTTPException, Request
 from fastapi.responses import JSONResponse, RedirectResponse
 from dotenv import load_dotenv
@@ -16,27 +16,83 @@ if str(ROOT_DIR) not in sys.path:
     sys.path.insert(0, str(ROOT_DIR))
 
 from config.logging import get_logger
-from services.hala_ws import query_hala
+from services.hala_ws import close_pools, get_response_cache, query_hala
+from services.http_client import close_shared_clients, get_shared_client
 from services.whoop_client import (
+    TokenRefresher,
     WhoopClient,
     build_authorization_url,
     exchange_code_for_token,
     get_access_token_for_user,
+    invalidate_whoop_cache,
     store_token_for_user,
     validate_webhook_signature,
 )
-from services.whoop_coach import SYSTEM_PROMPT, build_user_prompt, summarize_whoop_data
-from services.whoop_briefing import build_briefing_payload, build_discord_embed_dict
+from services.whoop_coach import SYSTEM_PROMPT, build_user_prompt
+from services.whoop_briefing import build_briefing_payload, build_discord_embed_dict, refresh_briefing
+from services.whoop_briefing_cache import get_briefing_cache
+from services.session_registry import SessionRegistry
+from services.whoop_store import DATA_DIR
+from services.whoop_summary import build_summary_resources, fetch_resources, summarize_resources
+from services.whoop_warehouse import COLLECTIONS, get_warehouse
+from services.whoop_analytics import attach_trends
+from services.whoop_anomaly import anomaly_gate_enabled, describe_anomalies, get_anomaly_detector
+from services.webhook_coalescer import WebhookCoalescer, latest_event_id
+from services.webhook_queue import WebhookQueue
 
 # Load environment variables from repo root
 load_dotenv(dotenv_path=ROOT_DIR / ".env")
 
 logger = get_logger("WhoopServer")
-app = FastAPI()
+
+
+WEBHOOK_QUEUE_PATH = ROOT_DIR / "tools" / "whoop" / "data" / "webhook_queue.db"
+WEBHOOK_QUEUE: Optional[WebhookQueue] = None
+WEBHOOK_COALESCER: Optional[WebhookCoalescer] = None
+BACKGROUND_TASKS: set = set()
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    global WEBHOOK_QUEUE, WEBHOOK_COALESCER
+    WEBHOOK_COALESCER = WebhookCoalescer(
+        _process_webhook_events,
+        window=float(os.getenv("WHOOP_WEBHOOK_COALESCE_SECONDS", "10")),
+        dedupe_ttl=float(os.getenv("WHOOP_WEBHOOK_DEDUPE_SECONDS", "900")),
+    )
+    # Workers wait out the coalescing window, so allow more of them than CPU-bound work would.
+    WEBHOOK_QUEUE = WebhookQueue(
+        _process_webhook,
+        WEBHOOK_QUEUE_PATH,
+        workers=int(os.getenv("WHOOP_WEBHOOK_WORKERS", "16")),
+        max_pending=int(os.getenv("WHOOP_WEBHOOK_QUEUE_SIZE", "1000")),
+        max_attempts=int(os.getenv("WHOOP_WEBHOOK_MAX_ATTEMPTS", "5")),
+    )
+    await WEBHOOK_QUEUE.start()
+    refresher = None
+    client_id = os.getenv("WHOOP_CLIENT_ID")
+    client_secret = os.getenv("WHOOP_CLIENT_SECRET")
+    if client_id and client_secret:
+        refresher = TokenRefresher(client_id, client_secret)
+        refresher.start()
+    yield
+    if refresher:
+        await refresher.stop()
+    await WEBHOOK_QUEUE.stop()
+    await close_shared_clients()
+    await close_pools()
+    SESSION_BY_USER.save()
+
+
+app = FastAPI(lifespan=lifespan)
 
 STATE_TTL_SECONDS = 600
-STATE_STORE: Dict[str, float] = {}
-SESSION_BY_USER: Dict[str, str] = {}
+STATE_STORE: SessionRegistry[float] = SessionRegistry(max_entries=1000, ttl=STATE_TTL_SECONDS, sliding=False)
+SESSION_BY_USER: SessionRegistry[str] = SessionRegistry(
+    max_entries=int(os.getenv("WHOOP_SESSION_MAX_ENTRIES", "10000")),
+    ttl=float(os.getenv("WHOOP_SESSION_TTL_SECONDS", str(7 * 24 * 3600))),
+    path=DATA_DIR / "sessions.json",
+)
 
 
 def _get_env(name: str, required: bool = True, default: Optional[str] = None) -> str:
@@ -54,20 +110,8 @@ def _get_scopes() -> list[str]:
     return [scope.strip() for scope in raw.split() if scope.strip()]
 
 
-def _clean_states() -> None:
-    now = time.time()
-    expired = [state for state, ts in STATE_STORE.items() if now - ts > STATE_TTL_SECONDS]
-    for state in expired:
-        STATE_STORE.pop(state, None)
-
-
 def _get_or_create_session(user_id: str) -> Tuple[str, bool]:
-    session_id = SESSION_BY_USER.get(user_id)
-    if session_id:
-        return session_id, False
-    session_id = f"whoop-{user_id}"
-    SESSION_BY_USER[user_id] = session_id
-    return session_id, True
+    return SESSION_BY_USER.get_or_create(user_id, lambda: f"whoop-{user_id}")
 
 
 @app.get("/whoop/auth")
@@ -76,9 +120,8 @@ async def whoop_auth():
     redirect_uri = _get_env("WHOOP_REDIRECT_URI")
     scopes = _get_scopes()
 
-    _clean_states()
     state = str(uuid.uuid4())
-    STATE_STORE[state] = time.time()
+    STATE_STORE.set(state, time.time())
 
     auth_url = build_authorization_url(client_id, redirect_uri, scopes, state)
     return RedirectResponse(auth_url)
@@ -88,9 +131,8 @@ async def whoop_auth():
 async def whoop_callback(code: Optional[str] = None, state: Optional[str] = None):
     if not code:
         raise HTTPException(status_code=400, detail="Missing code parameter")
-    if not state or state not in STATE_STORE:
+    if not state or STATE_STORE.pop(state) is None:
         raise HTTPException(status_code=400, detail="Invalid or missing state")
-    STATE_STORE.pop(state, None)
 
     client_id = _get_env("WHOOP_CLIENT_ID")
     client_secret = _get_env("WHOOP_CLIENT_SECRET")
@@ -106,7 +148,11 @@ async def whoop_callback(code: Optional[str] = None, state: Optional[str] = None
     if not user_id:
         raise HTTPException(status_code=400, detail="Profile response missing user_id")
 
-    store_token_for_user(user_id, token_response)
+    await asyncio.to_thread(store_token_for_user, user_id, token_response)
+    if os.getenv("WHOOP_SYNC_ON_LINK", "1").lower() not in ("0", "false", "no"):
+        task = asyncio.create_task(_backfill_history(user_id, access_token))
+        BACKGROUND_TASKS.add(task)
+        task.add_done_callback(BACKGROUND_TASKS.discard)
     return JSONResponse({"status": "ok", "user_id": user_id})
 
 
@@ -133,109 +179,117 @@ async def whoop_webhook(request: Request):
         raise HTTPException(status_code=401, detail="Invalid webhook signature")
 
     payload = await request.json()
-    asyncio.create_task(_process_webhook(payload))
+    if WEBHOOK_QUEUE is None or not await WEBHOOK_QUEUE.submit(payload):
+        raise HTTPException(status_code=503, detail="Webhook queue is full")
     return JSONResponse({"status": "accepted"})
 
 
+@app.get("/whoop/queue")
+async def whoop_queue_stats():
+    if WEBHOOK_QUEUE is None:
+        raise HTTPException(status_code=503, detail="Webhook queue is not running")
+    cache = get_response_cache()
+    return JSONResponse(
+        {
+            **WEBHOOK_QUEUE.stats(),
+            "coalescer": WEBHOOK_COALESCER.stats(),
+            "hala_cache": cache.stats() if cache else None,
+        }
+    )
+
+
 async def _process_webhook(payload: Dict) -> None:
+    if not payload.get("user_id") or not payload.get("type"):
+        logger.warning("Webhook payload missing user_id or type: %s", payload)
+        return
+    await WEBHOOK_COALESCER.submit(payload)
+
+
+async def _process_webhook_events(user_id: str, events: List[Dict]) -> None:
+    sleep_id = latest_event_id(events, "sleep", "recovery")
+    workout_id = latest_event_id(events, "workout")
+    logger.info("Processing %s coalesced WHOOP event(s) for user %s", len(events), user_id)
+
+    client_id = _get_env("WHOOP_CLIENT_ID")
+    client_secret = _get_env("WHOOP_CLIENT_SECRET")
+    access_token = await get_access_token_for_user(user_id, client_id, client_secret)
+    client = WhoopClient(access_token, user_id=user_id)
+    for event_type in {event.get("type") for event in events}:
+        invalidate_whoop_cache(user_id, event_type)
+
+    records = await fetch_resources(client, build_summary_resources(sleep_id=sleep_id, workout_id=workout_id))
+    # The detector reports a record only once, so keep its verdict on the
+    # queued events: a retry after a later failure still runs the coach.
+    anomalies = {}
+    for event in events:
+        anomalies.update(event.get("_anomalies") or {})
+    anomalies.update(await get_anomaly_detector().aobserve(user_id, records))
+    for event in events:
+        event["_anomalies"] = anomalies
+    await _record_history(user_id, records, events)
+    if _briefing_refresh_enabled():
+        await asyncio.to_thread(get_briefing_cache().mark_stale, user_id)
+        task = asyncio.create_task(_refresh_briefing(user_id))
+        BACKGROUND_TASKS.add(task)
+        task.add_done_callback(BACKGROUND_TASKS.discard)
+
+    if anomalies:
+        logger.info("WHOOP anomalies for user %s: %s", user_id, "; ".join(describe_anomalies(anomalies)))
+    elif anomaly_gate_enabled():
+        logger.info("No significant WHOOP deviations for user %s; skipping coach run.", user_id)
+        return
+
+    summary = await attach_trends(summarize_resources(records), user_id)
+    if not summary:
+        logger.info("No data available to coach from WHOOP.")
+        return
+    if anomalies:
+        summary["anomalies"] = anomalies
+
+    user_prompt = build_user_prompt(summary)
+    session_id, start_session = _get_or_create_session(user_id)
+
+    response = await query_hala(
+        user_prompt,
+        session_id=session_id,
+        system_prompt=SYSTEM_PROMPT,
+        include_history=False,
+        start_session=start_session,
+    )
+
+    logger.info("Coach response for user %s: %s", user_id, response)
+
+    await _send_discord_webhook(summary, response)
+
+
+async def _record_history(user_id: str, records: Dict[str, Optional[Dict]], events: List[Dict]) -> None:
+    warehouse = get_warehouse()
     try:
-        user_id = payload.get("user_id")
-        event_type = payload.get("type")
-        event_id = payload.get("id")
-        if not user_id or not event_type:
-            logger.warning("Webhook payload missing user_id or type: %s", payload)
-            return
-
-        client_id = _get_env("WHOOP_CLIENT_ID")
-        client_secret = _get_env("WHOOP_CLIENT_SECRET")
-        access_token = await get_access_token_for_user(user_id, client_id, client_secret)
-        client = WhoopClient(access_token)
-
-        cycle = None
-        recovery = None
-        sleep = None
-        workout = None
-
-        if event_type.startswith("sleep") and event_id:
-            sleep = await client.get_sleep(event_id)
-            cycle_id = sleep.get("cycle_id")
-            if cycle_id:
-                cycle = await client.get_cycle(cycle_id)
-                try:
-                    recovery = await client.get_recovery_for_cycle(cycle_id)
-                except Exception as exc:
-                    logger.warning("Recovery fetch failed for cycle %s: %s", cycle_id, exc)
-
-        elif event_type.startswith("recovery") and event_id:
-            sleep = await client.get_sleep(event_id)
-            cycle_id = sleep.get("cycle_id") if sleep else None
-            if cycle_id:
-                cycle = await client.get_cycle(cycle_id)
-                recovery = await client.get_recovery_for_cycle(cycle_id)
-
-        elif event_type.startswith("workout") and event_id:
-            workout = await client.get_workout(event_id)
-
-        if cycle is None:
-            try:
-                cycles = await client.list_cycles(limit=1)
-                records = cycles.get("records") or []
-                cycle = records[0] if records else None
-            except Exception as exc:
-                logger.warning("Cycle list fetch failed: %s", exc)
-
-        if sleep is None:
-            try:
-                sleeps = await client.list_sleep(limit=1)
-                records = sleeps.get("records") or []
-                sleep = records[0] if records else None
-            except Exception as exc:
-                logger.warning("Sleep list fetch failed: %s", exc)
-
-        if recovery is None:
-            if cycle and cycle.get("id"):
-                try:
-                    recovery = await client.get_recovery_for_cycle(cycle.get("id"))
-                except Exception as exc:
-                    logger.warning("Recovery fetch failed: %s", exc)
-            if recovery is None:
-                try:
-                    recoveries = await client.list_recovery(limit=1)
-                    records = recoveries.get("records") or []
-                    recovery = records[0] if records else None
-                except Exception as exc:
-                    logger.warning("Recovery list fetch failed: %s", exc)
-
-        if workout is None:
-            try:
-                workouts = await client.list_workouts(limit=1)
-                records = workouts.get("records") or []
-                workout = records[0] if records else None
-            except Exception as exc:
-                logger.warning("Workout list fetch failed: %s", exc)
-
-        summary = summarize_whoop_data(cycle, recovery, sleep, workout)
-        if not summary:
-            logger.info("No data available to coach from WHOOP.")
-            return
-
-        user_prompt = build_user_prompt(summary)
-        session_id, start_session = _get_or_create_session(user_id)
-
-        response = await query_hala(
-            user_prompt,
-            session_id=session_id,
-            system_prompt=SYSTEM_PROMPT,
-            include_history=False,
-            start_session=start_session,
-        )
-
-        logger.info("Coach response for user %s: %s", user_id, response)
-
-        await _send_discord_webhook(summary, response)
+        await warehouse.record_latest(user_id, records)
+        for event in events:
+            collection, _, action = str(event.get("type") or "").partition(".")
+            if action == "deleted" and collection in COLLECTIONS and event.get("id"):
+                await asyncio.to_thread(warehouse.delete, user_id, collection, event["id"])
+    except Exception as exc:
+        logger.warning("Failed to record WHOOP history for user %s: %s", user_id, exc)
 
+
+def _briefing_refresh_enabled() -> bool:
+    return os.getenv("WHOOP_BRIEFING_REFRESH_ON_WEBHOOK", "1").lower() not in ("0", "false", "no")
+
+
+async def _refresh_briefing(user_id: str) -> None:
+    try:
+        await refresh_briefing(user_id)
+    except Exception as exc:
+        logger.warning("Briefing refresh failed for user %s: %s", user_id, exc)
+
+
+async def _backfill_history(user_id: str, access_token: str) -> None:
+    try:
+        await get_warehouse().sync_user(WhoopClient(access_token, user_id=user_id), user_id)
     except Exception as exc:
-        logger.exception("Failed to process WHOOP webhook: %s", exc)
+        logger.warning("WHOOP history backfill failed for user %s: %s", user_id, exc)
 
 
 async def _send_discord_webhook(summary: Dict, thoughts: str) -> None:
@@ -248,9 +302,8 @@ async def _send_discord_webhook(summary: Dict, thoughts: str) -> None:
     data = {"embeds": [embed]}
 
     try:
-        async with httpx.AsyncClient(timeout=10.0) as client:
-            response = await client.post(webhook_url, json=data)
-            response.raise_for_status()
+        response = await get_shared_client("discord", timeout=10.0).post(webhook_url, json=data)
+        response.raise_for_status()
     except Exception as exc:
         logger.warning("Discord webhook failed: %s", exc)
 
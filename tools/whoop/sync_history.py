@@ -0,0 +1,35 @@
+import asyncio
+import os
+import sys
+from pathlib import Path
+from typing import List
+
+from dotenv import load_dotenv
+
+ROOT_DIR = Path(__file__).resolve().parents[2]
+if str(ROOT_DIR) not in sys.path:
+    sys.path.insert(0, str(ROOT_DIR))
+
+from services.whoop_client import WhoopClient, get_access_token_for_user
+from services.whoop_store import list_user_tokens
+from services.whoop_warehouse import get_warehouse
+
+# Incremental WHOOP history sync into the local warehouse.
+#
+#   python tools/whoop/sync_history.py              # every linked user
+#   python tools/whoop/sync_history.py <user_id>    # selected users
+
+load_dotenv(dotenv_path=ROOT_DIR / ".env")
+
+
+async def _main(user_ids: List[str]) -> None:
+    client_id = os.environ["WHOOP_CLIENT_ID"]
+    client_secret = os.environ["WHOOP_CLIENT_SECRET"]
+    warehouse = get_warehouse()
+    for user_id in user_ids or [user_id for user_id, _ in list_user_tokens()]:
+        access_token = await get_access_token_for_user(user_id, client_id, client_secret)
+        await warehouse.sync_user(WhoopClient(access_token, user_id=user_id), user_id)
+
+
+if __name__ == "__main__":
+    asyncio.run(_main(sys.argv[1:]))